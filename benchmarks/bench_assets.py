@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Asset streaming: load a batch of models on the render thread vs the asset loader
+
+Run from the repo root:
+
+    python -m benchmarks.bench_assets [--models N] [--triangles T]
+
+Writes N OBJ grids of about T triangles each to a temporary directory, then
+renders headless frames while the batch loads, two ways:
+
+    sync   load_model() + upload_model() for every model in one frame
+    async  GPU.assets.load_model() for every model (libs/assets.py), then
+           GPU.assets.update() once per frame, within its upload budget
+
+Both run cold (parse the OBJ, write the mesh cache) and warm (memory-map the
+cache). Prints the worst frame, the frames over the --budget, the worst
+asset_uploads stage from the frame profiler, and the time until every model
+is drawable. Frames are paced to the budget, like vsync: the idle time is
+what the workers get.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import game
+from libs.models import load_model, upload_model
+from benchmarks.bench_models import write_grid_obj
+
+def run(paths:list, mode:str, budget:float) -> dict:
+    g = game.Game(headless=True, size=(1280,720))
+    g.debug = False
+    g.profiler.enabled = True
+    profiler, gpu = g.profiler, g.gpu
+    futures = []
+    times = []
+    t_start = time.perf_counter()
+    frame = 0
+    while True:
+        t0 = time.perf_counter()
+        profiler.begin_frame()
+        if frame == 0:
+            if mode == 'sync':
+                for i,path in enumerate(paths):
+                    model = load_model(path)
+                    upload_model(gpu.meshes, f"model{i}", model)
+                    model.close()
+            else:
+                futures = [gpu.assets.load_model(f"model{i}", path) for i,path in enumerate(paths)]
+        if gpu.assets.pending:
+            with profiler.stage('asset_uploads'): profiler.count('upload_bytes', gpu.assets.update())
+        gpu.render()
+        profiler.end_frame()
+        times.append(1000*(time.perf_counter() - t0))
+        # Headless has no vsync: wait out the frame like a window would, so
+        # the workers get the idle time they would get in the game
+        time.sleep(max(0.0, budget/1000 - (time.perf_counter() - t0)))
+        frame += 1
+        if all(f.done() for f in futures): break
+    total = 1000*(time.perf_counter() - t_start)
+    for f in futures: f.result()                        # Raise any load error
+    uploads = profiler.stages.get('asset_uploads')
+    result = {
+        'frames': len(times),
+        'worst': max(times),
+        'over': sum(t > budget for t in times),
+        'uploads_worst': 1000*max(uploads.cpu) if uploads else 0.0,
+        'total': total,
+        }
+    gpu.release()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', type=int, default=8)
+    parser.add_argument('--triangles', type=int, default=200_000)
+    parser.add_argument('--budget', type=float, default=1000/60, help="Frame budget in ms")
+    args = parser.parse_args()
+    print(f"{args.models} models x {args.triangles} triangles, frame budget {args.budget:0.1f} ms")
+    print(f"{'':>12} {'frames':>7} {'worst ms':>9} {'over':>5} {'uploads ms':>11} {'total ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for run_name in ('cold', 'warm'):
+            for mode in ('sync', 'async'):
+                # Fresh files for each cold run: no cache yet
+                if run_name == 'cold':
+                    paths = [Path(tmp)/f"{mode}{i}.obj" for i in range(args.models)]
+                    for path in paths: write_grid_obj(path, args.triangles)
+                else:
+                    paths = [Path(tmp)/f"{mode}{i}.obj" for i in range(args.models)]
+                r = run(paths, mode, args.budget)
+                print(f"{run_name + ' ' + mode:>12} {r['frames']:>7} {r['worst']:9.1f} {r['over']:>5} "
+                      f"{r['uploads_worst']:11.2f} {r['total']:9.0f}")
+
+if __name__ == '__main__':
+    main()
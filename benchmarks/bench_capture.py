@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Frame capture: main-thread cost of recording every frame, synchronous read vs a PBO ring
+
+Run from the repo root:
+
+    python -m benchmarks.bench_capture [--frames N] [--size W H]
+
+Renders the crowd scene headless at 60 fps (frames are paced like vsync:
+the writer thread works in the idle time) and records every frame:
+
+    off          no capture
+    read+png     fbo.read(), then save a PNG, both on the main thread
+    read         fbo.read() on the main thread, PNG written on a thread
+    pbo memory   FrameCapture (libs/capture.py): PBO ring, frames kept in memory
+    pbo raw      FrameCapture, frames appended to one raw file on a thread
+    pbo png      FrameCapture, PNGs written on a thread
+
+Prints the frame time on the main thread (mean and p95), its cost over
+'off', and the frames written and dropped (writer behind). The cost is
+measured on the whole frame, not around the read: grab() runs before
+present(), so timing it alone would count the rendering it waits for.
+"""
+
+import argparse
+import queue
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+import pygame
+import game
+
+def png_writer(directory:Path, size:tuple):
+    """A thread that saves the (frame, bytes) it is given. Return (queue, thread)."""
+    q = queue.Queue()
+    def loop() -> None:
+        while (item := q.get()) is not None:
+            frame, data = item
+            pygame.image.save(pygame.image.frombytes(data, size, 'RGBX', True), str(directory/f"{frame}.png"))
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return q, thread
+
+def run(mode:str, args, directory:Path) -> dict:
+    g = game.Game(headless=True, size=args.size)
+    g.debug = False
+    g.gpu.scene = ('entities',)
+    g.spawn_crowd(args.crowd)
+    gpu = g.gpu
+    size = tuple(args.size)
+    capture = gpu.start_capture(directory, mode.split()[1]) if mode.startswith('pbo') else None
+    q, thread = png_writer(directory, size) if mode == 'read' else (None, None)
+    frame_ms = []
+    for frame in range(args.frames):
+        t0 = time.perf_counter()
+        g.update(g.dt)
+        gpu.render()                                    # FrameCapture.grab() is in here
+        match mode:
+            case 'read+png':
+                data = gpu.fbo.read(components=4)
+                pygame.image.save(pygame.image.frombytes(data, size, 'RGBX', True), str(directory/f"{frame}.png"))
+            case 'read':
+                q.put((frame, gpu.fbo.read(components=4)))
+        frame_ms.append(1000*(time.perf_counter() - t0))
+        time.sleep(max(0.0, 1/60 - (time.perf_counter() - t0)))
+    written, dropped = (0 if mode == 'off' else args.frames), 0
+    if capture:
+        gpu.stop_capture()
+        written, dropped = capture.written, capture.dropped
+    if thread:
+        q.put(None)
+        thread.join()
+    gpu.release()
+    settled = sorted(frame_ms[args.frames//10:])
+    return {
+        'mean': statistics.fmean(settled),
+        'p95': settled[int(0.95*(len(settled) - 1))],
+        'written': written,
+        'dropped': dropped,
+        }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--size', type=int, nargs=2, default=(1280,720))
+    parser.add_argument('--crowd', type=int, default=2_000)
+    args = parser.parse_args()
+    print(f"{args.frames} frames at {args.size[0]}x{args.size[1]}, paced to 60 fps")
+    print(f"{'':>11} {'frame ms':>9} {'p95 ms':>7} {'cost ms':>8} {'written':>8} {'dropped':>8}")
+    off = None
+    for mode in ('off', 'read+png', 'read', 'pbo memory', 'pbo raw', 'pbo png'):
+        with tempfile.TemporaryDirectory() as tmp:
+            r = run(mode, args, Path(tmp))
+        if off is None: off = r['mean']
+        print(f"{mode:>11} {r['mean']:9.2f} {r['p95']:7.2f} {r['mean'] - off:8.2f} "
+              f"{r['written']:>8} {r['dropped']:>8}")
+
+if __name__ == '__main__':
+    main()
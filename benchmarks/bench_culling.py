@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Frustum culling: 10k cubes, one draw call each, with and without culling
+
+Run from the repo root:
+
+    python -m benchmarks.bench_culling [--frames N]
+
+Renders draw_cube.py's 'cube_field' scene headless at several zoom levels.
+Culled: only cubes whose bounding sphere touches the view are drawn.
+"""
+
+import argparse
+import time
+import draw_cube
+from libs.math import batch
+
+def frame_ms(g, frames:int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(frames): g.gpu.render()
+    return 1000*(time.perf_counter() - t0)/frames
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=10)
+    parser.add_argument('--size', type=int, nargs=2, default=(16*50,9*50))
+    args = parser.parse_args()
+    g = draw_cube.Game(headless=True, size=args.size)
+    g.gpu.scene = ('cube_field',)
+    g.debug = False
+    n = g.gpu.field_size**2
+    print(f"{n} cubes, numpy: {batch.HAVE_NUMPY}")
+    print(f"{'scale':>8} {'drawn':>7} {'culled':>7} {'culling ms':>11} {'all ms':>9}")
+    for scale in (0.02, 0.05, 0.1, 0.3, 1.0):
+        g.camera.zoom(scale/g.camera.scale)
+        g.gpu.mark_camera_dirty()
+        g.gpu.culling = False
+        all_ms = frame_ms(g, args.frames)
+        g.gpu.culling = True
+        culled_ms = frame_ms(g, args.frames)
+        print(f"{scale:8.2f} {g.gpu.meshes_drawn:7} {g.gpu.meshes_culled:7} {culled_ms:11.3f} {all_ms:9.3f}")
+    g.gpu.release()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Debug draw: N lines per frame, one line() call per line vs one lines() call
+
+Run from the repo root:
+
+    python -m benchmarks.bench_debug_draw [N ...]
+
+For each line count N (default 1k, 10k, 100k), draws a vector field of N
+short lines every frame through GPU.debug_draw (libs/debug_draw.py) two ways:
+
+    line()   one call per line
+    lines()  one call with an array of every endpoint
+
+Either way the frame is one draw call for all the lines. Prints the mean
+frame time (collect, stream upload, draw) and whether it fits 60 fps.
+"""
+
+import argparse
+import math
+import time
+from array import array
+import game
+
+def vector_field(n:int, t:float) -> array:
+    """Endpoints of n short lines on a square grid, rotating with 't'."""
+    side = math.ceil(math.sqrt(n))
+    coords = array('f')
+    for i in range(n):
+        x, y = i%side - side/2, i//side - side/2
+        a = t + 0.1*(x + y)
+        coords.extend((x, y, x + 0.8*math.cos(a), y + 0.8*math.sin(a)))
+    return coords
+
+def draw_per_line(dd, coords:array) -> None:
+    line = dd.line
+    for i in range(0, len(coords), 4):
+        line((coords[i], coords[i + 1]), (coords[i + 2], coords[i + 3]))
+
+def draw_bulk(dd, coords:array) -> None:
+    dd.lines(coords)
+
+def run(g, path, coords:array, frames:int) -> float:
+    """Mean frame time in milliseconds."""
+    gpu = g.gpu
+    times = []
+    for frame in range(frames + 2):                     # Two warmup frames
+        t0 = time.perf_counter()
+        gpu.stream.begin_frame()
+        gpu.ctx.clear(*gpu.clear_color)
+        path(gpu.debug_draw, coords)
+        gpu.debug_draw.submit(gpu.queue, gpu.shaders['shader_debug_lines'],
+                              gpu.shaders['shader_debug_text'], g.camera)
+        gpu.queue.flush()
+        gpu.ctx.finish()
+        if frame >= 2: times.append(time.perf_counter() - t0)
+    return 1000*sum(times)/len(times)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('counts', type=int, nargs='*', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--size', type=int, nargs=2, default=(1280,720))
+    args = parser.parse_args()
+    g = game.Game(headless=True, size=args.size)
+    g.gpu.update_transforms()
+    print(f"frames: {args.frames}, {args.size[0]}x{args.size[1]}")
+    print(f"{'N':>8} {'line() ms':>10} {'lines() ms':>11} {'60 fps':>7}")
+    for n in args.counts:
+        coords = vector_field(n, 0.0)
+        per_line = run(g, draw_per_line, coords, args.frames)
+        bulk = run(g, draw_bulk, coords, args.frames)
+        print(f"{n:>8} {per_line:10.3f} {bulk:11.3f} {'yes' if bulk < 1000/60 else 'no':>7}")
+    g.gpu.release()
+
+if __name__ == '__main__':
+    main()
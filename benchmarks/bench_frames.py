@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Frame-time benchmark: render a fixed number of frames per scene, headless.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_frames --frames 500 --out bench.json
+    python -m benchmarks.bench_frames --baseline bench.json
+
+Each scene runs GPU.render() into an offscreen framebuffer. Frame time
+includes waiting for the GPU to finish the frame (GPU.present() calls
+ctx.finish() when headless). Results are JSON: mean, p50, p95, p99 frame
+time in milliseconds and throughput in frames per second.
+
+With --baseline, compare against an earlier result and exit with status 1 if
+any scene's p95 frame time got worse by more than --tolerance.
+
+With --replay, also play back input logs recorded with
+'python game.py --record LOG' (libs/replay.py), as fast as possible: the
+scene 'replay:NAME' is the recorded zoom-and-move session, the same frames
+on every build (of REPLAY_SCENE: no world tiles, they stream at their own
+pace).
+
+    python game.py --record session.input
+    python -m benchmarks.bench_frames --replay session.input --out base.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+import game
+import draw_cube
+from libs.replay import InputReplay
+
+# name: (Game class, GPU.scene, debug HUD on/off, crowd size)
+SCENES = {
+    'square':       (game.Game,      ('test_square',),           False, 0),
+    'player':       (game.Game,      ('test_square', 'player'),  False, 0),
+    'player+hud':   (game.Game,      ('test_square', 'player'),  True,  0),
+    'crowd-10k':    (game.Game,      ('entities',),              False, 10_000),
+    'cube':         (draw_cube.Game, ('test_cube',),             False, 0),
+    'cube+hud':     (draw_cube.Game, ('test_cube',),             True,  0),
+}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def summarize(times:list) -> dict:
+    """Frame time statistics in milliseconds."""
+    ms = [1000*t for t in times]
+    q = statistics.quantiles(ms, n=100)                 # q[k-1] is the k-th percentile
+    return {
+        'mean_ms': statistics.fmean(ms),
+        'p50_ms': q[49],
+        'p95_ms': q[94],
+        'p99_ms': q[98],
+        'fps': len(ms)/(sum(ms)/1000),
+        }
+
+def run_scene(name:str, frames:int, warmup:int, size:tuple) -> dict:
+    game_class, scene, debug, crowd = SCENES[name]
+    g = game_class(headless=True, size=size)
+    g.gpu.scene = scene
+    g.debug = debug
+    if crowd: g.spawn_crowd(crowd)
+    player = getattr(g, 'player', None)
+    if player: player.steer(1, 0)                       # Keep moving so the HUD changes
+    times = []
+    for frame in range(warmup + frames):
+        t0 = time.perf_counter()
+        if player: g.update(g.dt)
+        if g.debug: g.text_hud.update()
+        g.gpu.render()
+        g.clock.tick()
+        if frame >= warmup: times.append(time.perf_counter() - t0)
+    g.gpu.release()
+    return summarize(times)
+
+# GPU.scene of replays: not the world tiles, they bake in worker processes and differ from run to run
+REPLAY_SCENE = ('test_square', 'player')
+
+def run_replay(path:str, warmup:int) -> dict:
+    """Frame times of an input log played back at the size it was recorded."""
+    replay = InputReplay(path)
+    g = game.Game(headless=True, size=replay.size)
+    g.gpu.scene = REPLAY_SCENE
+    g.ui.replay = replay
+    times = []
+    while g.steps < replay.steps:
+        t0 = time.perf_counter()
+        g.replay_frame()
+        if g.steps > warmup: times.append(time.perf_counter() - t0)
+    g.gpu.release()
+    return summarize(times) | {'frames': len(times)}
+
+def compare(results:dict, baseline:dict, tolerance:float) -> bool:
+    """Print p95 changes. Return False if any scene regressed beyond tolerance."""
+    ok = True
+    for name,stats in results['scenes'].items():
+        old = baseline['scenes'].get(name)
+        if old is None: continue
+        change = stats['p95_ms']/old['p95_ms'] - 1
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f"{name:>12}: p95 {old['p95_ms']:7.3f} -> {stats['p95_ms']:7.3f} ms "
+              f"({100*change:+.1f}%){' REGRESSION' if regressed else ''}", file=sys.stderr)
+    return ok
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--size', type=int, nargs=2, default=(16*50,9*50), metavar=('W','H'))
+    parser.add_argument('--scenes', nargs='+', default=list(SCENES), choices=list(SCENES))
+    parser.add_argument('--out', help="Write JSON results to this file (default: stdout)")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--replay', nargs='+', default=[], metavar='LOG', help="Input logs to play back")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed p95 regression (0.10 = 10%%)")
+    args = parser.parse_args()
+    results = {
+        'commit': git_commit(),
+        'frames': args.frames,
+        'size': list(args.size),
+        'scenes': {name: run_scene(name, args.frames, args.warmup, tuple(args.size)) for name in args.scenes},
+        }
+    for path in args.replay:
+        results['scenes'][f"replay:{Path(path).stem}"] = run_replay(path, args.warmup)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance): return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
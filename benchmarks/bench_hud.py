@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Benchmark HUD text: per-frame surface and texture rebuild vs glyph atlas.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_hud
+    python -m benchmarks.bench_hud --frames 100 --size 1920 1080
+
+Renders offscreen with a standalone (headless) moderngl context, so no window
+is needed.
+"""
+
+import argparse
+import time
+import pygame
+from pygame import Surface, Rect, Color
+import moderngl
+from array import array
+from libs.meshes import MeshRegistry
+from libs.text import Text, GlyphAtlas, AtlasText
+
+# The old HUD shader: a textured quad in clip space
+LEGACY_VERT = """#version 330
+in vec2 vert_pos;
+in vec2 tex_coord;
+out vec2 uv;
+void main(){
+    uv = tex_coord;
+    gl_Position = vec4(vert_pos, 0.0, 1.0);
+}
+"""
+LEGACY_FRAG = """#version 330
+in vec2 uv;
+uniform sampler2D tex;
+uniform float alpha;
+out vec4 color;
+void main(){
+    color = vec4(texture(tex, uv).rgb, alpha);
+}
+"""
+
+def load_program(ctx:moderngl.Context, name:str) -> moderngl.Program:
+    with open(f"shaders/{name}.vert") as f: vert = f.read()
+    with open(f"shaders/{name}.frag") as f: frag = f.read()
+    return ctx.program(vertex_shader=vert, fragment_shader=frag)
+
+def hud_text(frame:int, size:tuple) -> Text:
+    """Five lines of debug text. Some of them change every frame."""
+    text = Text(15)
+    text.msg = "\n".join([
+        f"FPS: {60 + frame%7/10:0.1f}",
+        f"Window: {size}",
+        f"Player: (2, 2) at [{frame%11}, 0]",
+        f"Mouse: ({frame%800}, 200) ({frame/1000:0.3f},0.200)",
+        f"Scale: {0.1:0.2e}",
+        ])
+    return text
+
+def render_legacy(ctx:moderngl.Context, program:moderngl.Program, text:Text, win_size:tuple) -> None:
+    """The old GPU.render_hud: full-window surface, new buffer and texture every frame."""
+    temp_surf = pygame.Surface(win_size)
+    size = text.render(temp_surf, Color(255,255,255))
+    surf = Surface(size)
+    surf.blit(temp_surf, (0,0), Rect((0,0),size))
+    r = 2*(size[0]/win_size[0] - 0.5)
+    b = -2*(size[1]/win_size[1] - 0.5)
+    vbo = ctx.buffer(data=array('f', [-1,1,0,0, r,1,1,0, -1,b,0,1, r,b,1,1]))
+    vao = ctx.vertex_array(program, [(vbo, '2f 2f', 'vert_pos', 'tex_coord')])
+    tex = ctx.texture(surf.get_size(), 4)
+    tex.filter = (moderngl.NEAREST, moderngl.NEAREST)
+    tex.swizzle = 'BGRA'
+    tex.write(surf.get_view('1'))
+    tex.use(0)
+    program['tex'] = 0
+    program['alpha'] = 1.0
+    vao.render(mode=moderngl.TRIANGLE_STRIP)
+    tex.release()
+    vao.release()
+    vbo.release()
+
+def bench(name:str, ctx:moderngl.Context, render, frames:int, size:tuple) -> float:
+    """Return mean HUD time per frame in milliseconds."""
+    times = []
+    for frame in range(frames):
+        text = hud_text(frame, size)
+        ctx.clear(0.1,0.1,0.8)                          # Not timed: same for both paths
+        ctx.finish()
+        t0 = time.perf_counter()
+        render(text)
+        ctx.finish()
+        times.append(time.perf_counter() - t0)
+    mean = 1000*sum(times)/len(times)
+    print(f"{name:>8}: {mean:0.3f} ms/frame ({frames} frames at {size[0]}x{size[1]})")
+    return mean
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--size', type=int, nargs=2, default=(3840,2160), metavar=('W','H'), help="Default: 4K fullscreen")
+    args = parser.parse_args()
+    size = tuple(args.size)
+    pygame.font.init()
+    ctx = moderngl.create_standalone_context(backend='egl')
+    fbo = ctx.simple_framebuffer(size)
+    fbo.use()
+    ctx.blend_func = moderngl.PREMULTIPLIED_ALPHA
+    ctx.enable(moderngl.BLEND)
+    # Old path
+    program = ctx.program(vertex_shader=LEGACY_VERT, fragment_shader=LEGACY_FRAG)
+    legacy = bench('legacy', ctx, lambda text: render_legacy(ctx, program, text, size), args.frames, size)
+    # Glyph atlas
+    program = load_program(ctx, 'text')
+    program['win_size'] = size
+    program['text_color'] = (1.0, 1.0, 1.0, 1.0)
+    meshes = MeshRegistry(ctx)
+    atlas_text = AtlasText(meshes, 'hud', GlyphAtlas(ctx, hud_text(0, size).font))
+    def render_atlas(text:Text) -> None:
+        atlas_text.update(text.msg_lines, text.pos)
+        atlas_text.render(program)
+    atlas = bench('atlas', ctx, render_atlas, args.frames, size)
+    print(f"speedup: {legacy/atlas:0.1f}x, characters uploaded: {atlas_text.uploads}")
+
+if __name__ == '__main__':
+    main()
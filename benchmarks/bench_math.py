@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Micro-benchmarks for libs/math
+
+Run from the repo root:
+
+    python -m benchmarks.bench_math [N]
+
+Times the batched operations on N vectors (default 1M) and, for comparison,
+transforming points one at a time with Transform4D * Point3D.
+"""
+
+import argparse
+import time
+import random
+from array import array
+from libs.math import Transform4D, Point3D
+from libs.math import batch
+
+def timeit(name:str, n:int, f, repeat:int=3) -> float:
+    """Print and return the best time in milliseconds."""
+    best = min(_time(f) for _ in range(repeat))
+    print(f"{name:>24}: {1000*best:9.3f} ms ({1e9*best/n:7.2f} ns/vector)")
+    return 1000*best
+
+def _time(f) -> float:
+    t0 = time.perf_counter()
+    f()
+    return time.perf_counter() - t0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('n', type=int, nargs='?', default=1_000_000, help="Vectors")
+    n = parser.parse_args().n
+    print(f"N = {n}, numpy: {batch.HAVE_NUMPY}")
+    random.seed(0)
+    a = array('f', [random.uniform(-1,1) for _ in range(3*n)])
+    b = array('f', [random.uniform(-1,1) for _ in range(3*n)])
+    out = batch.zeros(n)
+    m = Transform4D.make_rotation_z(0.3)*Transform4D.make_translation(1,2,3)*Transform4D.make_scale(2,2,2)
+    timeit("transform_points", n, lambda: batch.transform_points(m, a, out=out))
+    timeit("transform_points (2D)", n, lambda: batch.transform_points(m, a[:2*n], dim=2))
+    timeit("transform_vectors", n, lambda: batch.transform_vectors(m, a, out=out))
+    timeit("normalize", n, lambda: batch.normalize(a, out=out))
+    timeit("dot", n, lambda: batch.dot(a, b))
+    timeit("cross", n, lambda: batch.cross(a, b, out=out))
+    # One point at a time, on a subset: this is the loop the batch functions replace
+    k = min(n, 100_000)
+    points = [Point3D(*a[3*i:3*i + 3]) for i in range(k)]
+    timeit("Transform4D*Point3D loop", k, lambda: [m*p for p in points], repeat=1)
+
+if __name__ == '__main__':
+    main()
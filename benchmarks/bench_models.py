@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Model loading: parse (cold) vs memory-mapped cache (warm)
+
+Run from the repo root:
+
+    python -m benchmarks.bench_models [--triangles N] [--model PATH]
+
+Without --model, writes an OBJ grid of about N triangles (default 1M) to a
+temporary directory. Each load runs in a fresh process, so peak RSS
+(ru_maxrss) is for that load alone: load_model() then upload_model() to a
+headless moderngl context.
+"""
+
+import argparse
+import json
+import math
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+def write_grid_obj(path:Path, triangles:int) -> None:
+    """A bumpy n x n grid of quads, two triangles each, with normals."""
+    n = max(2, int(math.sqrt(triangles/2)))
+    with open(path, 'w') as f:
+        for i in range(n + 1):
+            f.writelines(f"v {i/n:.6f} {j/n:.6f} {0.05*math.sin(20*i/n)*math.cos(20*j/n):.6f}\n"
+                         for j in range(n + 1))
+        f.write("vn 0 0 1\n")
+        for i in range(n):
+            for j in range(n):
+                a = i*(n + 1) + j + 1                   # OBJ indices start at 1
+                b, c, d = a + 1, a + n + 1, a + n + 2
+                f.write(f"f {a}//1 {c}//1 {d}//1\nf {a}//1 {d}//1 {b}//1\n")
+
+def load_once(path:str) -> None:
+    """Child process: load, upload, report time and peak RSS as JSON."""
+    import moderngl
+    from libs.models import load_model, upload_model
+    from libs.meshes import MeshRegistry
+    ctx = moderngl.create_standalone_context(backend='egl')
+    meshes = MeshRegistry(ctx)
+    t0 = time.perf_counter()
+    model = load_model(path)
+    upload_model(meshes, 'model', model)
+    ctx.finish()
+    ms = 1000*(time.perf_counter() - t0)
+    triangles = model.triangle_count
+    model.close()
+    print(json.dumps({'ms': ms, 'triangles': triangles,
+                      'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024}))
+
+def run(path:Path) -> dict:
+    out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_models', '--load', str(path)],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--triangles', type=int, default=1_000_000)
+    parser.add_argument('--model', help="OBJ or PLY file to load instead of a generated grid")
+    parser.add_argument('--load', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.load: return load_once(args.load)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.model) if args.model else Path(tmp)/'grid.obj'
+        if not args.model: write_grid_obj(path, args.triangles)
+        path.with_name(path.name + '.meshcache').unlink(missing_ok=True)
+        print(f"{path.name}: {path.stat().st_size/2**20:0.1f} MB")
+        for name in ('cold', 'warm'):
+            r = run(path)
+            print(f"{name:>5}: {r['triangles']} triangles in {r['ms']:9.2f} ms, peak RSS {r['maxrss_mb']:0.1f} MB")
+        cache = path.with_name(path.name + '.meshcache')
+        print(f"cache: {cache.stat().st_size/2**20:0.1f} MB")
+        if args.model: cache.unlink()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""GPU resource cache: a texture set bigger than the memory budget
+
+Run from the repo root:
+
+    python -m benchmarks.bench_residency [--textures N] [--size PX] [--budget MIB]
+
+Writes N PNG images to a temporary directory and loads them with
+GPU.assets.load_texture() (libs/assets.py). Then renders headless frames
+that each use a few of them, through GPU.residency (libs/residency.py) with
+and without the --budget, in three access patterns:
+
+    hot     the same few textures every frame: the working set fits
+    skewed  mostly a small popular set, sometimes any texture
+    scan    every texture in turn: the worst case for LRU, every use misses
+
+Prints the hits, misses (reloads from the file) and evictions, the most
+bytes resident at the end of a frame, and the mean and worst frame time.
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+import pygame
+import game
+
+def write_images(directory:Path, n:int, size:int) -> list:
+    paths = []
+    surf = pygame.Surface((size, size))
+    for i in range(n):
+        surf.fill(((37*i)%256, (91*i)%256, (173*i)%256))
+        pygame.draw.circle(surf, (255,255,255), (size//2, size//2), size//4 + i%(size//4))
+        paths.append(directory/f"texture{i}.png")
+        pygame.image.save(surf, str(paths[-1]))
+    return paths
+
+def pattern(name:str, n:int, per_frame:int, frames:int, seed:int=0) -> list:
+    """Texture indices used by each frame."""
+    rng = random.Random(seed)
+    match name:
+        case 'hot':    return [list(range(per_frame)) for _ in range(frames)]
+        case 'skewed': return [[rng.randrange(n//8) if rng.random() < 0.9 else rng.randrange(n)
+                                for _ in range(per_frame)] for _ in range(frames)]
+        case 'scan':   return [[(f*per_frame + i)%n for i in range(per_frame)] for f in range(frames)]
+
+def run(paths:list, budget:int, uses:list) -> dict:
+    g = game.Game(headless=True, size=(640,360))
+    g.debug = False
+    gpu = g.gpu
+    gpu.scene = ()                                      # Counters: only the textures
+    cache = gpu.residency
+    cache.budget = None                                 # Load them all first
+    futures = [gpu.assets.load_texture(f"texture{i}", path) for i,path in enumerate(paths)]
+    while gpu.assets.pending: gpu.assets.update()
+    for f in futures: f.result()
+    gpu.render()
+    cache.budget = budget
+    hits, misses, evictions = cache.hits, cache.misses, cache.evictions
+    times = []
+    peak = 0
+    for frame in uses:
+        t0 = time.perf_counter()
+        for i in frame: gpu.assets.texture(f"texture{i}")
+        gpu.render()
+        times.append(1000*(time.perf_counter() - t0))
+        peak = max(peak, cache.used)
+    result = {
+        'hits': cache.hits - hits,
+        'misses': cache.misses - misses,
+        'evictions': cache.evictions - evictions,
+        'peak': peak/2**20,
+        'mean': statistics.fmean(times),
+        'worst': max(times),
+        }
+    gpu.release()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--textures', type=int, default=64)
+    parser.add_argument('--size', type=int, default=512, help="Texture width and height in pixels")
+    parser.add_argument('--budget', type=float, default=16, help="MiB")
+    parser.add_argument('--per-frame', type=int, default=4, help="Textures used per frame")
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+    mib = args.textures*args.size**2*4/2**20
+    print(f"{args.textures} textures of {args.size}x{args.size} ({mib:0.0f} MiB), "
+          f"{args.per_frame} per frame, budget {args.budget:0.0f} MiB")
+    print(f"{'':>15} {'hits':>6} {'misses':>7} {'evicted':>8} {'peak MiB':>9} {'mean ms':>8} {'worst ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_images(Path(tmp), args.textures, args.size)
+        for name in ('hot', 'skewed', 'scan'):
+            uses = pattern(name, args.textures, args.per_frame, args.frames)
+            for label,budget in (('no budget', None), ('budget', int(args.budget*2**20))):
+                r = run(paths, budget, uses)
+                print(f"{name + ' ' + label:>15} {r['hits']:>6} {r['misses']:>7} {r['evictions']:>8} "
+                      f"{r['peak']:9.1f} {r['mean']:8.2f} {r['worst']:9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Dynamic resolution: fill-bound frames at a fixed vs a dynamic scale
+
+Run from the repo root:
+
+    python -m benchmarks.bench_resolution [--size W H] [--target MS]
+
+Renders a crowd of big, overlapping sprites: the frame is bound by fragment
+work, like fullscreen at a high resolution. Runs it twice:
+
+    fixed    the scene at the window resolution
+    dynamic  DynamicResolution steers the scale to fit --target ms (libs/resolution.py)
+
+Prints frame time mean and p95 (the last half of the frames, after the scale
+settles), the final scale and the smoothed time the scale is steered by
+(headless: the whole frame, timed on the CPU).
+"""
+
+import argparse
+import statistics
+import time
+import game
+
+def run(args, dynamic:bool) -> dict:
+    g = game.Game(headless=True, size=args.size)
+    g.gpu.scene = ('entities',)
+    g.debug = False
+    g.spawn_crowd(args.crowd)
+    size = g.entities.view('size')
+    for i in range(len(size)): size[i] = args.sprite_size   # Big sprites: lots of overdraw
+    g.camera.zoom(args.zoom)
+    g.gpu.mark_camera_dirty()
+    resolution = g.gpu.resolution
+    resolution.enabled = dynamic
+    resolution.target_ms = args.target
+    times = []
+    for frame in range(args.frames):
+        t0 = time.perf_counter()
+        g.gpu.render()
+        times.append(1000*(time.perf_counter() - t0))
+    settled = sorted(times[len(times)//2:])
+    result = {
+        'mean': statistics.fmean(settled),
+        'p95': settled[int(0.95*(len(settled) - 1))],
+        'scale': resolution.scale,
+        'measured_ms': resolution.gpu_ms,
+        }
+    g.gpu.release()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--size', type=int, nargs=2, default=(1920,1080))
+    parser.add_argument('--target', type=float, default=1000/60, help="Frame budget in ms")
+    parser.add_argument('--crowd', type=int, default=2_000)
+    parser.add_argument('--sprite-size', type=float, default=4.0, help="World units")
+    parser.add_argument('--zoom', type=float, default=1.0)
+    args = parser.parse_args()
+    print(f"frames: {args.frames}, {args.size[0]}x{args.size[1]}, target {args.target:0.1f} ms")
+    print(f"{'':>8} {'mean ms':>8} {'p95 ms':>7} {'scale':>6} {'measured ms':>12}")
+    for name,dynamic in (('fixed', False), ('dynamic', True)):
+        r = run(args, dynamic)
+        print(f"{name:>8} {r['mean']:8.2f} {r['p95']:7.2f} {r['scale']:6.3f} {r['measured_ms']:12.2f}")
+
+if __name__ == '__main__':
+    main()
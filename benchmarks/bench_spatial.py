@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Spatial grid: render cost follows the visible count, not the total
+
+Run from the repo root:
+
+    python -m benchmarks.bench_spatial [N]
+
+Spawns a crowd of N entities (default 100k), then zooms in step by step. At
+each zoom level it times a frame of GPU.render_entities() (visible-region
+query, gather, upload, one instanced draw) and, for comparison, drawing every
+entity. Zoomed in, sprites are large: headless (llvmpipe) frames become fill
+rate bound either way. Also times SpatialGrid.sync() after one update and the queries.
+"""
+
+import argparse
+import time
+import game
+from libs.math import batch
+
+def frame_ms(g, frames:int=10) -> float:
+    """Mean milliseconds to draw the entities, waiting for the GPU."""
+    gpu = g.gpu
+    if gpu.camera_dirty: gpu.update_transforms()
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        gpu.ctx.clear(*gpu.clear_color)
+        gpu.render_entities()
+        gpu.queue.flush()
+        gpu.ctx.finish()
+    return 1000*(time.perf_counter() - t0)/frames
+
+def draw_all_ms(g, frames:int=10) -> float:
+    gpu, entities = g.gpu, g.entities
+    if gpu.camera_dirty: gpu.update_transforms()
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        gpu.ctx.clear(*gpu.clear_color)
+        gpu.write_sprites(entities.count, entities.interpolated(g.alpha),
+                          entities.view('size'), entities.view('color'))
+        gpu.render_sprites()
+        gpu.queue.flush()
+        gpu.ctx.finish()
+    return 1000*(time.perf_counter() - t0)/frames
+
+def ms(f) -> float:
+    t0 = time.perf_counter()
+    f()
+    return 1000*(time.perf_counter() - t0)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('n', type=int, nargs='?', default=100_000, help="Entities")
+    n = parser.parse_args().n
+    g = game.Game(headless=True, size=(1280,720))
+    g.spawn_crowd(n - 1)                                # The player is one more
+    print(f"N = {n}, numpy: {batch.HAVE_NUMPY}, occupied cells: {len(g.grid)}")
+    print(f"update + sync: {ms(lambda: g.update(g.dt)):8.3f} ms")
+    print(f"query_point:   {ms(lambda: g.grid.query_point(0, 0)):8.3f} ms")
+    print(f"nearest k=10:  {ms(lambda: g.grid.nearest(0, 0, 10)):8.3f} ms")
+    print(f"{'scale':>8} {'drawn':>8} {'culled ms':>10} {'all ms':>8}")
+    for _ in range(7):
+        culled = frame_ms(g)
+        all_ms = draw_all_ms(g)
+        print(f"{g.camera.scale:8.3f} {g.gpu.entities_drawn:8} {culled:10.3f} {all_ms:8.3f}")
+        g.camera.zoom(2.0)
+        g.gpu.mark_camera_dirty()
+    g.gpu.release()
+
+if __name__ == '__main__':
+    main()
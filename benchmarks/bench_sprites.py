@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Entity-count scaling: instanced sprites vs one draw call per entity
+
+Run from the repo root:
+
+    python -m benchmarks.bench_sprites [N ...]
+
+For each entity count N (default 100, 1k, 10k, 100k), renders headless frames
+of N moving quads two ways:
+
+    per-entity  render_player() style: one xlat_mat write and one draw per quad
+    instanced   GPU.write_sprites() then one vao.render(instances=N)
+
+Both paths move the same positions every frame (a rotation about the origin,
+applied with libs/math/batch). The per-entity path is skipped above
+--max-per-entity entities: it takes seconds per frame.
+"""
+
+import argparse
+import random
+import time
+from array import array
+import game
+from libs.math import Transform4D
+from libs.math import batch
+
+def make_entities(n:int) -> tuple:
+    """Positions, sizes and colors of n quads, one array per attribute."""
+    random.seed(0)
+    pos = array('f', [random.uniform(-40,40) for _ in range(2*n)])
+    size = array('f', [random.uniform(0.1,0.5) for _ in range(2*n)])
+    color = array('f', [random.random() if i%4 != 3 else 1.0 for i in range(4*n)])
+    return pos, size, color
+
+def render_per_entity(gpu, pos:array, size:array, n:int) -> None:
+    shader = gpu.shaders['shader_debug_player']
+    xlat_mat = shader['xlat_mat']
+    for i in range(n):
+        x,y,w,h = pos[2*i], pos[2*i + 1], size[2*i], size[2*i + 1]
+        xlat_mat.write(Transform4D(w,0,0,x, 0,h,0,y, 0,0,1,0).buffer)
+        gpu.meshes.render('player', shader)
+    gpu.queue.shadow.reset()                            # Drew around the render queue
+
+def render_instanced(gpu, pos:array, size:array, n:int) -> None:
+    gpu.write_sprites(n, pos)                           # Sizes and colors do not change
+    gpu.render_sprites()
+    gpu.queue.flush()
+
+def run(g, path, n:int, frames:int) -> float:
+    """Mean frame time in milliseconds."""
+    pos, size, color = make_entities(n)
+    g.gpu.write_sprites(n, pos, size, color)
+    spin = Transform4D.make_rotation_z(0.01)
+    times = []
+    for frame in range(frames + 2):                     # Two warmup frames
+        t0 = time.perf_counter()
+        batch.transform_points(spin, pos, dim=2, out=pos)
+        if g.gpu.camera_dirty: g.gpu.update_transforms()
+        g.gpu.ctx.clear(*g.gpu.clear_color)
+        path(g.gpu, pos, size, n)
+        g.gpu.ctx.finish()
+        if frame >= 2: times.append(time.perf_counter() - t0)
+    return 1000*sum(times)/len(times)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('counts', type=int, nargs='*', default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--max-per-entity', type=int, default=10_000)
+    parser.add_argument('--size', type=int, nargs=2, default=(1280,720))
+    args = parser.parse_args()
+    g = game.Game(headless=True, size=args.size)
+    print(f"numpy: {batch.HAVE_NUMPY}, frames: {args.frames}, {args.size[0]}x{args.size[1]}")
+    print(f"{'N':>8} {'per-entity ms':>14} {'instanced ms':>13} {'speedup':>8}")
+    for n in args.counts:
+        instanced = run(g, render_instanced, n, args.frames)
+        if n <= args.max_per_entity:
+            per_entity = run(g, render_per_entity, n, args.frames)
+            print(f"{n:>8} {per_entity:14.3f} {instanced:13.3f} {per_entity/instanced:7.1f}x")
+        else:
+            print(f"{n:>8} {'-':>14} {instanced:13.3f} {'-':>8}")
+    g.gpu.release()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Per-frame geometry: a new buffer every frame vs the stream buffer
+
+Run from the repo root:
+
+    python -m benchmarks.bench_stream [--frames N]
+
+Every frame pushes a varying number of line segments (random walk between
+--min and --max vertices, split into several draws) two ways:
+
+    per-frame  ctx.buffer(data) and a VAO for each draw, released after the frame
+    stream     StreamBuffer.alloc() for each draw, one cached VAO (libs/stream.py)
+
+Prints frame time mean, standard deviation and p99, and how many buffer
+objects each path created.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from array import array
+import moderngl
+import game
+from libs.math import Transform4D
+from libs.stream import StreamBuffer
+
+DRAWS = 8                                               # Draws per frame
+
+def make_lines(rng:random.Random, n:int) -> array:
+    """n//2 short segments: the cost is in the upload, not the fill."""
+    lines = array('f')
+    for _ in range(n//2):
+        x, y = rng.uniform(-20, 20), rng.uniform(-20, 20)
+        lines.extend((x, y, x + 0.01, y + 0.01))
+    return lines
+
+def render_per_frame(gpu, chunks:list, state:dict) -> None:
+    program = gpu.shaders['shader_debug_player']
+    made = []
+    for chunk in chunks:
+        vbo = gpu.ctx.buffer(data=chunk)
+        vao = gpu.ctx.vertex_array(program, [(vbo, '2f', 'vert_pos')])
+        gpu.queue.submit(program, vao, mode=moderngl.LINES)
+        made.append((vbo, vao))
+    gpu.queue.flush()
+    for vbo,vao in made:
+        vao.release()
+        vbo.release()
+    state['buffers'] += len(made)
+
+def render_stream(gpu, chunks:list, state:dict) -> None:
+    program = gpu.shaders['shader_debug_player']
+    stream = state['stream']
+    stream.begin_frame()
+    vao = stream.vao(program, '2f', ('vert_pos',))
+    for chunk in chunks:
+        first = stream.alloc(chunk, stride=8)
+        gpu.queue.submit(program, vao, mode=moderngl.LINES, first=first, vertices=len(chunk)//2)
+    gpu.queue.flush()
+
+def run(g, path, args) -> dict:
+    rng = random.Random(0)
+    state = {'buffers': 0, 'stream': StreamBuffer(g.gpu.ctx, size=args.stream_size)}
+    identity = Transform4D(1,0,0,0, 0,1,0,0, 0,0,1,0).buffer
+    g.gpu.shaders['shader_debug_player']['xlat_mat'].write(identity)
+    g.gpu.queue.shadow.reset()
+    n = args.min
+    times = []
+    for frame in range(args.frames + 2):                # Two warmup frames
+        n = max(args.min, min(args.max, n + rng.randint(-args.max//10, args.max//10)))
+        n -= n%(2*DRAWS)
+        chunks = [make_lines(rng, n//DRAWS) for _ in range(DRAWS)]
+        t0 = time.perf_counter()
+        if g.gpu.camera_dirty: g.gpu.update_transforms()
+        g.gpu.ctx.clear(*g.gpu.clear_color)
+        path(g.gpu, chunks, state)
+        g.gpu.ctx.finish()
+        if frame >= 2: times.append(1000*(time.perf_counter() - t0))
+    stream = state['stream']
+    if path is render_stream: state['buffers'] = 1
+    result = {
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times),
+        'p99': sorted(times)[min(len(times) - 1, round(0.99*(len(times) - 1)))],
+        'buffers': state['buffers'],
+        'orphans': stream.orphans,
+        }
+    stream.release()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--min', type=int, default=1_000, help="Vertices per frame")
+    parser.add_argument('--max', type=int, default=100_000, help="Vertices per frame")
+    parser.add_argument('--stream-size', type=int, default=2**20, help="Initial stream buffer bytes")
+    parser.add_argument('--size', type=int, nargs=2, default=(1280,720))
+    args = parser.parse_args()
+    g = game.Game(headless=True, size=args.size)
+    print(f"frames: {args.frames}, {args.min}..{args.max} vertices/frame in {DRAWS} draws")
+    print(f"{'path':>10} {'mean ms':>8} {'stdev':>7} {'p99 ms':>7} {'buffers':>8} {'orphans':>8}")
+    for name,path in (('per-frame', render_per_frame), ('stream', render_stream)):
+        r = run(g, path, args)
+        print(f"{name:>10} {r['mean']:8.3f} {r['stdev']:7.3f} {r['p99']:7.3f} "
+              f"{r['buffers']:>8} {r['orphans']:>8}")
+    g.gpu.release()
+
+if __name__ == '__main__':
+    main()
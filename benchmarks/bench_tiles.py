@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""World tiles: a zoom sweep from scale 1e-3 to 1e3, and back
+
+Run from the repo root:
+
+    python -m benchmarks.bench_tiles [--steps N] [--size W H] [--budget MIB]
+
+Draws only the world tiles (GPU.scene = ('tiles',), libs/tiles.py) at N
+zoom levels evenly spaced in log scale from 1e-3 to 1e3, then back out.
+At each one it renders frames, paced to 60 fps like vsync (the idle time
+is when the worker processes bake), until every visible tile is baked at
+its level, then times --frames more. Prints:
+
+    level      tile level picked for the scale
+    tiles      tiles drawn
+    triangles  triangles drawn
+    full       triangles to draw the view at the finest level instead
+    stream     frames until every visible tile was in: 0 if all were cached
+    mean ms    frame time once streamed
+    resident   tiles kept on the GPU (the rest were evicted, least recently drawn first)
+
+Zooming back out, the coarser tiles are still cached: nothing to stream,
+unless the tile --budget is too small to keep them.
+"""
+
+import argparse
+import statistics
+import time
+import game
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, default=13)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--size', type=int, nargs=2, default=(1280,720))
+    parser.add_argument('--budget', type=float, default=32, help="MiB of tiles kept on the GPU")
+    parser.add_argument('--max-stream', type=int, default=3000, help="Give up streaming a step after this many frames")
+    args = parser.parse_args()
+    g = game.Game(headless=True, size=args.size)
+    g.debug = False
+    gpu = g.gpu
+    gpu.scene = ('tiles',)
+    tiles = gpu.tiles
+    tiles.cache.budget = int(args.budget*2**20)
+    finest = (tiles.tile_side(tiles.min_level)/tiles.cells)**2/2    # World area per triangle
+    scales = [10**(-3 + 6*k/(args.steps - 1)) for k in range(args.steps)]
+    print(f"{args.size[0]}x{args.size[1]}, {tiles.cells}x{tiles.cells} cells per tile")
+    print(f"{'scale':>8} {'level':>6} {'tiles':>6} {'triangles':>10} {'full':>9} {'stream':>7} "
+          f"{'mean ms':>8} {'resident':>9}")
+    t_start = time.perf_counter()
+    for scale in scales + scales[-2::-1]:
+        g.camera.zoom(scale/g.camera.scale)
+        gpu.mark_camera_dirty()
+        streamed = 0
+        while True:
+            t0 = time.perf_counter()
+            gpu.render()
+            if tiles.complete: break
+            gpu.assets.update()
+            streamed += 1
+            if streamed >= args.max_stream: break
+            time.sleep(max(0.0, 1/60 - (time.perf_counter() - t0)))
+        times = []
+        for _ in range(args.frames):
+            t0 = time.perf_counter()
+            gpu.render()
+            times.append(1000*(time.perf_counter() - t0))
+        l,b,r,t = g.camera.visible_rect
+        full = (r - l)*(t - b)/finest
+        print(f"{scale:8.0e} {tiles.level:>6} {tiles.drawn:>6} {tiles.triangles:>10} {full:9.1e} "
+              f"{streamed:>7} {statistics.fmean(times):8.2f} {len(tiles.cache.resources()):>9}")
+    print(f"{tiles.baked} tiles baked in {time.perf_counter() - t_start:0.1f} s")
+    gpu.release()
+
+if __name__ == '__main__':
+    main()
@@ -6,14 +6,16 @@
 from pathlib import Path
 import atexit
 import pygame
-from pygame import Surface, Rect, Color
 from array import array
 from libs.utils import setup_logging, check_array_itemsize
 from libs.ui import UI
-from libs.os_window import OsWindow
+from libs.os_window import OsWindow, HeadlessWindow
 from libs.text import Text
+from libs.gpu import GPU
+from libs.camera import Camera
+from libs.profiler import Profiler
+from libs.meshopt import optimize_mesh
 import moderngl
-import sys
 
 def shutdown(filename:str) -> None:
     logger.info(f"Shutdown {filename}")
@@ -21,138 +23,54 @@ def shutdown(filename:str) -> None:
     pygame.quit()
 
 class TextHud(Text):
+    """Debug HUD. Created once, then updated in place every frame."""
     def __init__(self, game, size:int=15) -> None:
         super().__init__(size)
         self.game = game
-        self.msg += f"FPS: {self.game.clock.get_fps():0.1f}"
-        self.msg += f"\nWindow: {self.game.os_window.size}"
-        mpos = pygame.mouse.get_pos()
-        self.msg += f"\nMouse: {mpos})"
-
-class GPU:
-    def __init__(self, game) -> None:
-        self.game = game
-
-        # Create a context
-        self.ctx = moderngl.create_context()
-        self.log_ctx_info()
-
-        # Load shaders
-        self.shaders = self.load_shaders()
-
-        # Update transforms
-        self.update_transforms()
-
-    def log_ctx_info(self) -> None:
-        ### GL_VENDOR: Intel
-        logger.debug(f"GL_VENDOR: {self.ctx.info['GL_VENDOR']}")
-        ### GL_RENDERER: Mesa Intel(R) Graphics (ADL GT2)
-        logger.debug(f"GL_RENDERER: {self.ctx.info['GL_RENDERER']}")
-        ### GL_VERSION: 4.6 (Compatibility Profile) Mesa 23.2.1-1ubuntu3.1~22.04.2
-        logger.debug(f"GL_VERSION: {self.ctx.info['GL_VERSION']}")
-
-    def update_transforms(self) -> None:
-        """Update transforms that are global to all GPU rendering."""
-        # Correct for aspect ratio
-        a = self.game.os_window.size[1]/self.game.os_window.size[0]
-        self.proj_mat = array('f', [
-            a, 0, 0, 0,
-            0, 1, 0, 0,
-            0, 0, 1, 0,
-            0, 0, 0, 1,
-            ])
-        a = 1 # self.game.scale
-        self.view_mat = array('f', [
-            a, 0, 0, 0,
-            0, a, 0, 0,
-            0, 0, a, 0,
-            0, 0, 0, 1,
-            ])
-
-    def load_shaders(self) -> dict:
-        shaders = {}
-        # HUD
-        ### f.read(): Read until EOF. See https://docs.python.org/3/library/io.html#io.BufferedIOBase.read
-        with open("shaders/hud.vert") as f: vert = f.read()
-        with open("shaders/hud.frag") as f: frag = f.read()
-        shader = self.ctx.program(vertex_shader=vert, fragment_shader=frag)
-        shaders['shader_hud'] = shader
-        # Test square
-        with open('shaders/test_square.vert') as f: vert = f.read()
-        with open('shaders/test_square.frag') as f: frag = f.read()
-        shader = self.ctx.program(vertex_shader=vert, fragment_shader=frag)
-        shaders['shader_test_square'] = shader
-        # Test cube
-        with open('shaders/test_cube.vert') as f: vert = f.read()
-        with open('shaders/test_cube.frag') as f: frag = f.read()
-        shader = self.ctx.program(vertex_shader=vert, fragment_shader = frag)
-        shaders['shader_test_cube'] = shader
-        return shaders
-
-    def render(self) -> None:
-        self.ctx.clear(0.05,0.05,0.05)
-        self.ctx.blend_func = moderngl.PREMULTIPLIED_ALPHA # Makes text background transparent
-        self.ctx.enable(moderngl.BLEND)
-        self.render_test_cube()
-        self.render_test_square()
-        if self.game.text_hud: self.render_hud()
-        self.ctx.disable(moderngl.BLEND)
-        pygame.display.flip()
-
-    def render_hud(self) -> None:
-        def make_hud_surf() -> Surface:
-            """Draw HUD to a texture."""
-            # Draw the text on a temporary surface that fills the OS Window
-            temp_surf = pygame.Surface(self.game.os_window.size)
-            # Get the size (w,h) of the Rect that bounds the text
-            size = self.game.text_hud.render(temp_surf, Color(255,255,255))
-            # Create a new surface sized exactly for the text
-            surf = Surface(size)
-            # Copy from the temporary surface to this smaller surface
-            surf.blit(temp_surf, (0,0), Rect((0,0),size))
-            return surf
-        def make_hud_vbo(surf:Surface) -> moderngl.Buffer:
-            """Map HUD to window coordinates (-1:1 coord sys).
-
-            * Subtract 0.5 to get a value between -0.5 and 0.5
-            * Scale by 2 to get a value between -1 and 1
-            * And since down is negative, scale the y value by -2, not +2
-
-            TODO: use self.game.text_hud.pos to control where HUD is placed on screen.
-            """
-            hud_size = surf.get_size()
-            win_size = self.game.os_window.size
-            hud_size_in_win_coordinates = (
-                     2*(hud_size[0]/win_size[0] - 0.5),
-                    -2*(hud_size[1]/win_size[1] - 0.5))
-            # Right edge
-            r = hud_size_in_win_coordinates[0]
-            # Bottom edge
-            b = hud_size_in_win_coordinates[1]
-            return self.ctx.buffer(data=array('f', [
-                # vert  tex
-                -1, 1,  0, 0,
-                 r, 1,  1, 0,
-                -1, b,  0, 1,
-                 r, b,  1, 1,
-                ]))
-        surf = make_hud_surf()
-        vbo = make_hud_vbo(surf)
-        vao = self.ctx.vertex_array(
-                self.shaders['shader_hud'],
-                [(vbo, '2f 2f', 'vert_pos', 'tex_coord')])
-        tex = self.ctx.texture(surf.get_size(), 4)      # 4 color channels
-        tex.filter = (moderngl.NEAREST, moderngl.NEAREST)
-        tex.swizzle = 'BGRA'
-        tex.write(surf.get_view('1'))
-        tex.use(0)
-        self.shaders['shader_hud']['tex'] = 0
-        self.shaders['shader_hud']['alpha'] = 1.0
-        vao.render(mode=moderngl.TRIANGLE_STRIP)
-        tex.release()
-
-    def render_test_cube(self) -> None:
-        """Test aspect ratio with this cube.
+        self.values = {}                                # row: values shown on that line
+
+    def field(self, row:int, template:str, *values) -> None:
+        if self.values.get(row) != values:
+            self.values[row] = values
+            self.set_line(row, template.format(*values))
+
+    def update(self) -> None:
+        self.field(0, "FPS: {:0.1f}", self.game.clock.get_fps())
+        self.field(1, "Window: {}", self.game.os_window.size)
+        self.field(2, "Mouse: {}", self.game.ui.mouse)
+        self.field(3, "Meshes: {} drawn, {} culled", self.game.gpu.meshes_drawn, self.game.gpu.meshes_culled)
+        if self.game.gpu:
+            resolution, (w,h) = self.game.gpu.resolution, self.game.gpu.scene_target.viewport[2:]
+            self.field(4, "Resolution: {:0.0%} ({}x{}, {}), scene {:0.2f} ms", resolution.scale, w, h,
+                       "dynamic" if resolution.enabled else "fixed", round(resolution.gpu_ms, 2))
+        if self.game.gpu:
+            cache = self.game.gpu.residency
+            self.field(5, "GPU cache: {:0.1f} of {:0.0f} MiB, {} hits, {} misses, {} evictions",
+                       round(cache.used/2**20, 1), cache.budget/2**20 if cache.budget else float('inf'), cache.hits, cache.misses, cache.evictions)
+        row = 6
+        if self.game.profiler.enabled:
+            for name,n in self.game.profiler.counter_averages().items():
+                self.field(row, "{:>18}: {:8.1f} per frame", name, n)
+                row += 1
+        self.truncate(row)
+
+    def truncate(self, n:int) -> None:
+        super().truncate(n)
+        for row in [row for row in self.values if row >= n]: del self.values[row]
+
+class CubeGPU(GPU):
+    """Reuse GPU rendering from libs/gpu.py. Draw the test cube instead of the player.
+
+    Scene 'cube_field' is a field_size x field_size grid of test cubes, one
+    draw call each, for testing frustum culling (benchmarks/bench_culling.py).
+    """
+    clear_color = (0.05,0.05,0.05)
+    scene = ('test_cube', 'test_square')
+    field_size = 100                                    # 100x100 = 10k cubes
+    field_spacing = 1.0                                 # World units between cube centers
+
+    def upload_meshes(self) -> None:
+        """Upload the test cube once, along with the base meshes.
 
         Cube: eight vertices
         --------------------
@@ -174,13 +92,11 @@ class GPU:
         0,4,2, # Left
         6,2,0, # Left
         """
-        # Apply transforms
-        self.shaders['shader_test_cube']['proj_mat'] = self.proj_mat # aspect ratio
-        self.shaders['shader_test_cube']['view_mat'] = self.view_mat # zoom and pan
+        super().upload_meshes()
         # Define the cube in world space.
         k = 0.3
         # Eight vertices
-        vbo = self.ctx.buffer(data=array('f', [
+        vertices = array('f', [
             -k, k, k,   # 0 (Front top left)
              k, k, k,   # 1 (Front top right)
             -k,-k, k,   # 2 (Front bottom left)
@@ -189,9 +105,9 @@ class GPU:
              k, k,-k,   # 5 (Back top right)
             -k,-k,-k,   # 6 (Back bottom left)
              k,-k,-k,   # 7 (Back bottom right)
-            ]))
+            ])
         # 12 triangles
-        indices = array('B', [ # 'B": uint8, 'I': uint32
+        triangles = [
             0,1,2, # Front
             1,2,3, # Front
             4,5,6, # Back
@@ -200,51 +116,76 @@ class GPU:
             7,1,3, # Right
             0,4,2, # Left
             6,2,0, # Left
-            ])
-        ibo = self.ctx.buffer(data=indices)
-        vao = self.ctx.vertex_array(
-                self.shaders['shader_test_cube'],
-                [(vbo, '3f', 'vert_pos')],
-                index_buffer=ibo,
-                index_element_size=indices.itemsize)
-        # Render
-        vao.render(mode=moderngl.TRIANGLES)
-        # vao.render(mode=moderngl.LINE_STRIP)
-        # vao.render(mode=moderngl.POINTS)
-        # vao.render(mode=moderngl.LINES)
-        # vao.release()
-
-    def render_test_square(self) -> None:
-        k = 0.2
-        vbo = self.ctx.buffer(data=array('f', [-k,k, k,k, -k,-k, k,-k]))
-        vao = self.ctx.vertex_array(
-                self.shaders['shader_test_square'],
-                [(vbo, '2f', 'vert_pos')])
-        self.shaders['shader_test_square']['proj_mat'] = self.proj_mat
-        self.shaders['shader_test_square']['view_mat'] = self.view_mat
-        vao.render(mode=moderngl.TRIANGLE_STRIP)
+            ]
+        # Pick the index type ('B': 8 vertices) and order for the vertex cache
+        vertices, indices, _ = optimize_mesh(vertices, '3f', triangles)
+        self.meshes.upload('test_cube', vertices, '3f', ('vert_pos',), indices)
+        # Cube field: positions only (x0,y0,z0, x1,y1,z1, ...), every cube shares the test cube mesh
+        n, d = self.field_size, self.field_spacing
+        self.field = array('f', [v for i in range(n) for j in range(n)
+                                   for v in (d*(i - n/2), d*(j - n/2), 0.0)])
+
+    def render_test_cube(self) -> None:
+        """Test aspect ratio with this cube. Transforms come from the camera UBO."""
+        if not self.visible('test_cube'): return
+        self.submit_mesh('test_cube', self.shaders['shader_test_cube'])
+        # self.submit_mesh('test_cube', self.shaders['shader_test_cube'], mode=moderngl.LINE_STRIP)
+        # self.submit_mesh('test_cube', self.shaders['shader_test_cube'], mode=moderngl.POINTS)
+        # self.submit_mesh('test_cube', self.shaders['shader_test_cube'], mode=moderngl.LINES)
+
+    def render_cube_field(self) -> None:
+        """Draw the cubes whose bounding sphere is in the view, one draw call each."""
+        shader = self.shaders['shader_mesh']
+        r = self.meshes['test_cube'].sphere[1]
+        n = len(self.field)//3
+        if self.culling:
+            # The cube is centered on its model space origin: cube positions are sphere centers
+            drawn = self.frustum.cull(self.field, r)
+        else:
+            drawn = range(n)
+        self.meshes_drawn += len(drawn)
+        self.meshes_culled += n - len(drawn)
+        field = self.field
+        for i in drawn:
+            self.submit_mesh('test_cube', shader, uniforms={'model_pos': (field[3*i], field[3*i + 1], field[3*i + 2])})
 
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, headless:bool=False, size:tuple=(16*50,9*50)) -> None:
+        """headless: no window, render offscreen (see benchmarks/bench_frames.py)."""
         check_array_itemsize()
         pygame.init()
         pygame.font.init()
-        self.os_window = OsWindow(gpu_render=True)
-        self.gpu = GPU(self)
+        self.os_window = HeadlessWindow(size) if headless else OsWindow(gpu_render=True)
+        self.gpu = CubeGPU(self)
+        atexit.register(self.gpu.release) # Runs before shutdown() calls pygame.quit()
 
         self.ui = UI(self)
         self.clock = pygame.time.Clock()
         self.debug = True
+        self.camera = Camera(self.os_window.size)       # Mousewheel zooms
+        self.profiler = Profiler(self.gpu.ctx)          # F3: toggle, F4: export trace
+        self.text_hud = TextHud(self)
 
     def run(self) -> None:
         while True: self.game_loop()
 
     def game_loop(self) -> None:
-        self.text_hud = TextHud(self) if self.debug else None
-        self.ui.handle_events()
+        self.profiler.begin_frame()
+        if self.debug:
+            with self.profiler.stage('hud'): self.text_hud.update()
+        with self.profiler.stage('handle_events'): self.ui.handle_events()
         self.gpu.render()
+        self.profiler.end_frame()
         self.clock.tick(60)
 
+    def zoom_in(self) -> None:
+        self.camera.zoom(1.1, self.ui.mouse)
+        self.gpu.mark_camera_dirty()
+
+    def zoom_out(self) -> None:
+        self.camera.zoom(0.9, self.ui.mouse)
+        self.gpu.mark_camera_dirty()
+
 if __name__ == '__main__':
     logger = setup_logging()
     logger.info(f"Run {Path(__file__).name}")
@@ -4,36 +4,49 @@
 
 [x] Set up GPU rendering
 [x] Create a simple player: a white square to move around
-[ ] Mousewheel zoom at the mouse location
+[x] Mousewheel zoom at the mouse location (see libs/camera.py)
 
-[ ] Make the projection and view matrices global to GPU
+[x] Make the projection and view matrices global to GPU
+    (the 'Camera' uniform block, updated only when the window or zoom changes)
 
 GPU.render:
-    ├─ render_test_square() (scenery)
-    │  ├─ proj_mat (correct for window aspect ratio)
-    │  └─ view_mat (scale and offset)
-    │   shader: gl_Position = view_mat * proj_mat * pos;
+    ├─ render_test_square() (fixed on screen)
+    │  └─ proj_mat (correct for window aspect ratio)
+    │   shader: gl_Position = proj_mat * pos;
     └─ render_player()
        ├─ size : self.game.player.size = (2,2)
-       ├─ pos: translate player by self.game.player.pos
-       │    Example: move in increments of 1 (1/2 player size)
+       │    Player is a view onto one row of Game.entities (libs/entities.py)
+       ├─ pos: translate player by self.game.player.interpolated(alpha)
+       │    Player moves at Player.speed while WASD is held (fixed timestep
+       │    updates); rendering interpolates between the last two updates
        ├─ xlat_mat
        │    Player position moves player by changing 'xlat_mat'
-       ├─ proj_mat (correct for window aspect ratio)
-       └─ view_mat (scale and offset)
-        shader: gl_Position = test_mat * view_mat * proj_mat * xlat_mat*pos;
+       ├─ view_mat (scale and offset: Camera.view_mat)
+       └─ proj_mat (correct for window aspect ratio: Camera.proj_mat)
+        shader: gl_Position = proj_mat * view_mat * xlat_mat * pos;
 """
 
 from pathlib import Path
+import argparse
 import atexit
+import time
+import random
+import logging
 import pygame
-from array import array
+from libs.camera import Camera
 from libs.utils import setup_logging
 from libs.ui import UI
-from libs.os_window import OsWindow
+from libs.os_window import OsWindow, HeadlessWindow
 from libs.cpu import CPU
 from libs.text import Text
 from libs.gpu import GPU
+from libs.profiler import Profiler
+from libs.entities import EntityStore
+from libs.spatial import SpatialGrid
+from libs.debug_draw import RED, GREEN, YELLOW
+from libs.replay import InputReplay
+
+logger = logging.getLogger(__name__)
 
 def shutdown(filename:str) -> None:
     logger.info(f"Shutdown {filename}")
@@ -41,129 +54,283 @@ def shutdown(filename:str) -> None:
     pygame.quit()
 
 class TextHud(Text):
+    """Debug HUD. Created once, then updated in place every frame.
+
+    A line is formatted only when the values it shows change.
+    """
     def __init__(self, game, size:int=15) -> None:
         super().__init__(size)
         self.game = game
-        self.msg += f"FPS: {self.game.clock.get_fps():0.1f}"
-        self.msg += f"\nWindow: {self.game.os_window.size}"
-        self.msg += f"\nPlayer: {self.game.player.size} at {self.game.player.pos}"
-        mpos = pygame.mouse.get_pos()
-        mpos_world = self.game.xfm_pix_to_world(mpos)
-        self.msg += f"\nMouse: {mpos} ({mpos_world[0]:0.3f},{mpos_world[1]:0.3f})"
-        self.msg += f"\nScale: {self.game.scale:0.2e}"
+        self.values = {}                                # row: values shown on that line
+
+    def field(self, row:int, template:str, *values) -> None:
+        if self.values.get(row) != values:
+            self.values[row] = values
+            self.set_line(row, template.format(*values))
+
+    def update(self) -> None:
+        self.field(0, "FPS: {:0.1f}", self.game.clock.get_fps())
+        self.field(1, "Window: {}", self.game.os_window.size)
+        self.field(2, "Player: {} at ({:0.2f},{:0.2f})", self.game.player.size, *self.game.player.pos)
+        mpos = self.game.ui.mouse
+        mouse_world = self.game.xfm_pix_to_world(mpos)
+        self.field(3, "Mouse: {} ({:0.3f},{:0.3f})", mpos, *mouse_world)
+        self.field(4, "Scale: {:0.2e}", self.game.scale)
+        if gpu := self.game.gpu:
+            self.field(5, "GPU buffers: {} ({} bytes)", gpu.buffer_count, gpu.buffer_bytes)
+            picked = self.game.grid.query_point(*mouse_world)
+            self.field(6, "Entities: {} ({} drawn), under mouse: {}", len(self.game.entities),
+                       gpu.entities_drawn, picked[:4])
+            self.field(7, "Meshes: {} drawn, {} culled", gpu.meshes_drawn, gpu.meshes_culled)
+            resolution, (w,h) = gpu.resolution, gpu.scene_target.viewport[2:]
+            self.field(8, "Resolution: {:0.0%} ({}x{}, {}), scene {:0.2f} ms", resolution.scale, w, h,
+                       "dynamic" if resolution.enabled else "fixed", round(resolution.gpu_ms, 2))
+            cache = gpu.residency
+            self.field(9, "GPU cache: {:0.1f} of {:0.0f} MiB, {} hits, {} misses, {} evictions",
+                       round(cache.used/2**20, 1), cache.budget/2**20 if cache.budget else float('inf'),
+                       cache.hits, cache.misses, cache.evictions)
+        row = 10
+        if self.game.profiler.enabled:
+            for name,(cpu_ms,gpu_ms) in self.game.profiler.averages().items():
+                self.field(row, "{:>18}: cpu {:6.3f} ms, gpu {:6.3f} ms", name, round(cpu_ms,3), round(gpu_ms,3))
+                row += 1
+            for name,n in self.game.profiler.counter_averages().items():
+                self.field(row, "{:>18}: {:8.1f} per frame", name, n)
+                row += 1
+        self.truncate(row)
+
+    def truncate(self, n:int) -> None:
+        super().truncate(n)
+        for row in [row for row in self.values if row >= n]: del self.values[row]
 
 class Player:
-    def __init__(self) -> None:
-        self.pos = [0,0]                                # Initial position in world space (game coordinates)
-        self.size = (2,2)                               # Player initial w,h in world space (game coordinates)
+    """The player is one row of the entity store. This is a view onto that row."""
+    speed = 10                                          # World units per second
+
+    def __init__(self, entities:EntityStore) -> None:
+        self.entities = entities
+        # Initial position and w,h in world space (game coordinates)
+        # Not VISIBLE: GPU.render_player() draws it, not the entity sprites
+        self.id = entities.add(pos=(0.0,0.0), size=(2,2), flags=0)
+        self.held = set()                               # (dx,dy) of each movement key held
+        self.direction = [0,0]                          # Sum of the held directions: -1, 0 or 1 per axis
+
+    @property
+    def pos(self) -> tuple:
+        return self.entities.get(self.id, 'pos')
 
-    def move_up(self) -> None:
-        self.pos[1] += 1
+    @property
+    def size(self) -> tuple:
+        return self.entities.get(self.id, 'size')
 
-    def move_down(self) -> None:
-        self.pos[1] -= 1
+    def steer(self, dx:int, dy:int) -> None:
+        """A movement key is down: add its direction."""
+        self.held.add((dx,dy))
+        self._set_velocity()
 
-    def move_left(self) -> None:
-        self.pos[0] -= 1
+    def release(self, dx:int, dy:int) -> None:
+        """A movement key is up: remove its direction. Not held (e.g. held since before launch): no-op."""
+        self.held.discard((dx,dy))
+        self._set_velocity()
 
-    def move_right(self) -> None:
-        self.pos[0] += 1
+    def stop(self) -> None:
+        self.held.clear()
+        self._set_velocity()
+
+    def _set_velocity(self) -> None:
+        self.direction = [sum(dx for dx,_ in self.held), sum(dy for _,dy in self.held)]
+        self.entities.set(self.id, 'vel', (self.speed*self.direction[0], self.speed*self.direction[1]))
+
+    @property
+    def moving(self) -> bool:
+        return self.direction != [0,0]
+
+    def interpolated(self, alpha:float) -> tuple:
+        """Position 'alpha' of the way from the previous update to the current one."""
+        (x0,y0),(x1,y1) = self.entities.get(self.id, 'prev_pos'), self.pos
+        return (x0 + alpha*(x1 - x0), y0 + alpha*(y1 - y0))
 
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, headless:bool=False, size:tuple=(16*50,9*50)) -> None:
+        """headless: no window, render offscreen (see benchmarks/bench_frames.py)."""
         pygame.init()
         pygame.font.init()
         self.gpu_render = True
-        self.os_window = OsWindow(self.gpu_render)
+        self.os_window = HeadlessWindow(size) if headless else OsWindow(self.gpu_render)
+        self.camera = Camera(self.os_window.size, scale=0.1)
         self.cpu = CPU(self) if not self.gpu_render else None
         self.gpu = GPU(self) if self.gpu_render else None
+        if self.gpu: atexit.register(self.gpu.release) # Runs before shutdown() calls pygame.quit()
         self.ui = UI(self)
-        self.player = Player()
+        self.entities = EntityStore()                   # Every moving thing, player included
+        self.player = Player(self.entities)
+        self.grid = SpatialGrid(self.entities, cell_size=1.0)  # Picking and visibility queries
+        self.grid.sync()
         self.clock = pygame.time.Clock()
         self.debug = True
-        self.scale = 0.1                                # Scale world space to the display
-        a = self.scale
-        # Testing how to do zoom and pan using a single transformation matrix
-        self.test_matrix = array('f', [
-            a,0,0,0,
-            0,a,0,0,
-            0,0,a,0,
-            0,0,0,1,
-            ])
-        self.view_offset = (0,0)
+        self.profiler = Profiler(self.gpu.ctx if self.gpu else None)   # F3: toggle, F4: export trace
+        self.text_hud = TextHud(self)
+        # Fixed-timestep simulation, interpolated rendering
+        self.dt = 1/60                                  # Seconds per update
+        self.accumulator = 0.0                          # Seconds of simulation not run yet
+        self.alpha = 0.0                                # Fraction of an update to interpolate
+        self.last_time = time.perf_counter()
+        self.steps = 0                                  # Updates so far: input logs are stamped with it
+        # Idle mode: only redraw when something changed
+        self.idle = True
+        self.dirty = True
+        self.idle_timeout = 500                         # ms to block waiting for events when idle
 
     def run(self) -> None:
         while True: self.game_loop()
 
+    @property
+    def busy(self) -> bool:
+        """The simulation is changing state on its own: keep updating and drawing."""
+        if self.gpu and self.gpu.assets.pending: return True   # Keep uploading
+        return self.player.moving or len(self.entities) > 1    # A crowd keeps drifting
+
     def game_loop(self) -> None:
-        self.text_hud = TextHud(self) if self.debug else None
-        self.ui.handle_events()
+        """Events, then fixed-timestep updates, then render (only if something changed).
+
+        Idle (nothing moving, nothing dirty): block on the event queue instead
+        of spinning, waking up every 'idle_timeout' ms to check for shader edits.
+        """
+        self.profiler.begin_frame()
+        waiting = self.idle and not self.busy and not self.dirty
+        with self.profiler.stage('handle_events'):
+            if self.ui.handle_events(self.idle_timeout if waiting else 0): self.dirty = True
+        if waiting:
+            self.last_time = time.perf_counter()        # Time spent blocked is not simulation time
+            self.accumulator = 0.0
+        if self.gpu and self.gpu.shaders.poll(): self.dirty = True
+        # Update
+        now = time.perf_counter()
+        self.accumulator += min(now - self.last_time, 0.25) # Avoid the spiral of death after a stall
+        self.last_time = now
+        with self.profiler.stage('update'):
+            while self.accumulator >= self.dt:
+                if self.busy: self.dirty = True
+                self.update(self.dt)
+                self.accumulator -= self.dt
+        self.alpha = self.accumulator/self.dt
+        # Uploads of assets decoded on the loader threads, within the frame's upload budget
+        if self.gpu and self.gpu.assets.pending:
+            with self.profiler.stage('asset_uploads'):
+                self.profiler.count('upload_bytes', self.gpu.assets.update())
+            self.dirty = True
+        # Render
+        if self.dirty or self.busy or not self.idle:
+            if self.debug:
+                with self.profiler.stage('hud'): self.text_hud.update()
+            if self.cpu: self.cpu.render()
+            if self.gpu: self.gpu.render()
+            self.dirty = False
+            self.clock.tick(60)
+        self.profiler.end_frame()
+
+    def update(self, dt:float) -> None:
+        """Advance the simulation one fixed timestep."""
+        self.entities.update(dt)
+        self.grid.sync()
+        self.steps += 1
+
+    def record(self, path) -> None:
+        """Log the input to 'path' until the game quits (libs/replay.py)."""
+        self.ui.start_recording(path)
+        atexit.register(self.ui.stop_recording)
+
+    def replay(self, path, realtime:bool=False) -> None:
+        """Play an input log back from the start, then return.
+
+        realtime: pace frames to the log's timestep, else as fast as possible.
+        Either way the simulation is the same: one update per frame.
+        """
+        replay = InputReplay(path)
+        if replay.size != self.os_window.size:
+            logger.warning(f"Input log recorded at {replay.size}, window is {self.os_window.size}: "
+                           f"zooming goes to different places")
+        if replay.dt != self.dt: logger.warning(f"Input log timestep {replay.dt} s, game timestep {self.dt} s")
+        self.ui.replay = replay
+        while self.steps < replay.steps: self.replay_frame(realtime)
+        self.ui.replay = None
+
+    def replay_frame(self, realtime:bool=False) -> None:
+        """One frame of a replay: the log's events for this step, one update, render.
+
+        game_loop() without the wall clock: no idle waits, no catching up.
+        """
+        self.profiler.begin_frame()
+        with self.profiler.stage('handle_events'): self.ui.handle_events()
+        with self.profiler.stage('update'): self.update(self.dt)
+        self.alpha = 1.0                                # Draw the update just made
+        if self.gpu and self.gpu.assets.pending:
+            with self.profiler.stage('asset_uploads'):
+                self.profiler.count('upload_bytes', self.gpu.assets.update())
+        if self.debug:
+            with self.profiler.stage('hud'): self.text_hud.update()
         if self.cpu: self.cpu.render()
         if self.gpu: self.gpu.render()
-        self.clock.tick(60)
+        self.clock.tick(round(1/self.dt) if realtime else 0)
+        self.profiler.end_frame()
+
+    def spawn_crowd(self, n:int, seed:int=0) -> None:
+        """Add n entities that drift in random directions. Draw them with GPU.scene 'entities'."""
+        rng = random.Random(seed)
+        for _ in range(n):
+            self.entities.add(
+                    pos=(rng.uniform(-40,40), rng.uniform(-25,25)),
+                    size=(0.3,0.3),
+                    vel=(rng.uniform(-2,2), rng.uniform(-2,2)),
+                    color=(rng.random(), rng.random(), rng.random(), 1.0))
+        self.grid.sync()
+
+    def draw_debug(self, dd) -> None:
+        """Debug shapes, drawn every frame while debug is on. See libs/debug_draw.py."""
+        dd.arrow((0,0), (1,0), RED)                     # World axes
+        dd.arrow((0,0), (0,1), GREEN)
+        x,y = self.player.interpolated(self.alpha)
+        w,h = self.player.size
+        dd.aabb((x,y), (x + w, y + h), YELLOW)
+        if self.player.moving:
+            vx,vy = self.entities.get(self.player.id, 'vel')
+            cx,cy = x + w/2, y + h/2
+            dd.arrow((cx,cy), (cx + 0.1*vx, cy + 0.1*vy), YELLOW)
+        dd.text3d((x, y + h), "player", YELLOW)
+
+    @property
+    def scale(self) -> float:
+        """Scale world space to the display."""
+        return self.camera.scale
 
     def zoom_in(self) -> None:
-        self.scale *= 1.1
-        self.zoom_at_mouse()
+        self.camera.zoom(1.1, self.ui.mouse)
+        if self.gpu: self.gpu.mark_camera_dirty()
 
     def zoom_out(self) -> None:
-        self.scale *= 0.9
-        self.zoom_at_mouse()
+        self.camera.zoom(0.9, self.ui.mouse)
+        if self.gpu: self.gpu.mark_camera_dirty()
 
     def xfm_pix_to_world(self, p:tuple) -> tuple:
         """Transform pixel coordinates to world coordinates.
-        A + λ(B-A) = C
-
-        TODO: the problem is my limits in world coordinates. I need the actual
-        limits on screen. This is not just the (-1:1,1:-1) scaled by
-        self.scale. It is also offset by previous zooming.
 
-        What I need is three coordinate systems:
-        - World: the whole world
-        - View: the portion of the world visible on screen
-        - Screen: the View, but in pixel coordinates
+        The camera tracks all three coordinate systems (world, view, screen),
+        so this includes the view offset from previous zooming.
         """
-        # Calculate λ using pixel coordinates
-        Cx,Cy = p
-        Ax,Ay = (0,0)
-        Bx,By = self.os_window.size
-        Lx = (Cx-Ax)/(Bx-Ax)
-        Ly = (Cy-Ay)/(By-Ay)
-        # Use λ to calculate point in world coordinates.
-        k = self.scale
-        # TODO: incorporate offset as well
-        Ax,Ay = (-1*k,1*k)
-        Bx,By = (1*k,-1*k)
-        Cx = Ax + Lx*(Bx-Ax)
-        Cy = Ay + Ly*(By-Ay)
-        return (Cx,Cy)
-
-    def zoom_at_mouse(self) -> None:
-        """Translate mouse to screen center, zoom, translate back."""
-        mpos = pygame.mouse.get_pos()
-        cx,cy = (0,0)                                   # World center
-        mx,my = self.xfm_pix_to_world(mpos)             # LEFT OFF HERE -- this is wrong
-        x,y = (cx-mx,cy-my)                             # Vector from mouse to world center
-        a = self.scale
-        # Setup the matrix for OpenGL in column-major order
-        if 0:
-            self.test_matrix = array('f', [
-                a,      0,      0,0,
-                0,      a,      0,0,
-                0,      0,      a,0,
-                a*x-x,  a*y-y,  0,1,
-                ])
-        else:
-            # If test matrix replaces view matrix, it must, at a minimum, include self.scale
-            self.test_matrix = array('f', [
-                a,0,0,0,
-                0,a,0,0,
-                0,0,a,0,
-                0,0,0,1,
-                ])
+        return self.camera.screen_to_world_point(p)
 
 if __name__ == '__main__':
     logger = setup_logging()
     logger.info(f"Run {Path(__file__).name}")
     atexit.register(shutdown, f"{Path(__file__).name}")
-    Game().run()
+    parser = argparse.ArgumentParser(description="Draw the math in Lengyel")
+    parser.add_argument('--record', metavar='LOG', help="Log the input to LOG (see libs/replay.py)")
+    parser.add_argument('--replay', metavar='LOG', help="Play the input in LOG back, then quit")
+    parser.add_argument('--realtime', action='store_true', help="Replay at 60 fps, not as fast as possible")
+    args = parser.parse_args()
+    g = Game()
+    if args.replay:
+        g.replay(args.replay, args.realtime)
+    else:
+        if args.record: g.record(args.record)
+        g.run()
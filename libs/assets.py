@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Asset loader: decode on a thread pool, upload to the GPU a bit each frame
+
+    future = gpu.assets.load_model('bunny', "models/bunny.obj")
+    future = gpu.assets.load_texture('bricks', "textures/bricks.png")
+    ...
+    gpu.assets.update()                 # Main thread, once per frame
+
+File I/O, parsing and mesh processing (load_model(), pygame.image.load())
+run on worker threads. GL calls cannot: the context belongs to the main
+thread. So decoded assets wait in a queue, and update() uploads them in
+chunks until 'budget_ms' is used up, then returns. A big mesh takes several
+frames to upload instead of one long frame.
+
+Until an asset is uploaded, its name draws a placeholder: a unit cube mesh,
+a checkerboard texture (texture(name)). The real asset replaces it when
+its last chunk is written.
+
+Loaded assets go in the ResourceCache (libs/residency.py) with a load()
+that reads the file again, so the cache may evict them. Reloading an
+evicted asset happens on the main thread, in one go, on its next use: a
+model maps its mesh cache, which is fast; a texture is decoded again.
+
+The futures returned by load_*() resolve on the main thread, in update(),
+to the uploaded Mesh or Texture. A decode error resolves the future with
+the exception and the placeholder stays.
+
+Worker threads share the GIL with the main thread, so pure-Python parsing
+on a thread would stall frames. A cold model (no fresh mesh cache, see
+libs/models.py) is parsed in a worker process instead, which writes the
+cache. The thread then memory-maps the cache, as for a warm model.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+import multiprocessing
+import os
+from collections import deque
+from array import array
+import queue
+import threading
+import time
+import pygame
+import moderngl
+import logging
+from libs.meshes import Mesh, MeshRegistry
+from libs.residency import ResourceCache
+from libs.models import load_model, load_cached, build_cache
+
+logger = logging.getLogger(__name__)
+
+def _cube() -> tuple:
+    """Unit cube centered on the origin: (vertices '3f', indices)."""
+    vertices = array('f', [x - 0.5 for i in range(8) for x in ((i >> 0)&1, (i >> 1)&1, (i >> 2)&1)])
+    indices = array('B', [0,2,1, 1,2,3, 4,5,6, 5,7,6, 0,1,4, 1,5,4,
+                          2,6,3, 3,6,7, 0,4,2, 2,4,6, 1,3,5, 3,7,5])
+    return vertices, indices
+
+class AssetLoader:
+    def __init__(self, ctx:moderngl.Context, meshes:MeshRegistry, cache:ResourceCache=None,
+                 workers:int=4, processes:int=2, budget_ms:float=2.0, chunk_bytes:int=2**20) -> None:
+        self.ctx = ctx
+        self.meshes = meshes
+        self.cache = cache if cache is not None else meshes.cache       # Textures: keys ('texture', name)
+        self.budget_ms = budget_ms                      # Main thread upload time per frame
+        self.chunk_bytes = chunk_bytes                  # Bytes per buffer write
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='assets')
+        self.processes = processes                      # Parser processes. 0: parse on the threads
+        self.process_pool = None                        # Started by the first in_process()
+        self.process_pool_lock = threading.Lock()       # Worker threads start it: only one of them
+        self.decoded = queue.SimpleQueue()              # (decode future, upload, future), from the workers
+        self.uploads = deque()                          # Upload generators in progress, oldest first
+        self.pending = 0                                # Requested, not uploaded yet
+        self.textures = set()                           # Names requested by load_texture()
+        self.uploaded_bytes = 0                         # Bytes written by the last update()
+        self.placeholder = ctx.texture((8,8), 4, data=bytes(
+            b for y in range(8) for x in range(8) for b in ((255,0,255,255) if (x + y)%2 else (0,0,0,255))))
+        self.placeholder.filter = (moderngl.NEAREST, moderngl.NEAREST)
+
+    def request(self, upload, decode, *args, **kwargs) -> Future:
+        """Run decode(*args, **kwargs) on a worker, then upload(result) in update(). Return the future.
+
+        upload(result) returns a generator: each step writes a chunk and
+        yields its byte count, the return value resolves the future.
+        """
+        done = Future()
+        self.pending += 1
+        decoding = self.executor.submit(decode, *args, **kwargs)
+        decoding.add_done_callback(lambda f: self.decoded.put((f, upload, done)))
+        return done
+
+    def load_model(self, name:str, path, **kwargs) -> Future:
+        """Load a model file into meshes[name]. kwargs go to load_model(). Return a future Mesh."""
+        if name not in self.meshes:
+            vertices, indices = _cube()
+            self.meshes.upload(name, vertices, '3f', ('vert_pos',), indices)
+        reload = lambda: self._reload_model(path, **kwargs)
+        return self.request(lambda model: self._upload_model(name, model, reload),
+                             self._decode_model, path, **kwargs)
+
+    def load_texture(self, name:str, path) -> Future:
+        """Load an image file into texture(name). Return a future Texture."""
+        self.textures.add(name)
+        reload = lambda: self._make_texture(*self._decode_image(path))
+        return self.request(lambda image: self._upload_texture(name, *image, reload),
+                             self._decode_image, path)
+
+    def texture(self, name:str) -> moderngl.Texture:
+        """The texture, or the placeholder until it is uploaded. Reloads it if it was evicted."""
+        key = ('texture', name)
+        return self.cache.get(key) if key in self.cache else self.placeholder
+
+    def in_process(self, fn, *args):
+        """Worker thread: run fn(*args) in a worker process and wait for the result.
+
+        For pure-Python work that would hold the GIL. 'fn' and the result
+        are pickled: 'fn' must be a module-level function. processes=0: run it here.
+        """
+        if not self.processes: return fn(*args)
+        with self.process_pool_lock:
+            if self.process_pool is None:
+                # spawn, not fork: this process has a GL context and threads.
+                # nice: on few cores, workers should not take time from rendering.
+                self.process_pool = ProcessPoolExecutor(max_workers=self.processes,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=os.nice, initargs=(10,))
+        return self.process_pool.submit(fn, *args).result()
+
+    def _decode_model(self, path, cache:bool=True, optimize:bool=True):
+        """Worker thread: map the cache if it is fresh. Else parse in a process first."""
+        if cache and self.processes:
+            model = load_cached(path, optimize)
+            if model is not None: return model
+            self.in_process(build_cache, path, optimize)
+        return load_model(path, cache=cache, optimize=optimize)
+
+    @staticmethod
+    def _decode_image(path) -> tuple:
+        """Worker: (size, RGBA bytes), bottom row first like GL textures."""
+        ### load(filename) -> Surface
+        surf = pygame.image.load(str(path))
+        ### tobytes(Surface, format, flipped=False) -> bytes
+        return surf.get_size(), pygame.image.tobytes(surf, 'RGBA', True)
+
+    def _write_chunks(self, buffer:moderngl.Buffer, data):
+        """Write 'data' to 'buffer' one chunk per step. Yield the bytes written."""
+        # 'with': views of a memory map must be released before it is closed
+        with memoryview(data).cast('B') as view:
+            for offset in range(0, len(view), self.chunk_bytes):
+                with view[offset:offset + self.chunk_bytes] as chunk:
+                    buffer.write(chunk, offset=offset)
+                    yield len(chunk)
+
+    def _reload_model(self, path, **kwargs) -> Mesh:
+        """Main thread, after an eviction: map the mesh cache and upload it in one go."""
+        model = load_model(path, **kwargs)
+        try:
+            return self.meshes.create(model.vertices, model.fmt, model.attrs, model.indices,
+                                      bounds=(model.aabb, model.sphere))
+        finally:
+            model.close()
+
+    def _upload_model(self, name:str, model, reload):
+        """Generator: create the buffers, fill them a chunk at a time, then swap in the mesh.
+
+        Closed or failed before the end (shutdown(), an error): the buffers made so far are released.
+        """
+        buffers = []
+        try:
+            vbo = self.ctx.buffer(reserve=max(1, memoryview(model.vertices).nbytes))
+            buffers.append(vbo)
+            yield from self._write_chunks(vbo, model.vertices)
+            ibo = self.ctx.buffer(reserve=max(1, memoryview(model.indices).nbytes))
+            buffers.append(ibo)
+            yield from self._write_chunks(ibo, model.indices)
+            mesh = Mesh(vbo, model.fmt, model.attrs, ibo, model.indices.itemsize,
+                        moderngl.TRIANGLES, model.aabb, model.sphere)
+        except BaseException:                           # GeneratorExit too
+            for buffer in buffers: buffer.release()
+            raise
+        finally:
+            model.close()
+        self.meshes.add(name, mesh, reload)
+        return mesh
+
+    def _make_texture(self, size:tuple, data:bytes) -> moderngl.Texture:
+        return self.ctx.texture(size, 4, data=data)
+
+    def _upload_texture(self, name:str, size:tuple, data:bytes, reload):
+        """Generator: create the texture, fill it a band of rows per step, then swap it in."""
+        w,h = size
+        texture = self.ctx.texture(size, 4)
+        rows = max(1, self.chunk_bytes//(4*w))
+        try:
+            for y in range(0, h, rows):
+                n = min(rows, h - y)
+                ### write(data, viewport=(x, y, w, h)): only these rows
+                texture.write(data[4*w*y:4*w*(y + n)], viewport=(0, y, w, n))
+                yield 4*w*n
+        except BaseException:                           # Closed by shutdown() (GeneratorExit), or failed
+            texture.release()
+            raise
+        return self.cache.add(('texture', name), texture, reload)
+
+    def update(self) -> int:
+        """Main thread, once per frame: upload until the time budget is used. Return bytes uploaded.
+
+        At least one chunk is written per frame, so uploads always progress.
+        """
+        t_end = time.perf_counter() + self.budget_ms/1000
+        while True:
+            try:
+                decoding, upload, done = self.decoded.get_nowait()
+            except queue.Empty:
+                break
+            if decoding.exception() is not None:
+                logger.error(f"Asset failed to load: {decoding.exception()}")
+                done.set_exception(decoding.exception())
+                self.pending -= 1
+                continue
+            self.uploads.append((upload(decoding.result()), done))
+        nbytes = 0
+        while self.uploads:
+            upload, done = self.uploads[0]
+            try:
+                nbytes += next(upload)
+            except StopIteration as finished:
+                self.uploads.popleft()
+                self.pending -= 1
+                done.set_result(finished.value)
+            except Exception as e:
+                self.uploads.popleft()
+                self.pending -= 1
+                logger.error(f"Asset failed to upload: {e}")
+                done.set_exception(e)
+            if time.perf_counter() >= t_end: break
+        self.uploaded_bytes = nbytes
+        return nbytes
+
+    def shutdown(self) -> None:
+        """Stop the workers. Release the textures (meshes belong to the registry)."""
+        # Processes first: a worker thread may be waiting on one of them
+        if self.process_pool is not None: self.process_pool.shutdown(wait=False, cancel_futures=True)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for upload,_ in self.uploads: upload.close()
+        self.uploads.clear()
+        for name in self.textures:
+            if ('texture', name) in self.cache: self.cache.remove(('texture', name))
+        self.textures.clear()
+        self.placeholder.release()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Camera: world, view and screen coordinate systems
+
+- World: game coordinates. y is up.
+- View: the portion of the world visible on screen. 'center' is the world
+  point at the middle of the window. 'scale' is clip units per world unit.
+- Screen: the View in pixel coordinates. (0,0) is the top left, y is down.
+
+world → clip:   proj_mat * view_mat
+clip → screen:  pixel = ((x+1)/2*W, (1-y)/2*H)
+
+Matrices and their inverses are cached. The cache is invalidated only when the
+camera pans, zooms or the window is resized.
+"""
+
+from array import array
+from libs.math import Transform4D, Point3D
+from libs.math import batch
+
+class Camera:
+    def __init__(self, size:tuple, scale:float=1.0, center:tuple=(0,0)) -> None:
+        self._size = tuple(size)                        # Window w,h in pixels
+        self._scale = scale
+        self._center = tuple(center)
+        self._cache = {}
+
+    @property
+    def size(self) -> tuple:
+        return self._size
+
+    @property
+    def scale(self) -> float:
+        return self._scale
+
+    @property
+    def center(self) -> tuple:
+        return self._center
+
+    def resize(self, size:tuple) -> None:
+        self._size = tuple(size)
+        self._cache.clear()
+
+    def pan(self, dx:float, dy:float) -> None:
+        """Move the view by dx,dy in world units."""
+        self._center = (self._center[0] + dx, self._center[1] + dy)
+        self._cache.clear()
+
+    def zoom(self, factor:float, pixel:tuple=None) -> None:
+        """Scale the view by 'factor'. Keep the world point under 'pixel' fixed on screen.
+
+        The world point w is at offset (w - c) from the view center c. After
+        zooming, that offset is (w - c)/factor. So the new center is
+        w - (w - c)/factor.
+        """
+        if pixel is not None:
+            wx,wy = self.screen_to_world_point(pixel)
+            cx,cy = self._center
+            self._center = (wx - (wx - cx)/factor, wy - (wy - cy)/factor)
+        self._scale *= factor
+        self._cache.clear()
+
+    def _cached(self, name:str, make) -> Transform4D:
+        mat = self._cache.get(name)
+        if mat is None:
+            mat = make()
+            self._cache[name] = mat
+        return mat
+
+    @property
+    def proj_mat(self) -> Transform4D:
+        """Correct for aspect ratio."""
+        w,h = self._size
+        return self._cached('proj', lambda: Transform4D.make_scale(h/w, 1, 1))
+
+    @property
+    def view_mat(self) -> Transform4D:
+        """Zoom and pan: move 'center' to the origin, then scale."""
+        def make() -> Transform4D:
+            s = self._scale
+            x,y = self._center
+            return Transform4D(
+                s, 0, 0, -s*x,
+                0, s, 0, -s*y,
+                0, 0, s, 0)
+        return self._cached('view', make)
+
+    @property
+    def world_to_screen_mat(self) -> Transform4D:
+        def make() -> Transform4D:
+            w,h = self._size
+            clip_to_screen = Transform4D(
+                w/2,    0, 0, w/2,
+                  0, -h/2, 0, h/2,
+                  0,    0, 1, 0)
+            return clip_to_screen*self.proj_mat*self.view_mat
+        return self._cached('world_to_screen', make)
+
+    @property
+    def screen_to_world_mat(self) -> Transform4D:
+        return self._cached('screen_to_world', lambda: self.world_to_screen_mat.inverse())
+
+    def world_to_screen_point(self, p:tuple) -> tuple:
+        q = self.world_to_screen_mat*Point3D(p[0], p[1], 0)
+        return (q.x, q.y)
+
+    def screen_to_world_point(self, p:tuple) -> tuple:
+        q = self.screen_to_world_mat*Point3D(p[0], p[1], 0)
+        return (q.x, q.y)
+
+    def world_to_screen(self, points:array, out:array=None) -> array:
+        """Transform an array of 2D world points (x0,y0, x1,y1, ...) to pixels."""
+        return batch.transform_points(self.world_to_screen_mat, points, dim=2, out=out)
+
+    def screen_to_world(self, points:array, out:array=None) -> array:
+        """Transform an array of 2D pixel coordinates (x0,y0, x1,y1, ...) to world points."""
+        return batch.transform_points(self.screen_to_world_mat, points, dim=2, out=out)
+
+    @property
+    def visible_rect(self) -> tuple:
+        """World space (left, bottom, right, top) of the region on screen."""
+        w,h = self._size
+        x0,y0 = self.screen_to_world_point((0,h))
+        x1,y1 = self.screen_to_world_point((w,0))
+        return (x0, y0, x1, y1)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Frame capture: read frames back without waiting for the GPU, write them on a thread
+
+    capture = FrameCapture(ctx, "captures/run1", fmt='png')
+    ...
+    capture.grab(fbo)                           # Every frame, after drawing, before flip()
+    ...
+    capture.close()                             # Reads the frames still in flight, waits for the writer
+
+fbo.read() waits for the GPU to finish the frame, then copies it: the CPU
+and the GPU stop overlapping. grab() instead starts a copy of the
+framebuffer into a pixel buffer object (PBO) and returns: the GPU does the
+copy when it gets there. Buffers are used in a ring of 'ring' slots. A slot
+is read back when its turn comes again, 'ring' frames later, when the GPU
+has long finished with it, so the read is only a memory copy, into a
+bytearray the writer hands back when it is done with it.
+
+Pixels are read as RGBA: the framebuffer's own layout, so the driver copies
+without converting (three times faster than RGB on llvmpipe). Alpha is
+whatever blending left there: ignore it. The pixels go to a writer thread
+by a queue:
+
+    'png'     directory/frame_000000.png, ...
+    'raw'     appended to directory/frames_WxH.rgba (rows bottom up), e.g.
+              ffmpeg -f rawvideo -pix_fmt rgba -s WxH -i frames_WxH.rgba -vf vflip out.mp4
+    'memory'  FrameCapture.frames: [(frame, (w,h), bytearray), ...], e.g. to diff frames
+
+If the writer falls behind by 'queue_frames' frames, frames are dropped
+(counted) rather than stall the main thread. PNG encoding is slow: at a big
+window size and 60 fps, record 'raw' and convert later.
+
+Works on the window (ctx.screen) and on the headless framebuffer alike.
+"""
+
+from pathlib import Path
+import queue
+import threading
+import pygame
+import moderngl
+import logging
+from libs.math.batch import np                          # None if numpy is not installed
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = 4                                          # RGBA
+
+class FrameCapture:
+    def __init__(self, ctx:moderngl.Context, directory=None, fmt:str='png', ring:int=3,
+                 queue_frames:int=16) -> None:
+        if fmt not in ('png', 'raw', 'memory'): raise ValueError(f"Unknown capture format {fmt!r}")
+        self.ctx = ctx
+        self.fmt = fmt
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None: self.directory.mkdir(parents=True, exist_ok=True)
+        self.pbos = [None]*ring                         # Pixel buffers, one per slot
+        self.slots = [None]*ring                        # (frame, size) in flight in each slot
+        self.frame = 0                                  # Frames grabbed
+        self.written = 0                                # Frames the writer finished
+        self.dropped = 0                                # Frames the writer had no room for
+        self.frames = []                                # 'memory': (frame, size, bytes)
+        self.files = {}                                 # 'raw': size: open file
+        self.free = queue.SimpleQueue()                 # bytearrays the writer is done with
+        self.queue = queue.Queue(maxsize=queue_frames)
+        self.writer = threading.Thread(target=self._write_loop, name='capture', daemon=True)
+        self.writer.start()
+
+    def grab(self, fbo:moderngl.Framebuffer) -> None:
+        """Start copying the framebuffer. Read back the copy started 'ring' frames ago."""
+        slot = self.frame%len(self.pbos)
+        if self.slots[slot] is not None: self._read(slot)
+        w,h = fbo.size
+        nbytes = w*h*COMPONENTS
+        pbo = self.pbos[slot]
+        if pbo is None:
+            pbo = self.pbos[slot] = self.ctx.buffer(reserve=nbytes)
+        elif pbo.size != nbytes:
+            pbo.orphan(nbytes)                          # Window resized
+        ### read_into(buffer, viewport, components, attachment, alignment): into a Buffer, a PBO read
+        fbo.read_into(pbo, viewport=(0, 0, w, h), components=COMPONENTS, alignment=1)
+        self.slots[slot] = (self.frame, (w,h))
+        self.frame += 1
+
+    def _read(self, slot:int) -> None:
+        """Copy the slot's buffer out, queue the pixels for the writer."""
+        frame, size = self.slots[slot]
+        self.slots[slot] = None
+        pbo = self.pbos[slot]
+        try:
+            data = self.free.get_nowait()
+            if len(data) != pbo.size: data = bytearray(pbo.size)    # Window resized
+        except queue.Empty:
+            data = bytearray(pbo.size)
+        pbo.read_into(data)
+        try:
+            self.queue.put_nowait((frame, size, data))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1: logger.warning(f"Capture writer is behind: dropping frames ({self.fmt})")
+
+    def flush(self) -> None:
+        """Read back every frame in flight, oldest first. Waits for the GPU."""
+        n = len(self.pbos)
+        for k in range(self.frame - n, self.frame):
+            if k >= 0 and self.slots[k%n] is not None: self._read(k%n)
+
+    def _write_loop(self) -> None:
+        while (item := self.queue.get()) is not None:
+            try:
+                self.write(*item)
+                self.written += 1
+                if self.fmt != 'memory': self.free.put(item[2])
+            except (OSError, ValueError, pygame.error) as e:
+                logger.error(f"Capture: cannot write frame {item[0]}: {e}")
+
+    def write(self, frame:int, size:tuple, data:bytes) -> None:
+        """Writer thread: one frame, rows bottom up."""
+        match self.fmt:
+            case 'png':
+                ### frombuffer(buffer, size, format) -> Surface: no copy, the bytearray as is
+                surf = pygame.image.frombuffer(data, size, 'RGBX')  # X: alpha is not saved
+                surf = pygame.transform.flip(surf, False, True)     # Rows top down
+                pygame.image.save(surf, str(self.directory/f"frame_{frame:06d}.png"))
+            case 'raw':
+                f = self.files.get(size)
+                if f is None:
+                    f = self.files[size] = open(self.directory/f"frames_{size[0]}x{size[1]}.rgba", 'ab')
+                f.write(data)
+            case 'memory':
+                self.frames.append((frame, size, data))
+
+    def close(self) -> None:
+        """Write every frame grabbed so far, stop the writer, release the buffers."""
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        for f in self.files.values(): f.close()
+        self.files.clear()
+        for pbo in self.pbos:
+            if pbo is not None: pbo.release()
+        logger.info(f"Captured {self.written} frames ({self.dropped} dropped)"
+                    + (f" to {self.directory}" if self.directory else ""))
+
+def changed_pixels(a:bytes, b:bytes, tolerance:int=0) -> int:
+    """Pixels of two captured frames that differ by more than 'tolerance' in R, G or B."""
+    if len(a) != len(b): raise ValueError("Frames differ in size")
+    if a == b: return 0
+    if np is not None:
+        delta = np.abs(np.frombuffer(a, np.uint8).astype(np.int16) - np.frombuffer(b, np.uint8))
+        return int((delta.reshape(-1, COMPONENTS)[:,:3] > tolerance).any(axis=1).sum())
+    n = 0
+    block = 4096*COMPONENTS                             # Skip equal blocks: usually most of the frame
+    for start in range(0, len(a), block):
+        if a[start:start + block] == b[start:start + block]: continue
+        for i in range(start, min(start + block, len(a)), COMPONENTS):
+            if any(abs(a[i + k] - b[i + k]) > tolerance for k in range(3)): n += 1
+    return n
@@ -12,6 +12,6 @@ class CPU:
 
     def render(self) -> None:
         self.game.os_window.surf.fill(Color(100,0,0))
-        if self.game.text_hud:
+        if self.game.debug:
             self.game.text_hud.render(self.game.os_window.surf, Color(255,255,255))
         pygame.display.update()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Debug draw: immediate-mode lines, points and labels, batched per frame
+
+Call from anywhere during a frame, in world coordinates:
+
+    dd = game.gpu.debug_draw
+    dd.line((0,0), (1,1), RED)
+    dd.arrow((0,0), (0,2), GREEN)
+    dd.point((1,0))
+    dd.aabb((-1,-1), (1,1))
+    dd.grid(-5,-5, 5,5, step=1)
+    dd.text3d((1,1), "p")
+
+Everything is appended to CPU arrays. At the end of the frame, submit()
+writes each array to the stream buffer (libs/stream.py) and queues one draw
+per primitive type: lines, points, text. Then it starts over.
+
+Nothing is collected while 'enabled' is False (GPU.render sets it from
+Game.debug), so calls cost one attribute test when debug is off.
+
+Dense data (vector fields): one line() call per line is Python-bound.
+lines() and points() take a whole array of coordinates and interleave the
+color in one go: 100k lines per frame fit in a 60 fps frame budget.
+"""
+
+from array import array
+import moderngl
+import logging
+
+logger = logging.getLogger(__name__)
+
+WHITE = (1.0, 1.0, 1.0, 1.0)
+RED = (1.0, 0.2, 0.2, 1.0)
+GREEN = (0.2, 1.0, 0.2, 1.0)
+BLUE = (0.3, 0.5, 1.0, 1.0)
+YELLOW = (1.0, 1.0, 0.2, 1.0)
+
+VERTEX_FMT = '3f 4f'                                    # World position, color
+VERTEX_ATTRS = ('vert_pos', 'vert_color')
+VERTEX_FLOATS = 7
+TEXT_FMT = '2f 2f 4f'                                   # Pixels, atlas uv, color
+TEXT_ATTRS = ('vert_pos', 'tex_coord', 'vert_color')
+TEXT_FLOATS = 8
+
+def _xyz(p:tuple) -> tuple:
+    return (p[0], p[1], p[2] if len(p) > 2 else 0.0)
+
+def _interleave(coords:array, dim:int, color:tuple, out:array) -> None:
+    """Append x,y(,z) per vertex to 'out' as x,y,z,r,g,b,a per vertex.
+
+    Strided slice assignment: each column is copied in one go, no loop per vertex.
+    """
+    if not isinstance(coords, array) or coords.typecode != 'f': coords = array('f', coords)
+    n = len(coords)//dim
+    data = array('f', bytes(4*VERTEX_FLOATS*n))         # z is 0 unless dim is 3
+    for k in range(dim): data[k::VERTEX_FLOATS] = coords[k::dim]
+    for k,c in enumerate(color): data[3 + k::VERTEX_FLOATS] = array('f', [c])*n
+    out.extend(data)
+
+class DebugDraw:
+    def __init__(self, ctx:moderngl.Context, stream, point_size:float=4.0) -> None:
+        self.ctx = ctx
+        self.stream = stream                            # StreamBuffer
+        self.point_size = point_size                    # Pixels
+        self.enabled = True
+        self.clear()
+        # Let the vertex shader set gl_PointSize
+        self.ctx.enable(moderngl.PROGRAM_POINT_SIZE)
+
+    def clear(self) -> None:
+        """Drop everything collected this frame.
+
+        New arrays, not emptied ones: the stream buffer may write the last
+        frame's arrays again if it grows before they are drawn.
+        """
+        self.lines_data = array('f')                    # Two vertices per line
+        self.points_data = array('f')
+        self.labels = []                                # (world x,y, text, color)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines_data)//(2*VERTEX_FLOATS)
+
+    @property
+    def point_count(self) -> int:
+        return len(self.points_data)//VERTEX_FLOATS
+
+    def line(self, a:tuple, b:tuple, color:tuple=WHITE) -> None:
+        if not self.enabled: return
+        self.lines_data.extend(_xyz(a))
+        self.lines_data.extend(color)
+        self.lines_data.extend(_xyz(b))
+        self.lines_data.extend(color)
+
+    def lines(self, coords:array, color:tuple=WHITE, dim:int=2) -> None:
+        """Many lines: 'coords' holds the two endpoints of each line, 'dim' floats per endpoint."""
+        if not self.enabled: return
+        _interleave(coords, dim, color, self.lines_data)
+
+    def arrow(self, tail:tuple, head:tuple, color:tuple=WHITE, head_size:float=0.2) -> None:
+        """A line with an arrowhead at 'head'. The head is in the xy plane, 'head_size' of the length."""
+        if not self.enabled: return
+        self.line(tail, head, color)
+        x0,y0,_ = _xyz(tail)
+        x1,y1,z1 = _xyz(head)
+        dx, dy = head_size*(x0 - x1), head_size*(y0 - y1)   # Back along the shaft
+        # Two barbs: the shaft direction rotated by +/- 30 degrees (cos 0.866, sin 0.5)
+        for s in (0.5, -0.5):
+            self.line((x1,y1,z1), (x1 + 0.866*dx - s*dy, y1 + s*dx + 0.866*dy, z1), color)
+
+    def point(self, p:tuple, color:tuple=WHITE) -> None:
+        if not self.enabled: return
+        self.points_data.extend(_xyz(p))
+        self.points_data.extend(color)
+
+    def points(self, coords:array, color:tuple=WHITE, dim:int=2) -> None:
+        if not self.enabled: return
+        _interleave(coords, dim, color, self.points_data)
+
+    def aabb(self, lo:tuple, hi:tuple, color:tuple=WHITE) -> None:
+        """Box outline. 2D corners: a rectangle. 3D corners: the 12 edges of the box."""
+        if not self.enabled: return
+        x0,y0,z0 = _xyz(lo)
+        x1,y1,z1 = _xyz(hi)
+        for z in ((z0,) if z0 == z1 else (z0, z1)):
+            self.line((x0,y0,z), (x1,y0,z), color)
+            self.line((x1,y0,z), (x1,y1,z), color)
+            self.line((x1,y1,z), (x0,y1,z), color)
+            self.line((x0,y1,z), (x0,y0,z), color)
+        if z0 != z1:
+            for x,y in ((x0,y0), (x1,y0), (x1,y1), (x0,y1)): self.line((x,y,z0), (x,y,z1), color)
+
+    def grid(self, l:float, b:float, r:float, t:float, step:float=1.0, color:tuple=(0.5,0.5,0.5,0.5)) -> None:
+        """Lines every 'step' world units across the rect, in the z=0 plane."""
+        if not self.enabled: return
+        coords = array('f')
+        i, x = 0, l
+        while x <= r:
+            coords.extend((x, b, x, t))
+            i += 1
+            x = l + i*step
+        i, y = 0, b
+        while y <= t:
+            coords.extend((l, y, r, y))
+            i += 1
+            y = b + i*step
+        self.lines(coords, color)
+
+    def text3d(self, p:tuple, text:str, color:tuple=WHITE) -> None:
+        """Label at a world point. The text is screen-aligned, its bottom left at the point."""
+        if not self.enabled: return
+        x,y,_ = _xyz(p)
+        self.labels.append((x, y, text, color))
+
+    def label_quads(self, camera, atlas) -> array:
+        """Vertex data for the labels: glyph quads in pixels."""
+        data = array('f')
+        for x,y,text,color in self.labels:
+            px,py = camera.world_to_screen_point((x,y))
+            py -= atlas.line_height                     # Pixel y is down: the text goes above the point
+            for char in text:
+                u0,v0,u1,v1,w,h = atlas.glyph(char)
+                for vx,vy,u,v in ((px,py,u0,v0), (px+w,py,u1,v0), (px,py+h,u0,v1),
+                                  (px,py+h,u0,v1), (px+w,py,u1,v0), (px+w,py+h,u1,v1)):
+                    data.extend((vx, vy, u, v))
+                    data.extend(color)
+                px += w
+        return data
+
+    def submit(self, queue, program, text_program, camera, atlas=None, layer:int=1) -> int:
+        """Queue this frame's draws (one per primitive type), then clear. Return the vertex count.
+
+        'program' draws lines and points, 'text_program' draws labels with
+        glyphs from 'atlas' (a GlyphAtlas). No atlas: labels are dropped.
+        """
+        stream = self.stream
+        stride = 4*VERTEX_FLOATS
+        vertices = 0
+        for data,mode in ((self.lines_data, moderngl.LINES), (self.points_data, moderngl.POINTS)):
+            if not data: continue
+            n = len(data)//VERTEX_FLOATS
+            queue.submit(program, stream.vao(program, VERTEX_FMT, VERTEX_ATTRS), mode=mode,
+                         first=stream.alloc(data, stride), vertices=n,
+                         uniforms={'point_size': self.point_size},
+                         blend=moderngl.DEFAULT_BLENDING, layer=layer)
+            vertices += n
+        if self.labels and atlas is not None:
+            data = self.label_quads(camera, atlas)
+            n = len(data)//TEXT_FLOATS
+            queue.submit(text_program, stream.vao(text_program, TEXT_FMT, TEXT_ATTRS),
+                         first=stream.alloc(data, 4*TEXT_FLOATS), vertices=n,
+                         uniforms={'win_size': tuple(camera.size), 'tex': 0},
+                         textures=((0, atlas.texture),),
+                         blend=moderngl.DEFAULT_BLENDING, layer=layer)
+            vertices += n
+        self.clear()
+        return vertices
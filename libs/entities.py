@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Entity store: every entity's state in contiguous typed arrays
+
+Struct of arrays: one array per component, one row per entity.
+
+    pos       array('f')  x,y   world space, bottom left
+    prev_pos  array('f')  x,y   pos before the last update (for interpolation)
+    vel       array('f')  vx,vy world units per second
+    size      array('f')  w,h   world space
+    color     array('f')  r,g,b,a
+    flags     array('I')  bit flags, e.g. VISIBLE
+    cell      array('i')  i0,j0,i1,j1 cell range in a SpatialGrid (libs/spatial.py)
+
+Rows 0..count-1 are live. Remove swaps the last row into the hole, so live
+rows stay packed and every system runs over one contiguous range. Because
+rows move, entities are referred to by id: rows[id] is the current row.
+
+Entities without the VISIBLE flag are simulated but not drawn. 'hidden'
+counts them, so the renderer knows when it can upload every row as is.
+
+The arrays have the same layout as the SpriteBatch instance buffers: pass
+view('pos') etc. straight to GPU.write_sprites(). Systems (update(),
+interpolated()) run over all live rows at once with libs/math/batch.
+gather() packs a subset of rows (e.g. the visible ones) the same way.
+"""
+
+from array import array
+import logging
+from libs.math import batch
+from libs.math.batch import np                          # None if numpy is not installed
+
+logger = logging.getLogger(__name__)
+
+VISIBLE = 1 << 0                                        # Draw this entity
+
+class EntityStore:
+    COMPONENTS = (('pos', 'f', 2), ('prev_pos', 'f', 2), ('vel', 'f', 2),
+                  ('size', 'f', 2), ('color', 'f', 4), ('flags', 'I', 1),
+                  ('cell', 'i', 4))                     # name, typecode, width
+    WIDTHS = {name: width for name,_,width in COMPONENTS}
+
+    def __init__(self, capacity:int=1024) -> None:
+        self.capacity = capacity                        # Rows allocated
+        self.count = 0                                  # Live rows
+        for name,typecode,width in self.COMPONENTS:
+            setattr(self, name, array(typecode, bytes(4*width*capacity)))
+        self.ids = array('I', bytes(4*capacity))        # row: id
+        self.rows = {}                                  # id: row
+        self.next_id = 0
+        self.hidden = 0                                 # Live rows without VISIBLE
+        self.render_pos = batch.zeros(capacity, 2)      # Interpolated positions, see interpolated()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, id:int) -> bool:
+        return id in self.rows
+
+    def reserve(self, capacity:int) -> None:
+        """Grow every array to hold at least 'capacity' rows. Do not hold views across this."""
+        if capacity <= self.capacity: return
+        new = self.capacity
+        while new < capacity: new *= 2
+        extra = new - self.capacity
+        for name,typecode,width in self.COMPONENTS:
+            getattr(self, name).frombytes(bytes(4*width*extra))
+        self.ids.frombytes(bytes(4*extra))
+        self.render_pos.frombytes(bytes(4*2*extra))
+        self.capacity = new
+        logger.debug(f"Entity capacity: {self.capacity}")
+
+    def add(self, pos:tuple=(0,0), size:tuple=(1,1), vel:tuple=(0,0),
+            color:tuple=(1,1,1,1), flags:int=VISIBLE) -> int:
+        """Append one entity. Return its id."""
+        self.reserve(self.count + 1)
+        row = self.count
+        self.pos[2*row:2*row + 2] = array('f', pos)
+        self.prev_pos[2*row:2*row + 2] = array('f', pos)
+        self.vel[2*row:2*row + 2] = array('f', vel)
+        self.size[2*row:2*row + 2] = array('f', size)
+        self.color[4*row:4*row + 4] = array('f', color)
+        self.flags[row] = flags
+        if not flags & VISIBLE: self.hidden += 1
+        self.cell[4*row:4*row + 4] = array('i', (0,0,-1,-1))    # Empty range: not in a grid yet
+        id = self.next_id
+        self.next_id += 1
+        self.ids[row] = id
+        self.rows[id] = row
+        self.count += 1
+        return id
+
+    def remove(self, id:int) -> None:
+        """Remove one entity: the last row moves into its row."""
+        row = self.rows.pop(id)
+        if not self.flags[row] & VISIBLE: self.hidden -= 1
+        last = self.count - 1
+        if row != last:
+            for name,typecode,width in self.COMPONENTS:
+                a = getattr(self, name)
+                a[width*row:width*row + width] = a[width*last:width*last + width]
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.count = last
+
+    def clear(self) -> None:
+        self.count = 0
+        self.hidden = 0
+        self.rows.clear()
+
+    def view(self, name:str) -> memoryview:
+        """Zero-copy view of the live rows of one component, e.g. for buffer.write()."""
+        width = self.WIDTHS[name]
+        return memoryview(getattr(self, name))[:width*self.count]
+
+    def get(self, id:int, name:str) -> tuple:
+        """One entity's value of one component."""
+        width = self.WIDTHS[name]
+        row = self.rows[id]
+        return tuple(getattr(self, name)[width*row:width*row + width])
+
+    def set(self, id:int, name:str, value:tuple) -> None:
+        width = self.WIDTHS[name]
+        row = self.rows[id]
+        if name == 'flags':
+            self.hidden += bool(self.flags[row] & VISIBLE) - bool(value[0] & VISIBLE)
+        getattr(self, name)[width*row:width*row + width] = array(getattr(self, name).typecode, value)
+
+    def visible(self, row:int) -> bool:
+        return bool(self.flags[row] & VISIBLE)
+
+    def update(self, dt:float) -> None:
+        """Advance every entity one fixed timestep: prev_pos = pos, pos += dt*vel."""
+        n = 2*self.count
+        self.prev_pos[:n] = self.pos[:n]
+        pos = memoryview(self.pos)[:n]
+        batch.add_scaled(pos, memoryview(self.vel)[:n], dt, out=pos)
+
+    def interpolated(self, alpha:float) -> memoryview:
+        """Positions of the live rows 'alpha' of the way from prev_pos to pos.
+
+        Returns a view of a reused array: valid until the next call.
+        """
+        n = 2*self.count
+        out = memoryview(self.render_pos)[:n]
+        batch.lerp(memoryview(self.prev_pos)[:n], memoryview(self.pos)[:n], alpha, out=out)
+        return out
+
+    def gather(self, rows:list, alpha:float) -> tuple:
+        """Interpolated pos, size and color of the given rows, packed for GPU.write_sprites()."""
+        if np is not None:
+            idx = np.array(rows, dtype=np.intp)
+            prev = batch.view(self.prev_pos, 2)[idx]
+            pos = prev + alpha*(batch.view(self.pos, 2)[idx] - prev)
+            return pos, batch.view(self.size, 2)[idx], batch.view(self.color, 4)[idx]
+        pos, prev, size, color = self.pos, self.prev_pos, self.size, self.color
+        return (array('f', [prev[k] + alpha*(pos[k] - prev[k]) for r in rows for k in (2*r, 2*r + 1)]),
+                array('f', [size[k] for r in rows for k in (2*r, 2*r + 1)]),
+                array('f', [color[4*r + k] for r in rows for k in range(4)]))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""View frustum culling
+
+Planes are extracted from the combined world-to-clip matrix M = proj*view.
+A point p is inside when -w <= x, y <= w in clip space. With r_i the rows of
+M, x + w >= 0 is (r_3 + r_0)·p >= 0: so r_3 + r_0 is the left plane, and so
+on. Normalized, f·p is a signed distance in world units (positive inside), and
+a bounding sphere (c, r) is entirely outside a plane when f·c < -r (Lengyel
+Chapter 3, planes).
+
+The shaders flatten z (see shaders/test_cube.vert), so only the four side
+planes are tested: left, right, bottom, top.
+"""
+
+from array import array
+import logging
+from libs.math import Plane, Matrix4D
+from libs.math.batch import np                          # None if numpy is not installed
+
+logger = logging.getLogger(__name__)
+
+class Frustum:
+    def __init__(self, mat:Matrix4D) -> None:
+        """mat: world to clip space, e.g. proj_mat*view_mat."""
+        r0,r1,_,r3 = mat.rows()
+        self.planes = [
+            Plane(*(w + x for w,x in zip(r3, r0))).normalize(),  # Left
+            Plane(*(w - x for w,x in zip(r3, r0))).normalize(),  # Right
+            Plane(*(w + y for w,y in zip(r3, r1))).normalize(),  # Bottom
+            Plane(*(w - y for w,y in zip(r3, r1))).normalize(),  # Top
+            ]
+
+    def sphere_visible(self, center, radius:float) -> bool:
+        """False if the sphere is entirely outside one of the planes."""
+        for plane in self.planes:
+            if plane.dot(center) < -radius: return False
+        return True
+
+    def cull(self, centers:array, radius:float) -> list:
+        """Indices of the spheres (all of one radius) that are not entirely outside.
+
+        centers: x0,y0,z0, x1,y1,z1, ... (e.g. object positions)
+        """
+        if np is not None:
+            c = np.frombuffer(centers, np.float32).reshape(-1,3)
+            inside = np.ones(len(c), bool)
+            for plane in self.planes:
+                a,b,cz,d = plane
+                inside &= c[:,0]*a + c[:,1]*b + c[:,2]*cz + d >= -radius
+            return np.flatnonzero(inside).tolist()
+        visible = range(len(centers)//3)
+        for a,b,c,d in self.planes:
+            visible = [i for i in visible
+                       if a*centers[3*i] + b*centers[3*i + 1] + c*centers[3*i + 2] + d >= -radius]
+        return list(visible)
@@ -3,26 +3,104 @@
 """GPU rendering
 """
 import pygame
-from pygame import Surface, Rect, Color
 import moderngl
+import time
 from array import array
 import logging
+from libs.meshes import MeshRegistry
+from libs.residency import ResourceCache
+from libs.assets import AssetLoader
+from libs.shaders import ShaderRegistry
+from libs.math import Transform4D
+from libs.text import GlyphAtlas, AtlasText
+from libs.sprites import SpriteBatch
+from libs.frustum import Frustum
+from libs.render_queue import RenderQueue, BLEND_OFF
+from libs.stream import StreamBuffer
+from libs.debug_draw import DebugDraw
+from libs.resolution import ScaledTarget, DynamicResolution
+from libs.tiles import TileWorld
+from libs.capture import FrameCapture
 
 logger = logging.getLogger(__name__)
 
+CAMERA_BINDING = 0                                      # Uniform block binding of the 'Camera' block
+HUD_LAYER = 2                                           # Render queue layer drawn at native resolution
+TILE_LAYER = -1                                         # World tiles: under everything in the scene
+
 class GPU:
+    clear_color = (0.1,0.1,0.8)
+    scene = ('tiles', 'test_square', 'player')          # render_* methods called by render_scene()
+    vram_budget = 256*2**20                             # Bytes of meshes and textures that can be reloaded
+
     def __init__(self, game) -> None:
         self.game = game
 
         # Create a context
-        self.ctx = moderngl.create_context()
+        if self.game.os_window.headless:
+            # No window: standalone context (EGL, e.g. llvmpipe), draw to an offscreen framebuffer
+            self.ctx = moderngl.create_standalone_context(backend='egl')
+            self.fbo = self.ctx.simple_framebuffer(self.game.os_window.size)
+            self.fbo.use()
+        else:
+            self.ctx = moderngl.create_context()
+            self.fbo = self.ctx.screen
         self.log_ctx_info()
 
-        # Load shaders
-        self.shaders = self.load_shaders()
+        # Shaders: discovered in shaders/, compiled on first use, reloaded when edited
+        self.shaders = ShaderRegistry(self.ctx,
+                on_compile=self.bind_camera,
+                on_replace=self.forget_program)
+
+        # render_* methods submit draws here; render() sorts and draws them
+        self.queue = RenderQueue(self.ctx)
+
+        # Geometry that changes every frame goes in one pre-allocated buffer
+        self.stream = StreamBuffer(self.ctx)
+
+        # Debug lines, points and labels: collected during the frame, drawn when Game.debug is on
+        self.debug_draw = DebugDraw(self.ctx, self.stream)
+
+        # Dynamic resolution: the scene is drawn offscreen at a fraction of the
+        # window size, then upscaled. Off when headless: benchmarks stay comparable.
+        self.scene_target = ScaledTarget(self.ctx, self.game.os_window.size)
+        headless = self.game.os_window.headless
+        self.resolution = DynamicResolution(self.ctx, enabled=not headless, gpu_timer=not headless)
+
+        # Meshes and asset textures: least recently used are evicted when over budget
+        self.residency = ResourceCache(self.vram_budget, on_release=self.forget_resource)
+
+        # Upload static geometry once
+        self.meshes = MeshRegistry(self.ctx, self.residency)
+        self.upload_meshes()
+
+        # Files are read and decoded on worker threads, uploaded a bit per frame
+        self.assets = AssetLoader(self.ctx, self.meshes, self.residency)
+        self.shaders.prefetch(self.assets.executor)
+
+        # The static world: tiles baked by the asset loader, level of detail from the zoom
+        self.tiles = TileWorld(self.ctx, self.assets)
+
+        # Frame capture (F6): frames are read back a few frames late and written on a thread
+        self.capture = None
 
-        # Update transforms
-        self.update_transforms()
+        # HUD text: the glyph atlas is created on first use
+        self.hud_text = None
+
+        # Instanced sprites: created by the first write_sprites()
+        self.sprites = None
+        self.entities_drawn = 0                         # Visible entities drawn by render_entities()
+
+        # Camera uniform block: shared by every program that declares it
+        self.camera_ubo = self.ctx.buffer(reserve=2*16*4)   # Two mat4
+        self.camera_ubo.bind_to_uniform_block(CAMERA_BINDING)
+        self.camera_dirty = True                        # Update transforms on the first frame
+
+        # Frustum culling: meshes whose bounding sphere is off screen are not drawn
+        self.culling = True
+        self.frustum = None                             # Made by update_transforms()
+        self.meshes_drawn = 0                           # This frame
+        self.meshes_culled = 0
 
     def log_ctx_info(self) -> None:
         ### GL_VENDOR: Intel
@@ -32,146 +110,289 @@ class GPU:
         ### GL_VERSION: 4.6 (Compatibility Profile) Mesa 23.2.1-1ubuntu3.1~22.04.2
         logger.debug(f"GL_VERSION: {self.ctx.info['GL_VERSION']}")
 
-    def load_shaders(self) -> dict:
-        shaders = {}
-        # HUD
-        ### f.read(): Read until EOF. See https://docs.python.org/3/library/io.html#io.BufferedIOBase.read
-        with open("shaders/hud.vert") as f: vert = f.read()
-        with open("shaders/hud.frag") as f: frag = f.read()
-        shader = self.ctx.program(vertex_shader=vert, fragment_shader=frag)
-        shaders['shader_hud'] = shader
-        # Test square
-        with open('shaders/test_square.vert') as f: vert = f.read()
-        with open('shaders/test_square.frag') as f: frag = f.read()
-        shader = self.ctx.program(vertex_shader=vert, fragment_shader = frag)
-        shaders['shader_test_square'] = shader
-        # Player
-        with open('shaders/debug_player.vert') as f: vert = f.read()
-        with open('shaders/debug_player.frag') as f: frag = f.read()
-        shader = self.ctx.program(vertex_shader=vert, fragment_shader = frag)
-        shaders['shader_debug_player'] = shader
-        return shaders
+    def upload_meshes(self) -> None:
+        """Upload geometry that does not change from frame to frame."""
+        # Test square: define the square in world space
+        k = 0.2
+        self.meshes.upload('test_square',
+                array('f', [-k,k, k,k, -k,-k, k,-k]),
+                '2f', ('vert_pos',), mode=moderngl.TRIANGLE_STRIP)
+        # Player: unit square, scaled to player size by 'xlat_mat'
+        self.meshes.upload('player',
+                array('f', [0,1, 1,1, 0,0, 1,0]),
+                '2f', ('vert_pos',), mode=moderngl.TRIANGLE_STRIP)
+
+    def release(self) -> None:
+        """Release GPU resources at shutdown."""
+        self.stop_capture()
+        logger.debug(f"Release {self.meshes.buffer_count} buffers ({self.meshes.buffer_bytes} bytes)")
+        if self.hud_text: self.hud_text.atlas.release()
+        if self.sprites: self.sprites.release()
+        self.stream.release()
+        self.scene_target.release()
+        self.assets.shutdown()
+        self.tiles.release()
+        self.meshes.release_all()
+        self.residency.release_all()
+        self.camera_ubo.release()
+        self.shaders.release()
+
+    @property
+    def buffer_count(self) -> int:
+        """GPU buffers: meshes, world tiles, stream, sprites and the camera UBO."""
+        sprites = self.sprites.buffer_count if self.sprites else 0
+        return self.meshes.buffer_count + self.tiles.buffer_count + len((self.stream, self.camera_ubo)) + sprites
+
+    @property
+    def buffer_bytes(self) -> int:
+        sprites = self.sprites.buffer_bytes if self.sprites else 0
+        return self.meshes.buffer_bytes + self.tiles.buffer_bytes + self.stream.size + self.camera_ubo.size + sprites
+
+    def forget_program(self, program:moderngl.Program) -> None:
+        """A program is about to be released (hot reload): drop what refers to it."""
+        self.meshes.forget_program(program)
+        self.tiles.forget_program(program)
+        self.queue.forget_program(program)
+        self.stream.forget_program(program)
+        self.scene_target.forget_program(program)
+
+    def forget_resource(self, resource) -> None:
+        """A cached resource is about to be released (eviction, reload): drop what refers to it."""
+        if isinstance(resource, moderngl.Texture): self.queue.forget_texture(resource)
+
+    def bind_camera(self, shader:moderngl.Program) -> None:
+        """Bind the 'Camera' uniform block of this program to the camera UBO."""
+        if 'Camera' in shader:
+            shader['Camera'].binding = CAMERA_BINDING
+
+    def resize(self, size:tuple) -> None:
+        """Window resized: resize the framebuffers and the viewport, then rebuild the transforms."""
+        if self.game.os_window.headless:
+            self.fbo.release()
+            self.fbo = self.ctx.simple_framebuffer(size)
+        else:
+            self.fbo.viewport = (0, 0, *size)           # The default framebuffer keeps its old viewport
+        self.queue.forget_texture(self.scene_target.texture)  # Released: a new texture may get its glo
+        self.scene_target.resize(size)
+        self.mark_camera_dirty()                        # Aspect ratio changed
+
+    def mark_camera_dirty(self) -> None:
+        """Window size or zoom changed: update the camera UBO before the next frame."""
+        self.camera_dirty = True
 
     def update_transforms(self) -> None:
-        """Update transforms that are global to all GPU rendering."""
-        # Correct for aspect ratio
-        a = self.game.os_window.size[1]/self.game.os_window.size[0]
-        self.proj_mat = array('f', [
-            a, 0, 0, 0,
-            0, 1, 0, 0,
-            0, 0, 1, 0,
-            0, 0, 0, 1,
-            ])
-        # Zoom out
-        a = 1 # self.game.scale
-        self.view_mat = array('f', [
-            a, 0, 0, 0,
-            0, a, 0, 0,
-            0, 0, a, 0,
-            0, 0, 0, 1,
-            ])
+        """Update transforms that are global to all GPU rendering.
+
+        Write them to the camera UBO. Every program reads them from there.
+        """
+        camera = self.game.camera
+        self.proj_mat = camera.proj_mat                 # Correct for aspect ratio
+        self.view_mat = camera.view_mat                 # Zoom and pan
+        # Same order as the 'Camera' block in the shaders
+        for i,mat in enumerate((self.proj_mat, self.view_mat)):
+            self.camera_ubo.write(mat.buffer, offset=64*i)
+        self.frustum = Frustum(self.proj_mat*self.view_mat)
+        self.camera_dirty = False
+
+    def visible(self, name:str, offset:tuple=(0,0,0), scale:tuple=(1,1,1)) -> bool:
+        """Frustum test of a mesh's bounding sphere, scaled then moved by 'offset'.
+
+        Counts the mesh as drawn or culled for this frame.
+        """
+        _,sphere = self.meshes.bounds[name]               # Known even if evicted: no reload to cull
+        if self.culling and sphere is not None:
+            (cx,cy,cz),r = sphere
+            center = (offset[0] + scale[0]*cx, offset[1] + scale[1]*cy, offset[2] + scale[2]*cz)
+            if not self.frustum.sphere_visible(center, r*max(abs(k) for k in scale)):
+                self.meshes_culled += 1
+                return False
+        self.meshes_drawn += 1
+        return True
 
     def render(self) -> None:
-        self.ctx.clear(0.1,0.1,0.8)
-        self.ctx.blend_func = moderngl.PREMULTIPLIED_ALPHA # Makes text background transparent
-        self.ctx.enable(moderngl.BLEND)
-        self.render_test_square()
-        self.render_player()
-        if self.game.text_hud: self.render_hud()
-        self.ctx.disable(moderngl.BLEND)
-        pygame.display.flip()
+        """Submit the scene and the HUD to the render queue, then draw the queue in two passes.
+
+        Scene pass: layers below HUD_LAYER, offscreen at the dynamic
+        resolution scale (directly in the window at full scale).
+        Overlay pass: the upscaled scene, then the HUD at native resolution.
+
+        Items are blended with PREMULTIPLIED_ALPHA unless they ask otherwise
+        (makes the text background transparent). The render_* stages only
+        time submission: GPU work is in the two pass stages.
+        """
+        if self.camera_dirty: self.update_transforms()
+        self.stream.begin_frame()
+        orphans = self.stream.orphans
+        misses, evictions = self.residency.misses, self.residency.evictions
+        resolution = self.resolution
+        offscreen = resolution.scale < 1.0
+        if offscreen:
+            self.scene_target.use(resolution.scale)
+        else:
+            self.fbo.use()
+        self.ctx.clear(*self.clear_color)
+        self.render_scene()
+        if self.game.debug:
+            with self.game.profiler.stage('render_hud'): self.render_hud()
+            with self.game.profiler.stage('render_debug'): self.render_debug()
+        else:
+            self.debug_draw.clear()
+        self.debug_draw.enabled = self.game.debug       # For calls made before the next render()
+        profiler = self.game.profiler
+        # Not a GPU stage: the resolution timer query times it, and queries cannot nest
+        with profiler.stage('render_scene_pass'):
+            if resolution.enabled: resolution.begin()
+            self.queue.flush(profiler, below=HUD_LAYER)
+            if resolution.enabled: resolution.end()
+        with profiler.stage('render_overlay_pass', gpu=True):
+            self.fbo.use()
+            if offscreen: self.submit_upscale()
+            self.queue.flush(profiler)
+        profiler.count('stream_bytes', self.stream.frame_bytes)
+        profiler.count('stream_orphans', self.stream.orphans - orphans)
+        profiler.count('scene_gpu_ms', resolution.gpu_ms)
+        if self.capture:
+            with profiler.stage('capture'): self.capture.grab(self.fbo)
+        with profiler.stage('present'): self.present()
+        if resolution.enabled: resolution.end_frame()
+        self.residency.end_frame()                      # The queue is flushed: safe to evict
+        self.tiles.end_frame()
+        profiler.count('cache_misses', self.residency.misses - misses)
+        profiler.count('cache_evictions', self.residency.evictions - evictions)
+
+    def submit_upscale(self) -> None:
+        """Stretch the scaled scene over the window, under the HUD. No blending: it replaces."""
+        program = self.shaders['shader_upscale']
+        target = self.scene_target
+        self.queue.submit(program, target.upscale_vao(program), vertices=3,
+                          uniforms={'uv_scale': target.uv_scale, 'tex': 0},
+                          textures=((0, target.texture),), blend=BLEND_OFF, layer=HUD_LAYER - 1)
+
+    def start_capture(self, directory, fmt:str='png') -> FrameCapture:
+        """Record every rendered frame to 'directory' from now on. See libs/capture.py."""
+        self.stop_capture()
+        self.capture = FrameCapture(self.ctx, directory, fmt)
+        logger.info(f"Capturing frames to {directory} ({fmt})")
+        return self.capture
+
+    def stop_capture(self) -> None:
+        if self.capture is None: return
+        self.capture.close()
+        self.capture = None
+
+    def toggle_capture(self) -> None:
+        if self.capture: self.stop_capture()
+        else: self.start_capture(f"captures/{time.strftime('%Y%m%d-%H%M%S')}")
+
+    def present(self) -> None:
+        """Show the frame. Headless: wait for the GPU to finish the frame instead."""
+        if self.game.os_window.headless:
+            self.ctx.finish()
+        else:
+            pygame.display.flip()
+
+    def render_scene(self) -> None:
+        """Everything in world space. The HUD is drawn on top of this."""
+        self.meshes_drawn = self.meshes_culled = 0
+        for name in self.scene:
+            with self.game.profiler.stage(f"render_{name}"):
+                getattr(self, f"render_{name}")()
+        self.game.profiler.count('meshes_drawn', self.meshes_drawn)
+        self.game.profiler.count('meshes_culled', self.meshes_culled)
 
     def render_hud(self) -> None:
-        def make_hud_surf() -> Surface:
-            """Draw HUD to a texture."""
-            # Draw the text on a temporary surface that fills the OS Window
-            temp_surf = pygame.Surface(self.game.os_window.size)
-            # Get the size (w,h) of the Rect that bounds the text
-            size = self.game.text_hud.render(temp_surf, Color(255,255,255))
-            # Create a new surface sized exactly for the text
-            surf = Surface(size)
-            # Copy from the temporary surface to this smaller surface
-            surf.blit(temp_surf, (0,0), Rect((0,0),size))
-            return surf
-        def make_hud_vbo(surf:Surface) -> moderngl.Buffer:
-            """Map HUD to window coordinates (-1:1 coord sys).
-
-            * Subtract 0.5 to get a value between -0.5 and 0.5
-            * Scale by 2 to get a value between -1 and 1
-            * And since down is negative, scale the y value by -2, not +2
-
-            TODO: use self.game.text_hud.pos to control where HUD is placed on screen.
-            """
-            hud_size = surf.get_size()
-            win_size = self.game.os_window.size
-            hud_size_in_win_coordinates = (
-                     2*(hud_size[0]/win_size[0] - 0.5),
-                    -2*(hud_size[1]/win_size[1] - 0.5))
-            # Right edge
-            r = hud_size_in_win_coordinates[0]
-            # Bottom edge
-            b = hud_size_in_win_coordinates[1]
-            return self.ctx.buffer(data=array('f', [
-                # vert  tex
-                -1, 1,  0, 0,
-                 r, 1,  1, 0,
-                -1, b,  0, 1,
-                 r, b,  1, 1,
-                ]))
-        surf = make_hud_surf()
-        vbo = make_hud_vbo(surf)
-        vao = self.ctx.vertex_array(
-                self.shaders['shader_hud'],
-                [(vbo, '2f 2f', 'vert_pos', 'tex_coord')])
-        tex = self.ctx.texture(surf.get_size(), 4)      # 4 color channels
-        tex.filter = (moderngl.NEAREST, moderngl.NEAREST)
-        tex.swizzle = 'BGRA'
-        tex.write(surf.get_view('1'))
-        tex.use(0)
-        self.shaders['shader_hud']['tex'] = 0
-        self.shaders['shader_hud']['alpha'] = 1.0
-        vao.render(mode=moderngl.TRIANGLE_STRIP)
-        tex.release()
+        """Draw the HUD text with the glyph atlas.
+
+        Glyphs are rasterized once. Each frame only the characters that
+        changed are uploaded. The text is drawn with a single draw call, in
+        HUD_LAYER: on top of the scene and the debug overlay, at native resolution.
+        """
+        text_hud = self.game.text_hud
+        if self.hud_text is None:
+            self.hud_text = AtlasText(self.meshes, 'hud', GlyphAtlas(self.ctx, text_hud.font))
+        self.hud_text.update(text_hud.msg_lines, text_hud.pos)
+        self.hud_text.submit(self.queue, self.shaders['shader_text'], layer=HUD_LAYER, uniforms={
+            'win_size': tuple(self.game.os_window.size),
+            'text_color': (1.0, 1.0, 1.0, 1.0),
+            })
+
+    def render_debug(self) -> None:
+        """Debug overlay, in layer 1: Game.draw_debug() shapes and anything else sent to debug_draw.
+
+        One draw call per primitive type (lines, points, labels).
+        """
+        if hasattr(self.game, 'draw_debug'): self.game.draw_debug(self.debug_draw)
+        atlas = self.hud_text.atlas if self.hud_text else None    # Labels use the HUD glyphs
+        n = self.debug_draw.submit(self.queue, self.shaders['shader_debug_lines'],
+                                   self.shaders['shader_debug_text'], self.game.camera, atlas)
+        self.game.profiler.count('debug_vertices', n)
+
+    def submit_mesh(self, name:str, program:moderngl.Program, **kwargs) -> None:
+        """Queue a draw of a registered mesh. See RenderQueue.submit() for kwargs."""
+        kwargs.setdefault('mode', self.meshes[name].mode)
+        self.queue.submit(program, self.meshes.vao(name, program), **kwargs)
+
+    def render_tiles(self) -> None:
+        """The world under the view, at the level of detail for the zoom. See libs/tiles.py."""
+        tiles = self.tiles
+        tiles.submit(self.queue, self.shaders['shader_tiles'], self.game.camera, layer=TILE_LAYER)
+        self.game.profiler.count('tiles_drawn', tiles.drawn)
+        self.game.profiler.count('tile_triangles', tiles.triangles)
 
     def render_test_square(self) -> None:
-        """Test aspect ratio with this square."""
-        # Define the square in world space
-        k = 0.2
-        vbo = self.ctx.buffer(data=array('f', [-k,k, k,k, -k,-k, k,-k]))
-        vao = self.ctx.vertex_array(
-                self.shaders['shader_test_square'],
-                [(vbo, '2f', 'vert_pos')])
-        # Apply transforms
-        self.shaders['shader_test_square']['proj_mat'] = self.proj_mat # aspect ratio
-        self.shaders['shader_test_square']['view_mat'] = self.view_mat # zoom and pan
-        # Render
-        vao.render(mode=moderngl.TRIANGLE_STRIP)
+        """Test aspect ratio with this square. Transforms come from the camera UBO."""
+        self.submit_mesh('test_square', self.shaders['shader_test_square'])
+
+    def write_sprites(self, count:int, pos=None, size=None, color=None) -> None:
+        """Upload per-instance data for render_sprites(). See SpriteBatch.write()."""
+        if self.sprites is None: self.sprites = SpriteBatch(self.ctx, capacity=max(count, 1024))
+        self.sprites.write(count, pos, size, color)
+
+    def render_sprites(self) -> None:
+        """Draw every sprite with one instanced draw call. Transforms come from the camera UBO."""
+        if self.sprites is None: return
+        # Sprite alpha is coverage, not additive
+        self.sprites.submit(self.queue, self.shaders['shader_sprites'], blend=moderngl.DEFAULT_BLENDING)
+
+    def render_entities(self) -> None:
+        """Draw the entities in the visible region as sprites.
+
+        The spatial grid picks the entities in the cells the view overlaps, so
+        the cost follows the visible count, not the total. Entities without the
+        VISIBLE flag (e.g. the player, drawn by render_player()) are skipped.
+        """
+        entities = self.game.entities
+        l,b,r,t = self.game.camera.visible_rect
+        ids = self.game.grid.query_rect(l, b, r, t, exact=False)
+        if 2*len(ids) > entities.count and not entities.hidden:
+            # Mostly visible: drawing the off-screen rest costs less than
+            # gathering. The entity arrays upload without repacking.
+            n = entities.count
+            pos, size, color = entities.interpolated(self.game.alpha), entities.view('size'), entities.view('color')
+        else:
+            rows = [row for row in map(entities.rows.__getitem__, ids) if entities.visible(row)]
+            n = len(rows)
+            pos, size, color = entities.gather(rows, self.game.alpha)
+        self.write_sprites(n, pos, size, color)
+        self.entities_drawn = n
+        self.render_sprites()
 
     def render_player(self) -> None:
-        # Draw a debug rect
-        size = self.game.player.size
-        x,y = size
-        vbo = self.ctx.buffer(data=array('f', [0,y, x,y, 0,0, x,0]))
-        vao = self.ctx.vertex_array(
-                self.shaders['shader_debug_player'],
-                [(vbo, '2f', 'vert_pos')])
+        # Draw a debug rect: the unit square mesh, scaled to the player size
+        w,h = self.game.player.size
         # Translate
-        x,y = self.game.player.pos                      # Player position in world space (game coordinates)
-        # Let u,v be the player position in model space
-        # Move the player to world space position x,y
-        # | 1, 0, 0, x ||u| = |u + x|
-        # | 0, 1, 0, y ||v|   |v + y|
-        # | 0, 0, 1, 0 ||0|   |0    |
-        # | 0, 0, 0, 1 ||1|   |1    |
-        self.shaders['shader_debug_player']['xlat_mat'] = array('f', [
-            1, 0, 0, 0,
-            0, 1, 0, 0,
-            0, 0, 1, 0,
-            x, y, 0, 1,
-            ])
-        # Correct for aspect ratio
-        self.shaders['shader_debug_player']['proj_mat'] = self.proj_mat # aspect ratio
-        self.shaders['shader_debug_player']['view_mat'] = self.view_mat # zoom and pan
-        # Testing mouse zoom
-        self.shaders['shader_debug_player']['test_mat'] = self.game.test_matrix
-        vao.render(mode=moderngl.TRIANGLE_STRIP)
+        x,y = self.game.player.interpolated(self.game.alpha) # Player position in world space (game coordinates)
+        # Let u,v be the player position in model space (unit square)
+        # Scale the player to size w,h and move it to world space position x,y
+        # | w, 0, 0, x ||u| = |w*u + x|
+        # | 0, h, 0, y ||v|   |h*v + y|
+        # | 0, 0, 1, 0 ||0|   |0      |
+        # | 0, 0, 0, 1 ||1|   |1      |
+        if not self.visible('player', (x,y,0), (w,h,1)): return
+        xlat_mat = Transform4D(
+            w, 0, 0, x,
+            0, h, 0, y,
+            0, 0, 1, 0)
+        # Aspect ratio, zoom and pan come from the camera UBO
+        self.submit_mesh('player', self.shaders['shader_debug_player'],
+                         uniforms={'xlat_mat': xlat_mat.buffer})
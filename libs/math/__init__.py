@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Math from Lengyel 'Foundations of Game Engine Development Vol 1'
+
+Types store their entries in array('f') in column order: use '.buffer' to
+write them straight to a uniform or a uniform block. Batched operations over
+contiguous arrays of vectors are in 'libs.math.batch'.
+"""
+
+from libs.math.vector import Vector3D, Point3D, dot, cross, magnitude, normalize, project, reject
+from libs.math.matrix import Matrix3D, Matrix4D
+from libs.math.transform import Transform4D
+from libs.math.plane import Plane
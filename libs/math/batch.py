@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Batched operations over contiguous arrays of vectors
+
+N vectors are stored in one array('f') of N*dim floats: x0,y0,z0, x1,y1,z1, ...
+This is the same layout as a VBO, so results can go straight to ctx.buffer().
+
+If numpy is installed, operations run vectorized on zero-copy views of the
+arrays. Otherwise they fall back to strided slices and list comprehensions:
+same results, but a Python loop.
+"""
+
+from array import array
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:                                     # numpy is optional
+    np = None
+
+HAVE_NUMPY = np is not None
+
+def zeros(n:int, dim:int=3) -> array:
+    """Array of n vectors, all zero."""
+    return array('f', bytes(4*n*dim))
+
+def view(data:array, dim:int=3):
+    """Zero-copy numpy view of the array, shape (N, dim). Requires numpy."""
+    return np.frombuffer(data, dtype=np.float32).reshape(-1, dim)
+
+def _columns(m) -> list:
+    """First three rows of a Matrix4D/Transform4D as a list of row tuples."""
+    n = m.data
+    return [(n[i], n[4 + i], n[8 + i], n[12 + i]) for i in range(3)]
+
+def _transform(m, data:array, dim:int, w:float, out:array) -> array:
+    if out is None: out = zeros(len(data)//dim, dim)
+    if HAVE_NUMPY:
+        M = view(m.data, 4).T                           # Column order to row order
+        result = view(out, dim)
+        np.matmul(view(data, dim), M[:dim,:dim].T, out=result)
+        if w: result += w*M[:dim,3]
+        return out
+    rows = _columns(m)
+    if dim == 2:
+        xs, ys = data[0::2], data[1::2]
+        for i in range(2):
+            a, b, _, t = rows[i]
+            t *= w
+            out[i::2] = array('f', [a*x + b*y + t for x,y in zip(xs, ys)])
+    else:
+        xs, ys, zs = data[0::3], data[1::3], data[2::3]
+        for i in range(3):
+            a, b, c, t = rows[i]
+            t *= w
+            out[i::3] = array('f', [a*x + b*y + c*z + t for x,y,z in zip(xs, ys, zs)])
+    return out
+
+def transform_points(m, points:array, dim:int=3, out:array=None) -> array:
+    """M*p for every point p, with translation. 2D points have z = 0.
+
+    'out' may be 'points' to transform in place.
+    """
+    return _transform(m, points, dim, 1.0, out)
+
+def transform_vectors(m, vectors:array, dim:int=3, out:array=None) -> array:
+    """M*v for every vector v, without translation."""
+    return _transform(m, vectors, dim, 0.0, out)
+
+def dot(a:array, b:array, dim:int=3) -> array:
+    """a[i]·b[i] for every pair of vectors. Returns N floats."""
+    if HAVE_NUMPY:
+        out = zeros(len(a)//dim, 1)
+        np.einsum('ij,ij->i', view(a, dim), view(b, dim), out=view(out, 1)[:,0])
+        return out
+    out = array('f', [0.0])*(len(a)//dim)
+    for i in range(dim):
+        out = array('f', [s + p*q for s,p,q in zip(out, a[i::dim], b[i::dim])])
+    return out
+
+def cross(a:array, b:array, out:array=None) -> array:
+    """a[i]×b[i] for every pair of 3D vectors."""
+    if out is None: out = zeros(len(a)//3)
+    if HAVE_NUMPY:
+        view(out)[:] = np.cross(view(a), view(b))
+        return out
+    ax, ay, az = a[0::3], a[1::3], a[2::3]
+    bx, by, bz = b[0::3], b[1::3], b[2::3]
+    out[0::3] = array('f', [y*w - z*v for y,z,v,w in zip(ay, az, by, bz)])
+    out[1::3] = array('f', [z*u - x*w for x,z,u,w in zip(ax, az, bx, bz)])
+    out[2::3] = array('f', [x*v - y*u for x,y,u,v in zip(ax, ay, bx, by)])
+    return out
+
+def normalize(vectors:array, dim:int=3, out:array=None) -> array:
+    """v/||v|| for every vector. Zero vectors stay zero.
+
+    'out' may be 'vectors' to normalize in place.
+    """
+    if out is None: out = zeros(len(vectors)//dim, dim)
+    if HAVE_NUMPY:
+        v = view(vectors, dim)
+        length = np.sqrt(np.einsum('ij,ij->i', v, v))
+        np.divide(v, length[:,None], out=view(out, dim), where=length[:,None] > 0)
+        return out
+    inv = [1.0/math.sqrt(s) if s > 0 else 0.0 for s in dot(vectors, vectors, dim)]
+    for i in range(dim):
+        out[i::dim] = array('f', [x*k for x,k in zip(vectors[i::dim], inv)])
+    return out
+
+def add_scaled(a:array, b:array, k:float, out:array=None) -> array:
+    """a + k*b, element by element (any dim). E.g. position + dt*velocity.
+
+    'out' may be 'a' to update in place.
+    """
+    if out is None: out = zeros(len(a), 1)
+    if HAVE_NUMPY:
+        np.add(view(a, 1), k*view(b, 1), out=view(out, 1))
+        return out
+    out[:] = array('f', [p + k*q for p,q in zip(a, b)])
+    return out
+
+def lerp(a:array, b:array, t:float, out:array=None) -> array:
+    """a + t*(b - a), element by element (any dim). E.g. interpolate positions."""
+    if out is None: out = zeros(len(a), 1)
+    if HAVE_NUMPY:
+        A = view(a, 1)
+        np.add(A, t*(view(b, 1) - A), out=view(out, 1))
+        return out
+    out[:] = array('f', [p + t*(q - p) for p,q in zip(a, b)])
+    return out
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Matrix3D and Matrix4D (Lengyel Chapter 1)
+
+Constructors take entries in row order, the way the matrix is written on
+paper. Storage is column order, like the book and like GLSL: 'buffer' can be
+written straight to a mat3/mat4 uniform or a uniform block.
+
+M[i,j] is the entry in row i, column j.
+"""
+
+from array import array
+from libs.math.vector import Vector3D
+
+def _cross(a:tuple, b:tuple) -> tuple:
+    return (a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0])
+
+def _dot(a:tuple, b:tuple) -> float:
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+class Matrix3D:
+    __slots__ = ('data',)
+
+    def __init__(self, *entries:float) -> None:
+        """Matrix3D(n00, n01, n02, n10, ..., n22). No entries: identity."""
+        if not entries: entries = (1,0,0, 0,1,0, 0,0,1)
+        self.data = array('f', [entries[3*i + j] for j in range(3) for i in range(3)])
+
+    @classmethod
+    def from_columns(cls, a:Vector3D, b:Vector3D, c:Vector3D) -> 'Matrix3D':
+        m = cls.__new__(cls)
+        m.data = a.data + b.data + c.data
+        return m
+
+    @property
+    def buffer(self) -> memoryview:
+        """Zero-copy view of the entries in column order."""
+        return memoryview(self.data)
+
+    def __getitem__(self, ij:tuple) -> float:
+        i,j = ij
+        return self.data[3*j + i]
+
+    def __setitem__(self, ij:tuple, value:float) -> None:
+        i,j = ij
+        self.data[3*j + i] = value
+
+    def column(self, j:int) -> Vector3D:
+        return Vector3D(*self.data[3*j:3*j + 3])
+
+    def rows(self) -> list:
+        n = self.data
+        return [tuple(n[3*j + i] for j in range(3)) for i in range(3)]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}{tuple(self.rows())}"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Matrix3D) and self.data == other.data
+
+    def __mul__(self, other):
+        """Matrix product, or matrix times column vector."""
+        n = self.data
+        if isinstance(other, Vector3D):
+            x,y,z = other.data
+            return type(other)(n[0]*x + n[3]*y + n[6]*z,
+                               n[1]*x + n[4]*y + n[7]*z,
+                               n[2]*x + n[5]*y + n[8]*z)
+        m = other.data
+        product = Matrix3D.__new__(Matrix3D)
+        product.data = array('f', [
+            sum(n[3*k + i]*m[3*j + k] for k in range(3))
+            for j in range(3) for i in range(3)])
+        return product
+
+    def determinant(self) -> float:
+        """det(M) = (a×b)·c for columns a, b, c"""
+        n = self.data
+        return (n[0]*(n[4]*n[8] - n[7]*n[5])
+              + n[3]*(n[7]*n[2] - n[1]*n[8])
+              + n[6]*(n[1]*n[5] - n[4]*n[2]))
+
+    def inverse(self) -> 'Matrix3D':
+        """Rows of the inverse are b×c, c×a, a×b over det(M) (Lengyel Listing 1.10)"""
+        n = self.data
+        a, b, c = tuple(n[0:3]), tuple(n[3:6]), tuple(n[6:9])
+        r0, r1, r2 = _cross(b, c), _cross(c, a), _cross(a, b)
+        inv_det = 1.0/_dot(r2, c)
+        return Matrix3D(*(x*inv_det for r in (r0, r1, r2) for x in r))
+
+class Matrix4D:
+    __slots__ = ('data',)
+
+    def __init__(self, *entries:float) -> None:
+        """Matrix4D(n00, n01, n02, n03, n10, ..., n33). No entries: identity."""
+        if not entries: entries = (1,0,0,0, 0,1,0,0, 0,0,1,0, 0,0,0,1)
+        self.data = array('f', [entries[4*i + j] for j in range(4) for i in range(4)])
+
+    @property
+    def buffer(self) -> memoryview:
+        """Zero-copy view of the entries in column order."""
+        return memoryview(self.data)
+
+    def __getitem__(self, ij:tuple) -> float:
+        i,j = ij
+        return self.data[4*j + i]
+
+    def __setitem__(self, ij:tuple, value:float) -> None:
+        i,j = ij
+        self.data[4*j + i] = value
+
+    def rows(self) -> list:
+        n = self.data
+        return [tuple(n[4*j + i] for j in range(4)) for i in range(4)]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}{tuple(self.rows())}"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Matrix4D) and self.data == other.data
+
+    def __mul__(self, other:'Matrix4D') -> 'Matrix4D':
+        """Matrix product."""
+        n = self.data
+        m = other.data
+        product = Matrix4D.__new__(Matrix4D)
+        product.data = array('f', [
+            sum(n[4*k + i]*m[4*j + k] for k in range(4))
+            for j in range(4) for i in range(4)])
+        return product
+
+    def inverse(self) -> 'Matrix4D':
+        """Inverse of a 4x4 matrix (Lengyel Listing 1.11)"""
+        n = self.data
+        a, b, c, d = tuple(n[0:3]), tuple(n[4:7]), tuple(n[8:11]), tuple(n[12:15])
+        x, y, z, w = n[3], n[7], n[11], n[15]
+        s = _cross(a, b)
+        t = _cross(c, d)
+        u = tuple(a[i]*y - b[i]*x for i in range(3))
+        v = tuple(c[i]*w - d[i]*z for i in range(3))
+        inv_det = 1.0/(_dot(s, v) + _dot(t, u))
+        s = tuple(k*inv_det for k in s)
+        t = tuple(k*inv_det for k in t)
+        u = tuple(k*inv_det for k in u)
+        v = tuple(k*inv_det for k in v)
+        r0 = tuple(p + q*y for p,q in zip(_cross(b, v), t))
+        r1 = tuple(p - q*x for p,q in zip(_cross(v, a), t))
+        r2 = tuple(p + q*w for p,q in zip(_cross(d, u), s))
+        r3 = tuple(p - q*z for p,q in zip(_cross(u, c), s))
+        return Matrix4D(*r0, -_dot(b, t),
+                        *r1,  _dot(a, t),
+                        *r2, -_dot(d, s),
+                        *r3,  _dot(c, s))
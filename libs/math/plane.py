@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Plane (Lengyel Chapter 3)
+
+A plane is a 4D vector f = (n, d). For a point p, f·p = n·p + d is the signed
+distance from the plane when n is unit length: positive on the side n points
+to. Stored in an array('f') like the other types.
+"""
+
+from array import array
+import math
+from libs.math.vector import Vector3D
+
+class Plane:
+    __slots__ = ('data',)
+
+    def __init__(self, nx:float=0.0, ny:float=0.0, nz:float=1.0, d:float=0.0) -> None:
+        self.data = array('f', (nx, ny, nz, d))
+
+    @property
+    def normal(self) -> Vector3D:
+        return Vector3D(*self.data[:3])
+
+    @property
+    def d(self) -> float:
+        return self.data[3]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __repr__(self) -> str:
+        return f"Plane{tuple(self.data)}"
+
+    def dot(self, p) -> float:
+        """f·p: signed distance of a point (w = 1) if the normal is unit length."""
+        a,b,c,d = self.data
+        return a*p[0] + b*p[1] + c*p[2] + d
+
+    def dot_vector(self, v:Vector3D) -> float:
+        """f·v for a direction (w = 0): the d term drops out."""
+        a,b,c,_ = self.data
+        return a*v[0] + b*v[1] + c*v[2]
+
+    def normalize(self) -> 'Plane':
+        """Scale so the normal is unit length. Distances from dot() are then in world units."""
+        a,b,c,d = self.data
+        s = 1.0/math.sqrt(a*a + b*b + c*c)
+        return Plane(a*s, b*s, c*s, d*s)
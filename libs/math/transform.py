@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Transform4D (Lengyel Chapter 2)
+
+A 4x4 matrix whose fourth row is always (0, 0, 0, 1): a 3x3 matrix plus a
+translation. The translation applies to points, not to vectors.
+"""
+
+import math
+from array import array
+from libs.math.vector import Vector3D, Point3D
+from libs.math.matrix import Matrix4D, _cross, _dot
+
+class Transform4D(Matrix4D):
+    __slots__ = ()
+
+    def __init__(self, *entries:float) -> None:
+        """Transform4D(n00, n01, n02, n03, n10, ..., n23): the first three rows.
+
+        No entries: identity.
+        """
+        if not entries: entries = (1,0,0,0, 0,1,0,0, 0,0,1,0)
+        super().__init__(*entries, 0, 0, 0, 1)
+
+    @classmethod
+    def make_scale(cls, sx:float, sy:float, sz:float=1.0) -> 'Transform4D':
+        return cls(sx, 0, 0, 0,
+                   0, sy, 0, 0,
+                   0, 0, sz, 0)
+
+    @classmethod
+    def make_translation(cls, x:float, y:float, z:float=0.0) -> 'Transform4D':
+        return cls(1, 0, 0, x,
+                   0, 1, 0, y,
+                   0, 0, 1, z)
+
+    @classmethod
+    def make_rotation_z(cls, angle:float) -> 'Transform4D':
+        """Rotate by 'angle' radians about the z axis"""
+        c, s = math.cos(angle), math.sin(angle)
+        return cls(c, -s, 0, 0,
+                   s,  c, 0, 0,
+                   0,  0, 1, 0)
+
+    @property
+    def translation(self) -> Point3D:
+        return Point3D(*self.data[12:15])
+
+    @translation.setter
+    def translation(self, p:Vector3D) -> None:
+        self.data[12:15] = p.data
+
+    def __mul__(self, other):
+        """Transform a point (with translation) or a vector (without), or compose transforms."""
+        n = self.data
+        if isinstance(other, Vector3D):
+            x,y,z = other.data
+            if isinstance(other, Point3D):
+                return Point3D(n[0]*x + n[4]*y + n[8]*z + n[12],
+                               n[1]*x + n[5]*y + n[9]*z + n[13],
+                               n[2]*x + n[6]*y + n[10]*z + n[14])
+            return Vector3D(n[0]*x + n[4]*y + n[8]*z,
+                            n[1]*x + n[5]*y + n[9]*z,
+                            n[2]*x + n[6]*y + n[10]*z)
+        product = super().__mul__(other)
+        if isinstance(other, Transform4D):
+            product.__class__ = Transform4D
+        return product
+
+    def inverse(self) -> 'Transform4D':
+        """Inverse that relies on the fourth row being (0, 0, 0, 1) (Lengyel Chapter 2)"""
+        n = self.data
+        a, b, c, d = tuple(n[0:3]), tuple(n[4:7]), tuple(n[8:11]), tuple(n[12:15])
+        s = _cross(a, b)
+        t = _cross(c, d)
+        inv_det = 1.0/_dot(s, c)
+        s = tuple(k*inv_det for k in s)
+        t = tuple(k*inv_det for k in t)
+        v = tuple(k*inv_det for k in c)
+        r0 = _cross(b, v)
+        r1 = _cross(v, a)
+        return Transform4D(*r0, -_dot(b, t),
+                           *r1,  _dot(a, t),
+                           *s,  -_dot(d, s))
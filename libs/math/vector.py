@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Vector3D and Point3D (Lengyel Chapters 1 and 2)
+
+Components are stored in an array('f') so a vector can be handed to OpenGL
+without repacking: see 'buffer'.
+"""
+
+from array import array
+import math
+
+class Vector3D:
+    __slots__ = ('data',)
+
+    def __init__(self, x:float=0.0, y:float=0.0, z:float=0.0) -> None:
+        self.data = array('f', (x, y, z))
+
+    @property
+    def x(self) -> float: return self.data[0]
+    @x.setter
+    def x(self, value:float) -> None: self.data[0] = value
+
+    @property
+    def y(self) -> float: return self.data[1]
+    @y.setter
+    def y(self, value:float) -> None: self.data[1] = value
+
+    @property
+    def z(self) -> float: return self.data[2]
+    @z.setter
+    def z(self, value:float) -> None: self.data[2] = value
+
+    @property
+    def buffer(self) -> memoryview:
+        """Zero-copy view of the components. Write it straight to a uniform."""
+        return memoryview(self.data)
+
+    def __getitem__(self, i:int) -> float:
+        return self.data[i]
+
+    def __setitem__(self, i:int, value:float) -> None:
+        self.data[i] = value
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return 3
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.x}, {self.y}, {self.z})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Vector3D) and self.data == other.data
+
+    def __neg__(self) -> 'Vector3D':
+        x,y,z = self.data
+        return type(self)(-x, -y, -z)
+
+    def __add__(self, other:'Vector3D') -> 'Vector3D':
+        x,y,z = self.data
+        u,v,w = other.data
+        return Vector3D(x+u, y+v, z+w)
+
+    def __sub__(self, other:'Vector3D') -> 'Vector3D':
+        x,y,z = self.data
+        u,v,w = other.data
+        return Vector3D(x-u, y-v, z-w)
+
+    def __mul__(self, s:float) -> 'Vector3D':
+        x,y,z = self.data
+        return type(self)(x*s, y*s, z*s)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, s:float) -> 'Vector3D':
+        s = 1.0/s
+        x,y,z = self.data
+        return type(self)(x*s, y*s, z*s)
+
+class Point3D(Vector3D):
+    """A position. Transform4D applies its translation to points, not to vectors.
+
+    Point + Vector is a Point. Point - Point is a Vector.
+    """
+    __slots__ = ()
+
+    def __add__(self, other:Vector3D) -> 'Point3D':
+        x,y,z = self.data
+        u,v,w = other.data
+        return Point3D(x+u, y+v, z+w)
+
+def dot(a:Vector3D, b:Vector3D) -> float:
+    """a·b (Lengyel Section 1.5)"""
+    x,y,z = a.data
+    u,v,w = b.data
+    return x*u + y*v + z*w
+
+def cross(a:Vector3D, b:Vector3D) -> Vector3D:
+    """a×b (Lengyel Section 1.5)"""
+    x,y,z = a.data
+    u,v,w = b.data
+    return Vector3D(y*w - z*v, z*u - x*w, x*v - y*u)
+
+def magnitude(v:Vector3D) -> float:
+    """||v||"""
+    x,y,z = v.data
+    return math.sqrt(x*x + y*y + z*z)
+
+def normalize(v:Vector3D) -> Vector3D:
+    """v/||v||"""
+    return v/magnitude(v)
+
+def project(a:Vector3D, b:Vector3D) -> Vector3D:
+    """Projection of a onto b (Lengyel Section 1.6)"""
+    return b*(dot(a, b)/dot(b, b))
+
+def reject(a:Vector3D, b:Vector3D) -> Vector3D:
+    """Rejection of a from b (Lengyel Section 1.6)"""
+    return a - project(a, b)
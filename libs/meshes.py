@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Mesh registry: upload geometry once, draw it every frame.
+
+Static geometry is uploaded under a name. VAOs are cached per (mesh, program)
+pair. Nothing is allocated on the GPU per frame: per-frame state (player
+position, zoom) goes in uniforms, and dynamic meshes are overwritten in place.
+
+Bounds (an AABB and a bounding sphere, in model space) are computed once at
+upload from the first attribute, the position. Use them to cull meshes that
+are off screen (see libs/frustum.py).
+
+Meshes live in a ResourceCache (libs/residency.py), shared with the other
+GPU resources. A mesh uploaded with a load() function may be evicted when
+the cache is over its memory budget; the next lookup uploads it again.
+Bounds stay known while a mesh is evicted: culling does not reload it.
+"""
+
+import moderngl
+from array import array
+import math
+import logging
+from libs.residency import ResourceCache
+
+logger = logging.getLogger(__name__)
+
+def compute_bounds(vertices:array, fmt:str) -> tuple:
+    """AABB ((x0,y0,z0), (x1,y1,z1)) and bounding sphere (center, radius) of the positions.
+
+    The position is the first attribute in 'fmt'. 2D positions have z = 0.
+    Return (None, None) unless every attribute is 32-bit floats (e.g. '2f 2f').
+    """
+    sizes = [attr[:-1] for attr in fmt.split()]
+    if not all(attr.endswith('f') for attr in fmt.split()) or not all(n.isdigit() for n in sizes):
+        return None, None
+    stride, dim = sum(int(n) for n in sizes), int(sizes[0])
+    if dim not in (2,3) or len(vertices) < stride: return None, None
+    xs, ys = vertices[0::stride], vertices[1::stride]
+    zs = vertices[2::stride] if dim == 3 else [0.0]*len(xs)
+    lo = (min(xs), min(ys), min(zs))
+    hi = (max(xs), max(ys), max(zs))
+    cx,cy,cz = center = tuple((l + h)/2 for l,h in zip(lo, hi))
+    radius = math.sqrt(max((x - cx)**2 + (y - cy)**2 + (z - cz)**2 for x,y,z in zip(xs, ys, zs)))
+    return (lo, hi), (center, radius)
+
+class Mesh:
+    def __init__(self, vbo:moderngl.Buffer, fmt:str, attrs:tuple,
+                 ibo:moderngl.Buffer=None, index_element_size:int=4,
+                 mode:int=moderngl.TRIANGLES, aabb:tuple=None, sphere:tuple=None) -> None:
+        self.vbo = vbo
+        self.fmt = fmt                                  # Buffer format, e.g. '2f'
+        self.attrs = attrs                              # Attribute names, e.g. ('vert_pos',)
+        self.ibo = ibo
+        self.index_element_size = index_element_size
+        self.mode = mode
+        self.aabb = aabb                                # Model space (min, max). None: never culled
+        self.sphere = sphere                            # Model space (center, radius)
+
+    @property
+    def buffers(self) -> list:
+        return [b for b in (self.vbo, self.ibo) if b is not None]
+
+class MeshRegistry:
+    def __init__(self, ctx:moderngl.Context, cache:ResourceCache=None) -> None:
+        self.ctx = ctx
+        self.cache = cache if cache is not None else ResourceCache()    # Keys ('mesh', name)
+        self.bounds = {}                                # name: (aabb, sphere), resident or not
+        self.vaos = {}                                  # (name, program.glo): VertexArray
+
+    def __contains__(self, name:str) -> bool:
+        return ('mesh', name) in self.cache
+
+    def __getitem__(self, name:str) -> Mesh:
+        """The mesh. Uploads it again if it was evicted."""
+        return self.cache.get(('mesh', name))
+
+    @property
+    def names(self) -> list:
+        return [key[1] for key in self.cache.keys('mesh')]
+
+    def create(self, vertices:array, fmt:str, attrs:tuple,
+               indices:array=None, mode:int=moderngl.TRIANGLES,
+               dynamic:bool=False, bounds:tuple=None) -> Mesh:
+        """Upload geometry to new buffers. The Mesh is not registered: see upload().
+
+        Use the array itemsize for the IBO element size (see README).
+        'vertices' and 'indices' may be any buffer with an itemsize, e.g. a
+        memoryview of a memory-mapped file (see libs/models.py).
+        bounds: (aabb, sphere) if already known, else computed from 'vertices'.
+        """
+        vbo = self.ctx.buffer(data=vertices, dynamic=dynamic)
+        if bounds is not None:
+            aabb, sphere = bounds
+        else:
+            aabb, sphere = (None, None) if dynamic else compute_bounds(vertices, fmt)
+        if indices is None:
+            return Mesh(vbo, fmt, attrs, mode=mode, aabb=aabb, sphere=sphere)
+        ibo = self.ctx.buffer(data=indices)
+        return Mesh(vbo, fmt, attrs, ibo, indices.itemsize, mode, aabb, sphere)
+
+    def upload(self, name:str, vertices:array, fmt:str, attrs:tuple,
+               indices:array=None, mode:int=moderngl.TRIANGLES,
+               dynamic:bool=False, bounds:tuple=None, load=None) -> Mesh:
+        """Upload geometry once and register it under 'name'. See create() and add()."""
+        return self.add(name, self.create(vertices, fmt, attrs, indices, mode, dynamic, bounds), load)
+
+    def add(self, name:str, mesh:Mesh, load=None) -> Mesh:
+        """Register a mesh. Replaces and releases an existing mesh with that name.
+
+        load: () -> Mesh, to upload it again after an eviction (e.g. from the
+        model file, see libs/assets.py). None: the mesh is never evicted.
+        """
+        self.bounds[name] = (mesh.aabb, mesh.sphere)
+        return self.cache.add(('mesh', name), mesh, load, lambda mesh: self.release_buffers(name, mesh))
+
+    def write(self, name:str, vertices:array, offset:int=0) -> None:
+        """Overwrite the vertices of a dynamic mesh in place.
+
+        'offset' is in bytes. Writing the whole buffer (offset 0) reallocates
+        it if the new data does not fit.
+        """
+        mesh = self[name]
+        if offset == 0 and vertices.itemsize*len(vertices) > mesh.vbo.size:
+            mesh.vbo.orphan(vertices.itemsize*len(vertices))
+        mesh.vbo.write(vertices, offset=offset)
+
+    def vao(self, name:str, program:moderngl.Program) -> moderngl.VertexArray:
+        """Get the VAO for this (mesh, program) pair. Create it on first use."""
+        key = (name, program.glo)
+        vao = self.vaos.get(key)
+        if vao is None:
+            mesh = self[name]
+            vao = self.ctx.vertex_array(
+                    program,
+                    [(mesh.vbo, mesh.fmt, *mesh.attrs)],
+                    index_buffer=mesh.ibo,
+                    index_element_size=mesh.index_element_size)
+            self.vaos[key] = vao
+        return vao
+
+    def render(self, name:str, program:moderngl.Program, **kwargs) -> None:
+        kwargs.setdefault('mode', self[name].mode)
+        self.vao(name, program).render(**kwargs)
+
+    def forget_program(self, program:moderngl.Program) -> None:
+        """Release the VAOs made for this program (e.g. before the program is reloaded)."""
+        for key in [k for k in self.vaos if k[1] == program.glo]:
+            self.vaos.pop(key).release()
+
+    def release_buffers(self, name:str, mesh:Mesh) -> None:
+        """Release the mesh buffers and every VAO that uses them (evicted or replaced)."""
+        for key in [k for k in self.vaos if k[0] == name]:
+            self.vaos.pop(key).release()
+        for buffer in mesh.buffers:
+            buffer.release()
+
+    def release(self, name:str) -> None:
+        """Release the mesh and forget the name."""
+        self.cache.remove(('mesh', name))
+        del self.bounds[name]
+
+    def release_all(self) -> None:
+        for name in self.names: self.release(name)
+
+    @property
+    def buffer_count(self) -> int:
+        """Number of live buffers (VBOs and IBOs) owned by the registry."""
+        return sum(len(mesh.buffers) for mesh in self.cache.resources('mesh'))
+
+    @property
+    def buffer_bytes(self) -> int:
+        """Total size in bytes of live buffers owned by the registry."""
+        return sum(b.size for mesh in self.cache.resources('mesh') for b in mesh.buffers)
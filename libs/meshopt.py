@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Mesh processing: weld, reorder for the vertex caches, pick the index type
+
+    vertices, indices, stats = optimize_mesh(vertices, '3f', indices)
+
+Stages, in order:
+
+1. weld(): vertices with identical attributes become one vertex.
+2. optimize_vertex_cache(): reorder triangles so each vertex is reused while
+   it is still in the GPU's post-transform cache: fewer vertex shader runs.
+   This is Tipsify (Sander, Nehab, Barczak, "Fast Triangle Reordering for
+   Vertex Locality and Reduced Overdraw", 2007): linear time, no tuning.
+3. optimize_vertex_fetch(): renumber vertices in order of first use, so the
+   vertex fetch reads the VBO front to back.
+4. index_typecode(): the smallest index type that holds every index.
+
+acmr() is the average cache miss ratio: post-transform cache misses per
+triangle for a FIFO cache. 3.0 is the worst (no reuse), about 0.5 to 0.7 is
+typical of a well ordered regular grid.
+"""
+
+from array import array
+from collections import deque
+import logging
+from libs.utils import index_typecode
+
+logger = logging.getLogger(__name__)
+
+def _stride(fmt:str) -> int:
+    """Floats per vertex for an all-float format, e.g. '3f 3f' -> 6."""
+    return sum(int(attr[:-1]) for attr in fmt.split())
+
+def weld(vertices:array, stride:int, indices=None) -> tuple:
+    """Merge vertices that are equal in every attribute. Return (vertices, indices).
+
+    No indices: the vertices are a triangle list, every three make a triangle.
+    """
+    n = len(vertices)//stride
+    if indices is None: indices = range(n)
+    welded = array('f')
+    remap = {}                                          # vertex attributes: new index
+    new_index = array('I', bytes(4*n))
+    for i in range(n):
+        key = tuple(vertices[stride*i:stride*i + stride])
+        k = remap.get(key)
+        if k is None:
+            k = len(remap)
+            remap[key] = k
+            welded.extend(key)
+        new_index[i] = k
+    return welded, array('I', [new_index[i] for i in indices])
+
+def acmr(indices, cache_size:int=32) -> float:
+    """Average cache miss ratio of a FIFO post-transform cache: misses per triangle."""
+    if not indices: return 0.0
+    fifo = deque()
+    cached = set()
+    misses = 0
+    for v in indices:
+        if v in cached: continue
+        misses += 1
+        fifo.append(v)
+        cached.add(v)
+        if len(fifo) > cache_size: cached.discard(fifo.popleft())
+    return misses/(len(indices)//3)
+
+def optimize_vertex_cache(indices, vertex_count:int, cache_size:int=32) -> array:
+    """Tipsify: reorder triangles for post-transform cache reuse. Return new indices.
+
+    Fan out from one vertex at a time: emit all of its remaining triangles,
+    then move to a vertex of those triangles that is still in the cache and
+    has few triangles left.
+    """
+    k = cache_size
+    tri_count = len(indices)//3
+    # Vertex -> triangle adjacency, compressed: triangles of v are adj[start[v]:start[v+1]]
+    live = array('I', bytes(4*vertex_count))           # Triangles not yet emitted, per vertex
+    for v in indices: live[v] += 1
+    start = array('I', bytes(4*(vertex_count + 1)))
+    for v in range(vertex_count): start[v + 1] = start[v] + live[v]
+    fill = array('I', start)
+    adj = array('I', bytes(4*len(indices)))
+    for t in range(tri_count):
+        for v in indices[3*t:3*t + 3]:
+            adj[fill[v]] = t
+            fill[v] += 1
+    cache_time = array('q', bytes(8*vertex_count))     # Time stamp when the vertex entered the cache
+    emitted = bytearray(tri_count)
+    dead_end = []                                       # Recently used vertices, to restart from
+    out = array('I')
+    f = 0 if tri_count else -1                          # Fanning vertex
+    s = k + 1                                           # Time stamp
+    cursor = 0                                          # Scan position for the next unfinished vertex
+    while f >= 0:
+        candidates = []
+        for t in adj[start[f]:start[f + 1]]:
+            if emitted[t]: continue
+            tri = indices[3*t:3*t + 3]
+            out.extend(tri)
+            emitted[t] = 1
+            for v in tri:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if s - cache_time[v] > k:              # Not in the cache: it is now
+                    cache_time[v] = s
+                    s += 1
+        # Next fanning vertex: in the cache even after its remaining triangles, oldest first
+        f, best = -1, -1
+        for v in candidates:
+            if live[v] == 0: continue
+            p = 0
+            if s - cache_time[v] + 2*live[v] <= k: p = s - cache_time[v]
+            if p > best: f, best = v, p
+        if f < 0:
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    f = v
+                    break
+        if f < 0:
+            while cursor < vertex_count and live[cursor] == 0: cursor += 1
+            if cursor < vertex_count: f = cursor
+    return out
+
+def optimize_vertex_fetch(vertices:array, stride:int, indices) -> tuple:
+    """Renumber vertices in order of first use. Unused vertices are dropped.
+
+    Return (vertices, indices).
+    """
+    remap = {}                                          # old index: new index
+    out = array('f')
+    new_indices = array('I', bytes(4*len(indices)))
+    for i,v in enumerate(indices):
+        k = remap.get(v)
+        if k is None:
+            k = len(remap)
+            remap[v] = k
+            out.extend(vertices[stride*v:stride*v + stride])
+        new_indices[i] = k
+    return out, new_indices
+
+def optimize_mesh(vertices:array, fmt:str, indices=None, cache_size:int=32) -> tuple:
+    """Weld, reorder triangles and vertices, pick the index type.
+
+    fmt: all-float buffer format, e.g. '3f' or '3f 3f'.
+    Return (vertices, indices, stats). 'indices' is an array of the smallest
+    safe type: use indices.itemsize for the IBO element size.
+    """
+    stride = _stride(fmt)
+    vertices, indices = weld(vertices, stride, indices)
+    before = acmr(indices, cache_size)
+    indices = optimize_vertex_cache(indices, len(vertices)//stride, cache_size)
+    vertices, indices = optimize_vertex_fetch(vertices, stride, indices)
+    typecode = index_typecode(len(vertices)//stride - 1)
+    indices = array(typecode, indices)
+    stats = {
+        'vertices': len(vertices)//stride,
+        'triangles': len(indices)//3,
+        'acmr_before': before,
+        'acmr_after': acmr(indices, cache_size),
+        'index_type': typecode,
+        }
+    logger.debug(f"Optimized mesh: {stats['vertices']} vertices, {stats['triangles']} triangles, "
+                 f"ACMR {before:0.3f} -> {stats['acmr_after']:0.3f}, indices '{typecode}'")
+    return vertices, indices, stats
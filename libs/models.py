@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Load OBJ and PLY models, with a binary cache
+
+The source file is parsed a line (or a record) at a time straight into
+array('f') and array('I'): the text is never read into memory all at once.
+
+The first load writes a cache file next to the source, 'NAME.EXT.meshcache':
+
+    header   struct HEADER: magic, version, optimized (0 or 1), source size
+             and mtime, vertex count, floats per vertex, index count, index itemsize,
+             AABB and bounding sphere, length of the format string
+    fmt      buffer format, e.g. b'3f 3f'
+    padding  to a multiple of 4 bytes
+    vertices interleaved float32, e.g. x,y,z,nx,ny,nz, ...
+    indices  uint8, uint16 or uint32
+
+Before the cache is written, the mesh goes through libs/meshopt.py (weld,
+vertex cache and fetch order, smallest index type), so the cost is paid once.
+
+Later loads (while the source is unchanged) memory-map the cache. Model
+vertices and indices are memoryviews of the map, so ctx.buffer(data=...)
+reads the file pages directly: no Python-level copy, no parsing.
+
+    model = load_model("models/bunny.obj")
+    upload_model(gpu.meshes, 'bunny', model)
+    model.close()
+"""
+
+from pathlib import Path
+from array import array
+import mmap
+import os
+import struct
+import time
+import logging
+from libs.meshes import compute_bounds
+from libs.meshopt import optimize_mesh
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MESH'
+VERSION = 3                                             # 3: the optimize flag is in the header
+HEADER = struct.Struct('<4sIIQQIIII10fI')               # See docstring. 10f: AABB (6), sphere (4)
+
+class Model:
+    def __init__(self, vertices, indices, fmt:str, aabb:tuple, sphere:tuple, source=None) -> None:
+        self.vertices = vertices                        # array('f') or memoryview of the cache
+        self.indices = indices                          # array('B'/'H'/'I') or memoryview of the cache
+        self.fmt = fmt                                  # e.g. '3f' or '3f 3f'
+        self.attrs = ('vert_pos', 'vert_normal')[:len(fmt.split())]
+        self.aabb = aabb                                # Model space (min, max)
+        self.sphere = sphere                            # Model space (center, radius)
+        self.source = source                            # mmap the views point into, if any
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.vertices)//sum(int(attr[:-1]) for attr in self.fmt.split())
+
+    @property
+    def triangle_count(self) -> int:
+        return len(self.indices)//3
+
+    def close(self) -> None:
+        """Release the memory map. Do this after uploading."""
+        if self.source is None: return
+        if isinstance(self.vertices, memoryview): self.vertices.release()
+        if isinstance(self.indices, memoryview): self.indices.release()
+        self.source.close()
+        self.source = None
+
+def upload_model(meshes, name:str, model:Model):
+    """Upload to a MeshRegistry. Bounds come from the model: nothing is recomputed."""
+    return meshes.upload(name, model.vertices, model.fmt, model.attrs, model.indices,
+                         bounds=(model.aabb, model.sphere))
+
+def load_model(path, cache:bool=True, optimize:bool=True) -> Model:
+    """Load an OBJ or PLY file. Use (or write) the binary cache unless cache=False.
+
+    optimize: run the mesh through optimize_mesh() after parsing.
+    ValueError: unknown format, or no faces (nothing to draw, nothing to cache).
+    """
+    path = Path(path)
+    cache_path = path.with_name(path.name + '.meshcache')
+    stat = path.stat()
+    t0 = time.perf_counter()
+    if cache:
+        model = load_cached(path, optimize)
+        if model is not None: return model
+    match path.suffix.lower():
+        case '.obj': vertices, indices, fmt = parse_obj(path)
+        case '.ply': vertices, indices, fmt = parse_ply(path)
+        case _: raise ValueError(f"Unknown model format: {path}")
+    if not indices: raise ValueError(f"No faces in {path}")
+    if optimize: vertices, indices, _ = optimize_mesh(vertices, fmt, indices)
+    aabb, sphere = compute_bounds(vertices, fmt)
+    model = Model(vertices, indices, fmt, aabb, sphere)
+    logger.debug(f"Parsed {path}: {model.vertex_count} vertices, {model.triangle_count} triangles "
+                 f"in {1000*(time.perf_counter() - t0):0.2f} ms")
+    if cache:
+        try:
+            write_cache(cache_path, stat, model, optimize)
+        except OSError as e:
+            logger.warning(f"Cannot write {cache_path}: {e}")
+    return model
+
+def load_cached(path, optimize:bool=True) -> Model:
+    """Memory-map the cache of 'path'. Return None if there is no fresh cache.
+
+    optimize: the cache must hold the optimized mesh (or the mesh as parsed).
+    """
+    path = Path(path)
+    cache_path = path.with_name(path.name + '.meshcache')
+    if not cache_path.exists(): return None
+    t0 = time.perf_counter()
+    model = read_cache(cache_path, path.stat(), optimize)
+    if model is not None:
+        logger.debug(f"Mapped {cache_path} in {1000*(time.perf_counter() - t0):0.2f} ms")
+    return model
+
+def build_cache(path, optimize:bool=True) -> None:
+    """Parse 'path' and write its cache, unless the cache is fresh.
+
+    Meant for a worker process (libs/assets.py): nothing to send back. Then
+    load_model() in the calling process maps the cache.
+    """
+    load_model(path, optimize=optimize).close()
+
+def write_cache(cache_path:Path, stat, model:Model, optimized:bool) -> None:
+    stride = len(model.vertices)//model.vertex_count
+    fmt = model.fmt.encode()
+    (lo, hi), (center, radius) = model.aabb, model.sphere
+    header = HEADER.pack(MAGIC, VERSION, int(optimized), stat.st_size, stat.st_mtime_ns,
+                         model.vertex_count, stride, len(model.indices), model.indices.itemsize,
+                         *lo, *hi, *center, radius, len(fmt))
+    tmp = cache_path.with_name(cache_path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        f.write(fmt)
+        f.write(bytes(-(len(header) + len(fmt))%4))    # Align the vertices to 4 bytes
+        f.write(model.vertices)
+        f.write(model.indices)
+    tmp.replace(cache_path)                             # Never leave a half-written cache
+    logger.debug(f"Wrote {cache_path}")
+
+def read_cache(cache_path:Path, stat, optimized:bool=True) -> Model:
+    """Memory-map a cache file. Return None if it is stale, not a cache, or the other variant."""
+    with open(cache_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size: return None     # mmap cannot map an empty file
+        ### mmap(fileno, 0): map the whole file. The map stays valid after the file is closed.
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (magic, version, flag, size, mtime_ns, nverts, stride, nidx, itemsize,
+     *bounds, fmt_len) = HEADER.unpack_from(m)
+    if (magic, version, flag, size, mtime_ns) != (MAGIC, VERSION, int(optimized), stat.st_size, stat.st_mtime_ns):
+        m.close()
+        logger.debug(f"Stale cache {cache_path}")
+        return None
+    fmt = m[HEADER.size:HEADER.size + fmt_len].decode()
+    start = HEADER.size + fmt_len
+    start += -start%4
+    end = start + 4*nverts*stride
+    view = memoryview(m)
+    vertices = view[start:end].cast('f')
+    indices = view[end:end + itemsize*nidx].cast({1: 'B', 2: 'H', 4: 'I'}[itemsize])
+    view.release()
+    aabb = (tuple(bounds[0:3]), tuple(bounds[3:6]))
+    sphere = (tuple(bounds[6:9]), bounds[9])
+    return Model(vertices, indices, fmt, aabb, sphere, source=m)
+
+def _triangulate(corners:list, indices:array) -> None:
+    """Fan: (0,1,2), (0,2,3), ... for a convex polygon."""
+    a = corners[0]
+    for b,c in zip(corners[1:-1], corners[2:]):
+        indices.extend((a, b, c))
+
+def parse_obj(path:Path) -> tuple:
+    """Positions and (if the file has any) normals. Texture coordinates are skipped.
+
+    OBJ indexes positions and normals separately: each distinct
+    (position, normal) pair in the faces becomes one vertex.
+    """
+    positions = array('f')
+    normals = array('f')
+    corners = array('I')                                # Position index per face corner
+    corner_normals = array('i')                         # Normal index per face corner, -1: none
+    indices = array('I')
+    with open(path) as f:
+        for line in f:
+            match line.split(maxsplit=1):
+                case ['v', rest]: positions.extend(map(float, rest.split()[:3]))
+                case ['vn', rest]: normals.extend(map(float, rest.split()[:3]))
+                case ['f', rest]:
+                    face = []
+                    npos, nnorm = len(positions)//3, len(normals)//3
+                    for token in rest.split():
+                        v, _, n = (token.split('/') + ['', ''])[:3]
+                        v = int(v)
+                        face.append(len(corners))
+                        corners.append(v - 1 if v > 0 else npos + v)
+                        if n:
+                            n = int(n)
+                            corner_normals.append(n - 1 if n > 0 else nnorm + n)
+                        else:
+                            corner_normals.append(-1)
+                    _triangulate(face, indices)
+                case _: pass
+    # Weld corners that share a position and a normal: one vertex each
+    has_normals = len(normals) > 0
+    stride = 6 if has_normals else 3
+    vertices = array('f')
+    remap = {}                                          # (position, normal): vertex index
+    corner_vertex = array('I', bytes(4*len(corners)))
+    for i,(v,n) in enumerate(zip(corners, corner_normals)):
+        key = (v, n) if has_normals else v
+        k = remap.get(key)
+        if k is None:
+            k = len(vertices)//stride
+            remap[key] = k
+            vertices.extend(positions[3*v:3*v + 3])
+            if has_normals:
+                vertices.extend(normals[3*n:3*n + 3] if n >= 0 else (0.0, 0.0, 0.0))
+        corner_vertex[i] = k
+    indices = array('I', [corner_vertex[i] for i in indices])
+    return vertices, indices, '3f 3f' if has_normals else '3f'
+
+PLY_TYPES = {                                           # PLY type: struct format
+    'char': 'b', 'int8': 'b', 'uchar': 'B', 'uint8': 'B',
+    'short': 'h', 'int16': 'h', 'ushort': 'H', 'uint16': 'H',
+    'int': 'i', 'int32': 'i', 'uint': 'I', 'uint32': 'I',
+    'float': 'f', 'float32': 'f', 'double': 'd', 'float64': 'd',
+    }
+
+def parse_ply(path:Path) -> tuple:
+    """ASCII or binary little endian PLY: x,y,z and (if present) nx,ny,nz.
+
+    Faces are the 'vertex_indices' (or 'vertex_index') list of the 'face' element.
+    """
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply': raise ValueError(f"Not a PLY file: {path}")
+        encoding = None
+        elements = []                                   # [name, count, [(property name, type or (count type, item type))]]
+        for line in f:
+            words = line.decode('ascii').split()
+            match words:
+                case ['format', fmt, _]: encoding = fmt
+                case ['element', name, count]: elements.append([name, int(count), []])
+                case ['property', 'list', count_type, item_type, name]:
+                    elements[-1][2].append((name, (count_type, item_type)))
+                case ['property', type_, name]: elements[-1][2].append((name, type_))
+                case ['end_header']: break
+                case _: pass
+        if encoding not in ('ascii', 'binary_little_endian'):
+            raise ValueError(f"PLY {encoding} is not supported: {path}")
+        vertices = array('f')
+        indices = array('I')
+        fmt = '3f'
+        for name,count,props in elements:
+            names = [p for p,_ in props]
+            if name == 'vertex':
+                wanted = ['x', 'y', 'z']
+                if {'nx', 'ny', 'nz'} <= set(names):
+                    wanted += ['nx', 'ny', 'nz']
+                    fmt = '3f 3f'
+                cols = [names.index(w) for w in wanted]
+                for row in _ply_rows(f, encoding, props, count):
+                    vertices.extend([row[c] for c in cols])
+            elif name == 'face':
+                col = names.index('vertex_indices' if 'vertex_indices' in names else 'vertex_index')
+                for row in _ply_rows(f, encoding, props, count):
+                    _triangulate(row[col], indices)
+            else:
+                for _ in _ply_rows(f, encoding, props, count): pass
+    return vertices, indices, fmt
+
+def _ply_rows(f, encoding:str, props:list, count:int):
+    """Yield each row of one element as a list of values (a list property is a list)."""
+    if encoding == 'ascii':
+        for _ in range(count):
+            words = f.readline().split()
+            row, i = [], 0
+            for _,type_ in props:
+                if isinstance(type_, tuple):
+                    n = int(words[i])
+                    row.append([int(w) for w in words[i + 1:i + 1 + n]])
+                    i += 1 + n
+                else:
+                    row.append(float(words[i]) if PLY_TYPES[type_] in 'fd' else int(words[i]))
+                    i += 1
+            yield row
+        return
+    if not any(isinstance(t, tuple) for _,t in props):
+        # Fixed-size rows: one struct for the whole row
+        s = struct.Struct('<' + ''.join(PLY_TYPES[t] for _,t in props))
+        for _ in range(count): yield s.unpack(f.read(s.size))
+        return
+    for _ in range(count):
+        row = []
+        for _,type_ in props:
+            if isinstance(type_, tuple):
+                c = struct.Struct('<' + PLY_TYPES[type_[0]])
+                (n,) = c.unpack(f.read(c.size))
+                item = struct.Struct(f"<{n}{PLY_TYPES[type_[1]]}")
+                row.append(list(item.unpack(f.read(item.size))))
+            else:
+                s = struct.Struct('<' + PLY_TYPES[type_])
+                row.append(s.unpack(f.read(s.size))[0])
+        yield row
@@ -6,6 +6,8 @@
 import pygame
 
 class OsWindow:
+    headless = False
+
     def __init__(self, gpu_render:bool=True) -> None:
         if gpu_render:
             flags = pygame.RESIZABLE | pygame.OPENGL | pygame.DOUBLEBUF
@@ -23,3 +25,20 @@ class OsWindow:
         """Use events to track window size."""
         self._size = (event.x, event.y)
 
+class HeadlessWindow:
+    """Stand-in for OsWindow when there is no display (CI, servers, benchmarks).
+
+    GPU renders into an offscreen framebuffer of this size instead of a window.
+    """
+    headless = True
+
+    def __init__(self, size:tuple=(16*50,9*50)) -> None:
+        self._size = tuple(size)
+
+    @property
+    def size(self) -> tuple:
+        return self._size
+
+    def WINDOWRESIZED(self, event) -> None:
+        self._size = (event.x, event.y)
+
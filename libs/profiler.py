@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Per-stage frame profiler
+
+Wrap each stage of the frame in a 'with' block:
+
+    profiler.begin_frame()
+    with profiler.stage('events'): ...
+    with profiler.stage('player', gpu=True): ...     # Also time it on the GPU
+    profiler.end_frame()
+
+CPU wall time (and GPU time from moderngl timer queries) goes into fixed-size
+ring buffers: one slot per frame, preallocated, so recording does not allocate.
+GPU results are read 'latency' frames late so reading them does not stall.
+
+Counters (e.g. meshes drawn and culled) go in the same kind of ring buffer:
+
+    profiler.count('meshes_drawn', n)
+
+When the profiler is disabled, stage() returns a shared do-nothing context
+manager and count() does nothing.
+
+Timer queries cannot nest: only time non-overlapping stages on the GPU.
+Queries are freed with the context (moderngl 5 Query has no release()).
+"""
+
+import time
+import json
+from array import array
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _NullStage:
+    def __enter__(self) -> None: pass
+    def __exit__(self, *exc) -> None: pass
+
+NULL_STAGE = _NullStage()
+
+class _Stage:
+    """One profiled stage: ring buffers of start time, CPU duration and GPU duration."""
+    def __init__(self, profiler:'Profiler', name:str, gpu:bool) -> None:
+        self.profiler = profiler
+        self.name = name
+        n = profiler.frames
+        self.start = array('d', bytes(8*n))             # Seconds since profiler creation
+        self.cpu = array('d', bytes(8*n))               # Seconds
+        self.gpu = array('d', bytes(8*n))               # Seconds
+        self.queries = []
+        if gpu and profiler.ctx is not None:
+            self.queries = [profiler.ctx.query(time=True) for _ in range(profiler.latency)]
+        self.query = None
+        self.t0 = 0.0
+
+    def __enter__(self) -> None:
+        p = self.profiler
+        if self.queries:
+            # Reuse the query from 'latency' frames ago: read its result first
+            self.query = self.queries[p.frame%p.latency]
+            if p.frame >= p.latency:
+                self.gpu[(p.frame - p.latency)%p.frames] = self.query.elapsed*1e-9
+            self.query.__enter__()
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        t1 = time.perf_counter()
+        p = self.profiler
+        i = p.frame%p.frames
+        self.start[i] = self.t0 - p.epoch
+        self.cpu[i] += t1 - self.t0                     # A stage may run more than once per frame
+        if self.query is not None:
+            self.query.__exit__(*exc)
+            self.query = None
+
+    def clear(self, i:int) -> None:
+        self.start[i] = 0.0
+        self.cpu[i] = 0.0
+
+class Profiler:
+    def __init__(self, ctx=None, frames:int=120, latency:int=3, enabled:bool=False) -> None:
+        self.ctx = ctx                                  # moderngl.Context for GPU timer queries
+        self.frames = frames                            # Ring buffer length
+        self.latency = latency                          # Frames to wait before reading a query
+        self.enabled = enabled
+        self.epoch = time.perf_counter()
+        self.frame = 0                                  # Frames recorded while enabled
+        self.stages = {}                                # name: _Stage
+        self.counters = {}                              # name: array('d'), one slot per frame
+        self.frame_stage = None
+
+    def stage(self, name:str, gpu:bool=False):
+        """Context manager that times one stage of the current frame."""
+        if not self.enabled: return NULL_STAGE
+        s = self.stages.get(name)
+        if s is None:
+            s = _Stage(self, name, gpu)
+            self.stages[name] = s
+        return s
+
+    def count(self, name:str, n:float=1) -> None:
+        """Add n to a per-frame counter."""
+        if not self.enabled: return
+        c = self.counters.get(name)
+        if c is None:
+            c = array('d', bytes(8*self.frames))
+            self.counters[name] = c
+        c[self.frame%self.frames] += n
+
+    def begin_frame(self) -> None:
+        if not self.enabled: return
+        i = self.frame%self.frames
+        for s in self.stages.values(): s.clear(i)
+        for c in self.counters.values(): c[i] = 0.0
+        self.frame_stage = self.stage('frame')
+        self.frame_stage.__enter__()
+
+    def end_frame(self) -> None:
+        if self.frame_stage is None: return
+        self.frame_stage.__exit__(None, None, None)
+        self.frame_stage = None
+        self.frame += 1
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        logger.info(f"Profiler {'on' if self.enabled else 'off'}")
+
+    def averages(self) -> dict:
+        """Rolling mean per stage over the ring buffer: {name: (cpu_ms, gpu_ms)}.
+
+        GPU times lag 'latency' frames behind. 0 means no GPU timing.
+        """
+        n = min(self.frame, self.frames)
+        if n == 0: return {}
+        m = max(min(self.frame - self.latency, self.frames), 1)
+        return {name: (1000*sum(s.cpu)/n, 1000*sum(s.gpu)/m if s.queries else 0.0)
+                for name,s in self.stages.items()}
+
+    def counter_averages(self) -> dict:
+        """Rolling mean per counter over the ring buffer: {name: per frame}."""
+        n = min(self.frame, self.frames)
+        if n == 0: return {}
+        return {name: sum(c)/n for name,c in self.counters.items()}
+
+    def export_chrome_trace(self, path:str) -> None:
+        """Write the ring buffer as Chrome trace JSON (chrome://tracing, ui.perfetto.dev).
+
+        CPU stages are on thread 0. GPU times are on thread 1, drawn at the
+        CPU start of the stage (the GPU runs later, but the duration is right).
+        Counters are drawn as tracks, one value per frame.
+        """
+        events = []
+        n = min(self.frame, self.frames)
+        for k in range(self.frame - n, self.frame):
+            i = k%self.frames
+            for name,s in self.stages.items():
+                if s.cpu[i] == 0.0: continue
+                ts = 1e6*s.start[i]
+                events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                               'ts': ts, 'dur': 1e6*s.cpu[i], 'args': {'frame': k}})
+                if s.queries and s.gpu[i] > 0.0:
+                    events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': 1,
+                                   'ts': ts, 'dur': 1e6*s.gpu[i], 'args': {'frame': k}})
+            frame = self.stages.get('frame')
+            ts = 1e6*frame.start[i] if frame else 0.0
+            for name,c in self.counters.items():
+                events.append({'name': name, 'ph': 'C', 'pid': 0, 'ts': ts, 'args': {name: c[i]}})
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': 0, 'args': {'name': 'CPU'}})
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': 1, 'args': {'name': 'GPU'}})
+        with open(path, 'w') as f: json.dump({'traceEvents': events}, f)
+        logger.info(f"Wrote {len(events)} trace events to {path}")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Render queue: collect draw items, sort them by GL state, draw them in one pass
+
+render_* methods submit() what they want drawn instead of drawing it:
+
+    queue.submit(program, vao, mode=moderngl.TRIANGLE_STRIP,
+                 uniforms={'xlat_mat': xlat_mat.buffer},
+                 textures=((0, atlas.texture),), blend=moderngl.DEFAULT_BLENDING)
+
+flush() sorts the opaque items (blend=BLEND_OFF) by state key (layer,
+program, textures) so items that share state are drawn back to back, then
+draws them through a StateShadow: a copy of the GL state the queue last set.
+A blend change, a texture bind or a uniform write that would set the value
+already current is skipped. The sort is stable: items with the same state
+keep their order.
+
+Blended items are drawn after the opaque ones of their layer, in the order
+they were submitted: the painter's order is the caller's, not the order the
+shaders happened to compile in.
+
+Layers are drawn in increasing order, whatever their state: e.g. the HUD
+(layer 2) always goes on top of the debug overlay (layer 1) and the scene
+(layer 0), which goes on top of the world tiles (layer -1).
+
+moderngl binds the program inside every vao.render(), so program switches
+cannot be skipped, only made rarer by the sort. They are still counted.
+
+Per frame counts go to the profiler (see Profiler.count()): draw_calls,
+program_changes, texture_binds, blend_changes, uniform_writes and
+state_skips (GL calls the shadow avoided).
+
+The shadow is only right if everything draws through the queue. After
+setting GL state directly, call shadow.reset(). Before releasing a program
+or a texture, call forget_program() or forget_texture(): GL may give its
+name to a new one, which the shadow would take for bound already.
+"""
+
+import moderngl
+import logging
+
+logger = logging.getLogger(__name__)
+
+BLEND_OFF = None                                        # DrawItem.blend: blending disabled
+
+class DrawItem:
+    __slots__ = ('layer', 'program', 'vao', 'mode', 'uniforms', 'textures', 'blend',
+                 'vertices', 'first', 'instances', 'order')
+
+    def __init__(self, layer:int, program:moderngl.Program, vao:moderngl.VertexArray,
+                 mode:int, uniforms:dict, textures:tuple, blend:tuple,
+                 vertices:int, first:int, instances:int, order:int) -> None:
+        self.layer = layer
+        self.program = program
+        self.vao = vao
+        self.mode = mode
+        self.uniforms = uniforms                        # name: value (tuple/float/int) or bytes
+        self.textures = textures                        # ((unit, Texture), ...)
+        self.blend = blend                              # Blend function, or BLEND_OFF
+        self.vertices = vertices                        # -1: all
+        self.first = first
+        self.instances = instances
+        self.order = order                              # Submission index
+
+    @property
+    def key(self) -> tuple:
+        """Opaque: state, so draws that share it are batched. Blended: submission order."""
+        if self.blend is BLEND_OFF:
+            return (self.layer, 0, self.program.glo, tuple(t.glo for _,t in self.textures))
+        return (self.layer, 1, self.order)
+
+class StateShadow:
+    """The GL state last set through the queue. Set only what differs."""
+    def __init__(self, ctx:moderngl.Context) -> None:
+        self.ctx = ctx
+        self.counts = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything: the next item sets all of its state."""
+        self.program = None                             # glo of the last program drawn with
+        self.blend = False                              # Unknown: not BLEND_OFF nor a function
+        self.textures = {}                              # unit: Texture.glo
+        self.uniforms = {}                              # (program glo, name): value
+
+    def forget_program(self, program:moderngl.Program) -> None:
+        """The program is being released: its glo may be reused by a new program."""
+        glo = program.glo
+        for key in [k for k in self.uniforms if k[0] == glo]: del self.uniforms[key]
+        if self.program == glo: self.program = None
+
+    def forget_texture(self, texture:moderngl.Texture) -> None:
+        """The texture is being released: its glo may be reused by a new texture."""
+        glo = texture.glo
+        for unit in [u for u,t in self.textures.items() if t == glo]: del self.textures[unit]
+
+    def _count(self, name:str) -> None:
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def set_blend(self, blend:tuple) -> None:
+        if blend == self.blend:
+            self._count('state_skips')
+            return
+        if blend is BLEND_OFF:
+            self.ctx.disable(moderngl.BLEND)
+        else:
+            if self.blend is BLEND_OFF or self.blend is False: self.ctx.enable(moderngl.BLEND)
+            self.ctx.blend_func = blend
+        self.blend = blend
+        self._count('blend_changes')
+
+    def bind_texture(self, unit:int, texture:moderngl.Texture) -> None:
+        if self.textures.get(unit) == texture.glo:
+            self._count('state_skips')
+            return
+        texture.use(unit)
+        self.textures[unit] = texture.glo
+        self._count('texture_binds')
+
+    def set_uniform(self, program:moderngl.Program, name:str, value) -> None:
+        key = (program.glo, name)
+        if self.uniforms.get(key) == value:
+            self._count('state_skips')
+            return
+        if isinstance(value, bytes):
+            program[name].write(value)
+        else:
+            program[name].value = value
+        self.uniforms[key] = value
+        self._count('uniform_writes')
+
+    def draw(self, item:DrawItem) -> None:
+        if item.program.glo != self.program:
+            self.program = item.program.glo
+            self._count('program_changes')
+        self.set_blend(item.blend)
+        for unit,texture in item.textures: self.bind_texture(unit, texture)
+        for name,value in item.uniforms.items(): self.set_uniform(item.program, name, value)
+        item.vao.render(mode=item.mode, vertices=item.vertices, first=item.first, instances=item.instances)
+        self._count('draw_calls')
+
+class RenderQueue:
+    COUNTERS = ('draw_calls', 'program_changes', 'texture_binds', 'blend_changes',
+                'uniform_writes', 'state_skips')
+
+    def __init__(self, ctx:moderngl.Context) -> None:
+        self.ctx = ctx
+        self.items = []
+        self.shadow = StateShadow(ctx)
+        self.counts = {}                                # Counts of the last flush()
+        self.submitted = 0                              # Items ever submitted: the next one's order
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def submit(self, program:moderngl.Program, vao:moderngl.VertexArray,
+               mode:int=moderngl.TRIANGLES, uniforms:dict=None, textures:tuple=(),
+               blend:tuple=moderngl.PREMULTIPLIED_ALPHA, layer:int=0,
+               vertices:int=-1, first:int=0, instances:int=-1) -> None:
+        """Queue one draw. Uniform buffers (memoryview, array) are copied now."""
+        if uniforms:
+            uniforms = {name: bytes(v) if not isinstance(v, (tuple, int, float, bytes)) else v
+                        for name,v in uniforms.items()}
+        self.items.append(DrawItem(layer, program, vao, mode, uniforms or {}, textures, blend,
+                                   vertices, first, instances, self.submitted))
+        self.submitted += 1
+
+    def flush(self, profiler=None, below:int=None) -> None:
+        """Sort and draw everything submitted since the last flush. Send the counts to 'profiler'.
+
+        below: only draw the layers below this one, keep the rest for the next
+        flush (e.g. switch framebuffers between the scene and the HUD).
+        """
+        self.items.sort(key=lambda item: item.key)
+        n = len(self.items)
+        if below is not None:
+            n = next((i for i,item in enumerate(self.items) if item.layer >= below), n)
+        shadow = self.shadow
+        shadow.counts = dict.fromkeys(self.COUNTERS, 0)
+        for item in self.items[:n]: shadow.draw(item)
+        del self.items[:n]
+        self.counts = shadow.counts
+        if profiler:
+            for name,n in self.counts.items(): profiler.count(name, n)
+
+    def forget_program(self, program:moderngl.Program) -> None:
+        self.shadow.forget_program(program)
+
+    def forget_texture(self, texture:moderngl.Texture) -> None:
+        self.shadow.forget_texture(texture)
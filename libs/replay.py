@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Input logs: record a session's input, play it back for a reproducible run
+
+    python game.py --record session.input       # Play, then quit
+    python game.py --replay session.input       # The same session, as fast as possible
+    python -m benchmarks.bench_frames --replay session.input
+
+UI.handle_events() hands the input it gets to an InputRecorder: the events
+the game reacts to and the mouse position (zooming is about the mouse).
+Each record is stamped with the simulation step (Game.steps, the number of
+fixed-timestep updates so far) it came before. The last record marks the
+step the session ended at.
+
+On playback, an InputReplay stands in for pygame's event queue: before step
+N, UI.handle_events() gets the records stamped N, in the order they were
+recorded, each event with the mouse position it was recorded under (idle,
+the steps do not advance: several zooms at different places share a step).
+The game runs exactly one
+fixed-timestep update per frame (Game.replay_frame()), with no wall clock,
+so the simulation goes through the same states as the recorded session, at
+any frame rate. Time spent idle in the session is not replayed.
+
+The log is binary, little-endian:
+
+    header   struct HEADER: magic, version, window width and height, timestep
+    records  struct RECORD: step, kind, two ints (e.g. key and mod, x and y)
+
+Keys with effects outside the game (quit, fullscreen, export trace, capture)
+are not recorded: a replay should not write files or quit the benchmark.
+"""
+
+from pathlib import Path
+import struct
+import pygame
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'INPT'
+VERSION = 1
+HEADER = struct.Struct('<4sIHHd')                       # See docstring
+RECORD = struct.Struct('<IBii')                         # step, kind, a, b: 13 bytes
+
+MOUSE = 0                                               # Record kind of the mouse position x,y
+# Record kind: event type. Event type numbers are SDL's: they are not written to the log
+EVENT_TYPES = {
+    1: pygame.KEYDOWN,                                  # key, mod
+    2: pygame.KEYUP,                                    # key, mod
+    3: pygame.MOUSEWHEEL,                               # x,y
+    4: pygame.WINDOWRESIZED,                            # width, height
+    5: pygame.WINDOWFOCUSLOST,                          # Stops the player
+    }
+KINDS = {event_type: kind for kind,event_type in EVENT_TYPES.items()}
+
+SKIP_KEYS = {pygame.K_q, pygame.K_F11, pygame.K_F4, pygame.K_F6}   # Quit, fullscreen, trace, capture
+
+class InputRecorder:
+    def __init__(self, path, size:tuple, dt:float) -> None:
+        self.path = Path(path)
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, *size, dt))
+        self.mouse = None                               # Last position written
+        self.records = 0
+
+    def record(self, step:int, events:list, mouse:tuple) -> None:
+        """Write the mouse position if it moved, then the events the game reacts to."""
+        if mouse != self.mouse:
+            self.mouse = mouse
+            self.write(step, MOUSE, *mouse)
+        for event in events:
+            match event.type:
+                case pygame.KEYDOWN | pygame.KEYUP if event.key in SKIP_KEYS: pass
+                case pygame.KEYDOWN | pygame.KEYUP: self.write(step, KINDS[event.type], event.key, event.mod)
+                case pygame.MOUSEWHEEL | pygame.WINDOWRESIZED: self.write(step, KINDS[event.type], event.x, event.y)
+                case pygame.WINDOWFOCUSLOST: self.write(step, KINDS[event.type], 0, 0)
+                case _: pass
+
+    def write(self, step:int, kind:int, a:int, b:int) -> None:
+        self.file.write(RECORD.pack(step, kind, a, b))
+        self.records += 1
+
+    def close(self, step:int) -> None:
+        """End the log at 'step': the session's last update. A mouse record marks it."""
+        if self.file.closed: return
+        self.write(step, MOUSE, *(self.mouse or (0,0)))
+        self.file.close()
+        logger.info(f"Recorded {self.records} input records to {self.path}")
+
+class InputReplay:
+    def __init__(self, path) -> None:
+        data = Path(path).read_bytes()
+        if len(data) < HEADER.size: raise ValueError(f"{path}: not an input log")
+        magic, version, w, h, self.dt = HEADER.unpack_from(data)
+        if magic != MAGIC: raise ValueError(f"{path}: not an input log")
+        if version != VERSION: raise ValueError(f"{path}: input log version {version}, expected {VERSION}")
+        self.size = (w, h)                              # Window size when the recording started
+        body = memoryview(data)[HEADER.size:]
+        if len(body)%RECORD.size:
+            logger.warning(f"{path}: truncated, the last record is dropped")
+            body = body[:len(body) - len(body)%RECORD.size]
+        self.records = list(RECORD.iter_unpack(body))
+        self.next = 0                                   # Index of the next record to play
+        self.mouse = (0,0)
+        self.steps = self.records[-1][0] if self.records else 0     # Updates the session ran
+
+    def events(self, step:int) -> list:
+        """Events to handle before update 'step': [(mouse position, pygame event), ...].
+
+        In recorded order. 'mouse' is left at the last position.
+        """
+        events = []
+        records = self.records
+        while self.next < len(records) and records[self.next][0] <= step:
+            _, kind, a, b = records[self.next]
+            self.next += 1
+            if kind == MOUSE:
+                self.mouse = (a, b)
+                continue
+            match event_type := EVENT_TYPES.get(kind):
+                case pygame.KEYDOWN | pygame.KEYUP: event = pygame.event.Event(event_type, key=a, mod=b)
+                case pygame.MOUSEWHEEL: event = pygame.event.Event(event_type, x=a, y=b, flipped=False)
+                case pygame.WINDOWRESIZED: event = pygame.event.Event(event_type, x=a, y=b)
+                case pygame.WINDOWFOCUSLOST: event = pygame.event.Event(event_type)
+                case _:
+                    logger.warning(f"Unknown input record kind {kind} at step {step}")
+                    continue
+            events.append((self.mouse, event))
+        return events
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Resource cache: GPU residency within a memory budget
+
+    cache = ResourceCache(budget=256*2**20)
+    cache.add(('texture', 'bricks'), texture, load=lambda: make_bricks(ctx))
+    texture = cache.get(('texture', 'bricks'))  # Every use: counts a hit or a miss
+    ...
+    cache.end_frame()                           # After the frame is drawn: evict
+
+The cache holds textures, buffers and meshes (anything with .buffers) and
+tracks the bytes each one takes on the GPU. When the total is over
+'budget', end_frame() releases the least recently used resources until it
+fits. An evicted resource stays known: the next get() calls its load() to
+make it again, and that is a miss. Resources added without load() cannot
+come back, so they are never evicted (dynamic meshes, placeholders).
+
+Eviction only happens in end_frame(): draws submitted to the render queue
+refer to VAOs and textures until the queue is flushed. Resources used in
+the current frame are not evicted either: if the frame needs more than the
+budget, the cache stays over budget rather than reload the same resources
+every frame (a warning is logged once).
+"""
+
+from collections import OrderedDict
+import moderngl
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIPMAP_FILTERS = (moderngl.NEAREST_MIPMAP_NEAREST, moderngl.LINEAR_MIPMAP_NEAREST,
+                  moderngl.NEAREST_MIPMAP_LINEAR, moderngl.LINEAR_MIPMAP_LINEAR)
+
+def nbytes(resource) -> int:
+    """GPU bytes of a Buffer, a Texture (mipmaps add a third) or a Mesh (its buffers)."""
+    if isinstance(resource, moderngl.Buffer): return resource.size
+    if hasattr(resource, 'buffers'): return sum(b.size for b in resource.buffers)
+    ### dtype: 'f1' (normalized bytes), 'f2', 'f4', 'u1', 'i4', ...
+    n = resource.width*resource.height*resource.components*int(resource.dtype[1:])
+    n *= getattr(resource, 'depth', 1) or 1             # Texture3D; 2D depth textures report 0 here
+    if resource.filter[0] in MIPMAP_FILTERS: n = n*4//3
+    return n
+
+def release(resource) -> None:
+    """Release a Buffer, a Texture, or every buffer of a Mesh."""
+    if hasattr(resource, 'buffers'):
+        for buffer in resource.buffers: buffer.release()
+    else:
+        resource.release()
+
+class Entry:
+    __slots__ = ('resource', 'nbytes', 'load', 'release', 'frame')
+
+    def __init__(self, resource, load, release) -> None:
+        self.resource = resource                        # None: evicted
+        self.nbytes = nbytes(resource)
+        self.load = load                                # () -> resource. None: never evicted
+        self.release = release                          # (resource) -> None
+        self.frame = 0                                  # Last frame it was used
+
+class ResourceCache:
+    def __init__(self, budget:int=None, on_release=None) -> None:
+        self.budget = budget                            # Bytes. None: no limit
+        self.on_release = on_release                    # (resource) -> None, before any release
+        self.entries = OrderedDict()                    # key: Entry, least recently used first
+        self.used = 0                                   # Bytes of resident resources
+        self.frame = 0
+        self.hits = 0                                   # get() of a resident resource
+        self.misses = 0                                 # get() of an evicted resource: reloaded
+        self.evictions = 0
+        self.warned = False                             # Logged that one frame needs more than the budget
+
+    def __contains__(self, key) -> bool:
+        """Known, resident or not."""
+        return key in self.entries
+
+    def resident(self, key) -> bool:
+        return self.entries[key].resource is not None
+
+    def keys(self, kind:str=None) -> list:
+        """Keys of every known resource. kind: only keys (kind, name)."""
+        return [k for k in self.entries if kind is None or (isinstance(k, tuple) and k[0] == kind)]
+
+    def resources(self, kind:str=None) -> list:
+        """Resident resources. kind: as for keys()."""
+        return [self.entries[k].resource for k in self.keys(kind) if self.entries[k].resource is not None]
+
+    def add(self, key, resource, load=None, release=release):
+        """Own 'resource'. Replaces (and releases) a resource with the same key. Return it.
+
+        load: () -> a new resource, called by get() after an eviction. None: never evicted.
+        release: called with the resource when it is evicted or removed.
+        """
+        if key in self.entries: self.remove(key)
+        entry = Entry(resource, load, release)
+        entry.frame = self.frame
+        self.entries[key] = entry
+        self.used += entry.nbytes
+        return resource
+
+    def get(self, key):
+        """The resource. Loads it again if it was evicted. Marks it used this frame."""
+        entry = self.entries[key]
+        if entry.resource is None:
+            self.misses += 1
+            entry.resource = entry.load()
+            entry.nbytes = nbytes(entry.resource)
+            self.used += entry.nbytes
+            logger.debug(f"Reloaded {key} ({entry.nbytes} bytes)")
+        else:
+            self.hits += 1
+        entry.frame = self.frame
+        self.entries.move_to_end(key)
+        return entry.resource
+
+    def evict(self, key) -> None:
+        """Release the resource now, keep the key: the next get() reloads it."""
+        entry = self.entries[key]
+        if entry.resource is None or entry.load is None: return
+        self._release(entry)
+        entry.resource = None
+        self.used -= entry.nbytes
+        self.evictions += 1
+
+    def remove(self, key) -> None:
+        """Release the resource and forget the key."""
+        entry = self.entries.pop(key)
+        if entry.resource is not None:
+            self._release(entry)
+            self.used -= entry.nbytes
+
+    def _release(self, entry:Entry) -> None:
+        if self.on_release: self.on_release(entry.resource)
+        entry.release(entry.resource)
+
+    def end_frame(self) -> None:
+        """The frame is drawn: evict least recently used resources until under budget."""
+        if self.budget is not None and self.used > self.budget:
+            for key,entry in list(self.entries.items()):
+                if self.used <= self.budget: break
+                if entry.frame == self.frame: break     # LRU order: the rest were used this frame too
+                self.evict(key)
+            if self.used > self.budget and not self.warned:
+                logger.warning(f"Over the GPU memory budget: {self.used} of {self.budget} bytes "
+                               f"resident (used this frame, or cannot be reloaded)")
+                self.warned = True
+        self.frame += 1
+
+    def release_all(self) -> None:
+        for key in list(self.entries): self.remove(key)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Dynamic resolution: render the scene at a fraction of the window size
+
+    target = ScaledTarget(ctx, window_size)
+    resolution = DynamicResolution(target_ms=1000/60)
+
+    target.use(resolution.scale)                # Scene pass: offscreen, scaled viewport
+    resolution.begin(); draw scene; resolution.end()
+    fbo.use()                                   # Upscale to the window, then the HUD
+    present(); resolution.end_frame()
+
+ScaledTarget is a color texture the size of the window. A smaller scale
+renders into the bottom left of it (the viewport), so changing the scale
+allocates nothing. The upscale pass stretches that region over the window
+with linear filtering. It is only reallocated when the window is resized.
+At full scale, draw straight into the window instead: the upscale pass is
+a fullscreen texture read, not free.
+
+DynamicResolution times the scene pass on the GPU (timer queries, read
+'latency' frames late so reading does not stall), or the whole frame on the
+CPU when the frame waits for the GPU anyway, and steers the scale so
+the scene takes about 'headroom' of the frame budget. Fragment cost goes
+with the pixel count, scale squared, so the correction is a square root.
+The scale only moves every 'cooldown' frames: the next measurement must see
+the last change before the next one is made.
+"""
+
+import math
+import time
+import moderngl
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ScaledTarget:
+    def __init__(self, ctx:moderngl.Context, size:tuple) -> None:
+        self.ctx = ctx
+        self.texture = None
+        self.fbo = None
+        self.vao = None                                 # Empty: the upscale pass makes its vertices
+        self.resize(size)
+
+    @property
+    def size(self) -> tuple:
+        return self.texture.size
+
+    def resize(self, size:tuple) -> None:
+        """Window resized: reallocate at the new size."""
+        self.release_fbo()
+        self.texture = self.ctx.texture(size, 4)
+        self.texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        self.fbo = self.ctx.framebuffer(color_attachments=[self.texture])
+        self.viewport = (0, 0, *size)
+
+    def use(self, scale:float) -> tuple:
+        """Draw into the scaled viewport from now on. Return the viewport."""
+        w,h = self.size
+        self.viewport = (0, 0, max(1, round(scale*w)), max(1, round(scale*h)))
+        self.fbo.viewport = self.viewport
+        self.fbo.use()
+        return self.viewport
+
+    @property
+    def uv_scale(self) -> tuple:
+        """Fraction of the texture the viewport covers."""
+        w,h = self.size
+        return (self.viewport[2]/w, self.viewport[3]/h)
+
+    def upscale_vao(self, program:moderngl.Program) -> moderngl.VertexArray:
+        if self.vao is None or self.vao.program.glo != program.glo:
+            if self.vao is not None: self.vao.release()
+            self.vao = self.ctx.vertex_array(program, [])
+        return self.vao
+
+    def forget_program(self, program:moderngl.Program) -> None:
+        if self.vao is not None and self.vao.program.glo == program.glo:
+            self.vao.release()
+            self.vao = None
+
+    def release_fbo(self) -> None:
+        if self.fbo is not None: self.fbo.release()
+        if self.texture is not None: self.texture.release()
+
+    def release(self) -> None:
+        self.release_fbo()
+        if self.vao is not None: self.vao.release()
+
+class DynamicResolution:
+    def __init__(self, ctx:moderngl.Context, target_ms:float=1000/60,
+                 min_scale:float=0.5, max_scale:float=1.0, enabled:bool=True,
+                 gpu_timer:bool=True, headroom:float=0.8, latency:int=3, cooldown:int=8) -> None:
+        self.target_ms = target_ms                      # Frame budget for the scene pass
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.enabled = enabled                          # False: the scale stays where it is
+        self.headroom = headroom                        # Aim for this fraction of the budget
+        self.latency = latency                          # Frames to wait before reading a query
+        self.cooldown = cooldown                        # Frames between scale changes
+        self.scale = max_scale
+        self.gpu_ms = 0.0                               # Smoothed scene pass time
+        self.frame = 0
+        self.last_change = 0
+        # gpu_timer=False: time from begin() to end_frame() on the CPU instead. Only
+        # meaningful if the frame waits for the GPU (headless: present() calls
+        # ctx.finish()). Software rasterizers (llvmpipe) draw when the commands
+        # are flushed, so timer queries around the draw calls measure nothing.
+        self.queries = [ctx.query(time=True) for _ in range(latency)] if gpu_timer else []
+        self.query = None
+        self.t0 = None
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        if not self.enabled: self.scale = self.max_scale
+        logger.info(f"Dynamic resolution {'on' if self.enabled else 'off'}")
+
+    def begin(self) -> None:
+        """Start timing the scene pass. Reads the result from 'latency' frames ago."""
+        if not self.queries:
+            self.t0 = time.perf_counter()
+            return
+        self.query = self.queries[self.frame%self.latency]
+        if self.frame >= self.latency: self.measure(self.query.elapsed*1e-6)
+        self.query.__enter__()
+
+    def end(self) -> None:
+        """Stop timing the scene pass."""
+        if self.query is None: return
+        self.query.__exit__(None, None, None)
+        self.query = None
+
+    def end_frame(self) -> None:
+        """The frame is presented. CPU timer: this is the end of the measurement."""
+        if self.t0 is not None:
+            self.measure(1000*(time.perf_counter() - self.t0))
+            self.t0 = None
+        self.frame += 1
+
+    def measure(self, gpu_ms:float) -> None:
+        """Feed one scene pass time. Adjust the scale if it is far from the goal."""
+        self.gpu_ms = gpu_ms if self.gpu_ms == 0.0 else 0.8*self.gpu_ms + 0.2*gpu_ms
+        if not self.enabled or self.frame - self.last_change < self.cooldown: return
+        goal = self.headroom*self.target_ms
+        # Deadband: no change while within -30%..+15% of the goal
+        if 0.7*goal < self.gpu_ms < 1.15*goal: return
+        scale = self.scale*math.sqrt(goal/max(self.gpu_ms, 1e-3))
+        scale = max(self.min_scale, min(self.max_scale, scale, 1.25*self.scale), 0.75*self.scale)
+        scale = round(scale*64)/64                      # Fewer distinct sizes
+        scale = max(self.min_scale, min(self.max_scale, scale))
+        if scale != self.scale:
+            logger.debug(f"Resolution scale {self.scale:0.3f} -> {scale:0.3f} (scene {self.gpu_ms:0.2f} ms)")
+            self.scale = scale
+            self.last_change = self.frame
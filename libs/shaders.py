@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Shader registry: discover, lazily compile and hot reload shader programs
+
+Programs are discovered by naming convention: 'shaders/NAME.vert' and
+'shaders/NAME.frag' make the program 'shader_NAME'. A program is compiled the
+first time it is used, so startup only pays for what the first frame draws.
+
+Call poll() once per game loop: every 'interval' seconds it checks the source
+mtimes and recompiles edited programs in place. If the new source does not
+compile, the error is logged and the old program stays in use.
+"""
+
+from pathlib import Path
+import time
+import moderngl
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ShaderRegistry:
+    def __init__(self, ctx:moderngl.Context, directory:str="shaders",
+                 on_compile=None, on_replace=None, interval:float=0.5) -> None:
+        self.ctx = ctx
+        self.directory = Path(directory)
+        self.on_compile = on_compile                    # on_compile(program): called after every compile
+        self.on_replace = on_replace                    # on_replace(old_program): before a hot reload releases it
+        self.interval = interval                        # Seconds between mtime checks
+        self.sources = {}                               # key: (vert path, frag path)
+        self.programs = {}                              # key: Program
+        self.mtimes = {}                                # key: mtimes of the sources when compiled
+        self.texts = {}                                 # path: (mtime, text) read ahead by prefetch()
+        self.last_poll = time.perf_counter()
+        self.discover()
+
+    def discover(self) -> None:
+        """Find every NAME.vert that has a matching NAME.frag."""
+        for vert in sorted(self.directory.glob("*.vert")):
+            frag = vert.with_suffix(".frag")
+            if frag.exists():
+                self.sources[f"shader_{vert.stem}"] = (vert, frag)
+        logger.debug(f"Found {len(self.sources)} shader programs in {self.directory}/")
+
+    def __contains__(self, key:str) -> bool:
+        return key in self.sources
+
+    def __getitem__(self, key:str) -> moderngl.Program:
+        program = self.programs.get(key)
+        if program is None:
+            program = self.compile(key)
+            self.programs[key] = program
+        return program
+
+    def values(self) -> list:
+        """Programs compiled so far."""
+        return list(self.programs.values())
+
+    def _mtimes(self, key:str) -> tuple:
+        return tuple(path.stat().st_mtime for path in self.sources[key])
+
+    def compile(self, key:str) -> moderngl.Program:
+        vert_path, frag_path = self.sources[key]
+        self.mtimes[key] = self._mtimes(key)
+        vert, frag = self.read(vert_path), self.read(frag_path)
+        t0 = time.perf_counter()
+        program = self.ctx.program(vertex_shader=vert, fragment_shader=frag)
+        logger.debug(f"Compiled {key} in {1000*(time.perf_counter() - t0):0.2f} ms")
+        if self.on_compile: self.on_compile(program)
+        return program
+
+    def read(self, path:Path) -> str:
+        """Source text. Use the prefetched text if the file has not changed since."""
+        mtime, text = self.texts.pop(path, (None, None))
+        if text is not None and mtime == path.stat().st_mtime: return text
+        ### f.read(): Read until EOF. See https://docs.python.org/3/library/io.html#io.BufferedIOBase.read
+        with open(path) as f: return f.read()
+
+    def prefetch(self, executor) -> None:
+        """Read every source on 'executor' threads, so compile() does not wait on the disk."""
+        def read_ahead(path:Path) -> None:
+            mtime = path.stat().st_mtime
+            with open(path) as f: self.texts[path] = (mtime, f.read())
+        for paths in self.sources.values():
+            for path in paths: executor.submit(read_ahead, path)
+
+    def poll(self) -> bool:
+        """Recompile programs whose sources changed. Checks at most every 'interval' seconds.
+
+        Return True if any program was reloaded.
+        """
+        now = time.perf_counter()
+        if now - self.last_poll < self.interval: return False
+        self.last_poll = now
+        reloaded = False
+        for key in list(self.programs):
+            try:
+                if self._mtimes(key) == self.mtimes[key]: continue
+                program = self.compile(key)
+            except (OSError, moderngl.Error) as e:
+                logger.error(f"Reload {key} failed, keeping the old program: {e}")
+                continue
+            old = self.programs[key]
+            if self.on_replace: self.on_replace(old)
+            old.release()
+            self.programs[key] = program
+            logger.info(f"Reloaded {key}")
+            reloaded = True
+        return reloaded
+
+    def release(self) -> None:
+        for program in self.programs.values(): program.release()
+        self.programs.clear()
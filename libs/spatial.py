@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Spatial index: a uniform grid over the world-space AABBs of entities
+
+The world is cut into square cells of side 'cell_size'. Each cell holds the
+ids of the entities whose AABB (pos to pos + size) overlaps it. An entity that
+spans several cells is in each of them.
+
+Each entity's cell range (i0,j0,i1,j1) is stored in the entity store's 'cell'
+component, so it moves with the row on swap-back removal. sync() recomputes
+every range at once and only re-buckets entities whose range changed: most
+entities stay in the same cell from one update to the next.
+
+Queries return entity ids:
+
+    query_point(x, y)       picking, e.g. under the mouse
+    query_rect(l, b, r, t)  e.g. the visible region, Camera.visible_rect
+    nearest(x, y, k)        k nearest by distance to the AABB
+"""
+
+from array import array
+import math
+import heapq
+import logging
+from libs.math.batch import np                          # None if numpy is not installed
+
+logger = logging.getLogger(__name__)
+
+EMPTY = (0,0,-1,-1)                                     # Cell range of an entity not in the grid
+
+class SpatialGrid:
+    def __init__(self, store, cell_size:float=4.0) -> None:
+        self.store = store                              # EntityStore
+        self.cell_size = cell_size                      # World units
+        self.cells = {}                                 # (i,j): set of ids
+
+    def __len__(self) -> int:
+        """Occupied cells."""
+        return len(self.cells)
+
+    def cell_of(self, x:float, y:float) -> tuple:
+        return (math.floor(x/self.cell_size), math.floor(y/self.cell_size))
+
+    def _ranges(self, n:int) -> list:
+        """Cell range of rows 0..n-1 as [(row, i0,j0,i1,j1), ...] for the rows that changed."""
+        store, s = self.store, self.cell_size
+        if np is not None:
+            pos = np.frombuffer(store.pos, np.float32, 2*n).reshape(n,2)
+            size = np.frombuffer(store.size, np.float32, 2*n).reshape(n,2)
+            old = np.frombuffer(store.cell, np.int32, 4*n).reshape(n,4)
+            new = np.empty((n,4), np.int32)
+            new[:,:2] = np.floor(pos/s)
+            new[:,2:] = np.floor((pos + size)/s)
+            rows = np.flatnonzero((new != old).any(axis=1))
+            return [(row, *key) for row,key in zip(rows.tolist(), new[rows].tolist())]
+        pos, size, cell, f = store.pos, store.size, store.cell, math.floor
+        changed = []
+        for row in range(n):
+            x, y = pos[2*row], pos[2*row + 1]
+            key = (f(x/s), f(y/s), f((x + size[2*row])/s), f((y + size[2*row + 1])/s))
+            if key != tuple(cell[4*row:4*row + 4]): changed.append((row, *key))
+        return changed
+
+    def _cells(self, key:tuple):
+        i0,j0,i1,j1 = key
+        return ((i,j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+
+    def _unlink(self, id:int, key:tuple) -> None:
+        for c in self._cells(key):
+            ids = self.cells.get(c)
+            if ids is None: continue
+            ids.discard(id)
+            if not ids: del self.cells[c]
+
+    def sync(self) -> int:
+        """Re-bucket entities that moved to other cells (and new ones). Return how many."""
+        store = self.store
+        changed = self._ranges(store.count)
+        cell, ids = store.cell, store.ids
+        for row,*key in changed:
+            id = ids[row]
+            self._unlink(id, tuple(cell[4*row:4*row + 4]))
+            for c in self._cells(key): self.cells.setdefault(c, set()).add(id)
+            cell[4*row:4*row + 4] = array('i', key)
+        return len(changed)
+
+    def remove(self, id:int) -> None:
+        """Take an entity out of the grid. Call before EntityStore.remove(id)."""
+        row = self.store.rows[id]
+        cell = self.store.cell
+        self._unlink(id, tuple(cell[4*row:4*row + 4]))
+        cell[4*row:4*row + 4] = array('i', EMPTY)
+
+    def aabb(self, id:int) -> tuple:
+        """(l,b,r,t) of one entity."""
+        x,y = self.store.get(id, 'pos')
+        w,h = self.store.get(id, 'size')
+        return (x, y, x + w, y + h)
+
+    def query_rect(self, l:float, b:float, r:float, t:float, exact:bool=True) -> list:
+        """Ids of entities overlapping the rect.
+
+        exact=False: every entity in the overlapped cells (a superset, no
+        per-entity test). Good enough to decide what to draw.
+        """
+        i0,j0 = self.cell_of(l, b)
+        i1,j1 = self.cell_of(r, t)
+        if (i1 - i0 + 1)*(j1 - j0 + 1) > len(self.cells):
+            # Rect covers more cells than are occupied: walk the occupied cells instead
+            buckets = [ids for (i,j),ids in self.cells.items() if i0 <= i <= i1 and j0 <= j <= j1]
+        else:
+            buckets = [ids for c in self._cells((i0,j0,i1,j1)) if (ids := self.cells.get(c))]
+        found = set().union(*buckets)
+        if not exact: return list(found)
+        result = []
+        for id in found:
+            x0,y0,x1,y1 = self.aabb(id)
+            if x0 <= r and l <= x1 and y0 <= t and b <= y1: result.append(id)
+        return result
+
+    def query_point(self, x:float, y:float) -> list:
+        """Ids of entities whose AABB contains the point."""
+        result = []
+        for id in self.cells.get(self.cell_of(x, y), ()):
+            x0,y0,x1,y1 = self.aabb(id)
+            if x0 <= x <= x1 and y0 <= y <= y1: result.append(id)
+        return result
+
+    def distance(self, id:int, x:float, y:float) -> float:
+        """Distance from the point to the entity's AABB (0 if inside)."""
+        x0,y0,x1,y1 = self.aabb(id)
+        dx = max(x0 - x, 0.0, x - x1)
+        dy = max(y0 - y, 0.0, y - y1)
+        return math.hypot(dx, dy)
+
+    def nearest(self, x:float, y:float, k:int=1) -> list:
+        """Ids of the k entities nearest the point, nearest first.
+
+        Search rings of cells around the point's cell. Anything outside ring r
+        is at least r*cell_size away, so stop once the k-th best is closer.
+        """
+        if not self.cells: return []
+        ci,cj = self.cell_of(x, y)
+        reach = max(max(abs(i - ci), abs(j - cj)) for i,j in self.cells)  # Last ring with entities
+        found = {}                                      # id: distance
+        for r in range(reach + 1):
+            for c in self._ring(ci, cj, r):
+                for id in self.cells.get(c, ()):
+                    if id not in found: found[id] = self.distance(id, x, y)
+            best = heapq.nsmallest(k, found.items(), key=lambda item: item[1])
+            if len(best) == k and best[-1][1] <= r*self.cell_size: break
+        return [id for id,_ in best]
+
+    def _ring(self, ci:int, cj:int, r:int):
+        """Cells at Chebyshev distance exactly r from (ci,cj)."""
+        if r == 0:
+            yield (ci,cj)
+            return
+        for i in range(ci - r, ci + r + 1):
+            yield (i, cj - r)
+            yield (i, cj + r)
+        for j in range(cj - r + 1, cj + r):
+            yield (ci - r, j)
+            yield (ci + r, j)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Instanced sprites: draw thousands of quads with one draw call
+
+Every sprite shares one unit-quad VBO. Per-instance data lives in three
+dynamic instance buffers, one per attribute (struct of arrays):
+
+    pos   '2f/i'  bottom left in world space
+    size  '2f/i'  w,h in world space
+    color '4f/i'  r,g,b,a
+
+Write contiguous arrays of N instances with write(), then render(program)
+(or submit() to a RenderQueue) draws all of them with a single vao.render(instances=N). The VAO is rebuilt
+when the program changes (e.g. after a shader hot reload).
+"""
+
+import moderngl
+from array import array
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SpriteBatch:
+    ATTRIBUTES = (('pos', 2), ('size', 2), ('color', 4))   # name, floats per instance
+
+    def __init__(self, ctx:moderngl.Context, capacity:int=1024) -> None:
+        self.ctx = ctx
+        self.capacity = capacity                        # Instances the buffers can hold
+        self.count = 0                                  # Instances to draw
+        self.quad = ctx.buffer(data=array('f', [0,1, 1,1, 0,0, 1,0]))
+        self.buffers = {name: ctx.buffer(reserve=4*n*capacity, dynamic=True)
+                        for name,n in self.ATTRIBUTES}
+        self.program = None                             # Program the VAO was built for
+        self.vao = None
+
+    def make_vao(self, program:moderngl.Program) -> moderngl.VertexArray:
+        return self.ctx.vertex_array(program, [
+            (self.quad, '2f', 'vert_pos'),
+            (self.buffers['pos'], '2f/i', 'inst_pos'),
+            (self.buffers['size'], '2f/i', 'inst_size'),
+            (self.buffers['color'], '4f/i', 'inst_color'),
+            ])
+
+    def reserve(self, capacity:int) -> None:
+        """Grow the instance buffers to hold at least 'capacity' instances. Contents are lost."""
+        if capacity <= self.capacity: return
+        while self.capacity < capacity: self.capacity *= 2
+        for name,n in self.ATTRIBUTES: self.buffers[name].orphan(4*n*self.capacity)
+        logger.debug(f"Sprite capacity: {self.capacity}")
+
+    def write(self, count:int, pos:array=None, size:array=None, color:array=None) -> None:
+        """Upload per-instance data for 'count' sprites. Skip an attribute to keep what the buffer has.
+
+        Each array holds the attribute of every instance back to back, e.g.
+        pos = x0,y0, x1,y1, ... Arrays are written as-is: no repacking.
+        """
+        self.reserve(count)
+        for name,data in (('pos', pos), ('size', size), ('color', color)):
+            if data is not None: self.buffers[name].write(data)
+        self.count = count
+
+    def vao_for(self, program:moderngl.Program) -> moderngl.VertexArray:
+        """The VAO for this program. Rebuilt when the program changes."""
+        if program is not self.program:
+            if self.vao: self.vao.release()
+            self.vao = self.make_vao(program)
+            self.program = program
+        return self.vao
+
+    def render(self, program:moderngl.Program) -> None:
+        if self.count:
+            self.vao_for(program).render(mode=moderngl.TRIANGLE_STRIP, instances=self.count)
+
+    def submit(self, queue, program:moderngl.Program, **kwargs) -> None:
+        """Queue the draw on a RenderQueue instead (see libs/render_queue.py)."""
+        if self.count:
+            queue.submit(program, self.vao_for(program), mode=moderngl.TRIANGLE_STRIP,
+                         instances=self.count, **kwargs)
+
+    @property
+    def buffer_count(self) -> int:
+        return len((self.quad, *self.buffers.values()))
+
+    @property
+    def buffer_bytes(self) -> int:
+        return self.quad.size + sum(b.size for b in self.buffers.values())
+
+    def release(self) -> None:
+        if self.vao: self.vao.release()
+        self.quad.release()
+        for b in self.buffers.values(): b.release()
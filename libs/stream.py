@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""Stream buffer: one large GPU buffer for geometry that changes every frame
+
+Instead of a new ctx.buffer per frame, per-frame data (debug lines,
+particles, ...) is appended to one pre-allocated buffer:
+
+    stream.begin_frame()
+    first = stream.alloc(vertices, stride=8)            # Returns a vertex index
+    queue.submit(program, stream.vao(program, '2f', ('vert_pos',)),
+                 first=first, vertices=len(vertices)//2)
+
+alloc() only ever writes past everything written since the last orphan, so
+it never overwrites data the GPU may still be reading: the CPU does not wait
+for the GPU. When a frame starts and the space left is less than the last
+frame used, the buffer is orphaned: the driver hands over fresh storage and
+frees the old storage when the GPU is done with it. Same buffer object, so
+VAOs made on it stay valid.
+
+If one frame outgrows the buffer, it is orphaned at twice the size and the
+frame's allocations so far are written again at the same offsets (draws are
+deferred to the render queue flush, so they have not been drawn yet). Do not
+modify data passed to alloc() before the frame is drawn.
+
+The number of buffer objects never changes, however much geometry is pushed.
+"""
+
+import moderngl
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StreamBuffer:
+    def __init__(self, ctx:moderngl.Context, size:int=4*2**20) -> None:
+        self.ctx = ctx
+        self.buffer = ctx.buffer(reserve=size, dynamic=True)
+        self.cursor = 0                                 # Bytes written since the last orphan
+        self.frame_start = 0                            # Cursor at begin_frame()
+        self.last_frame_bytes = 0
+        self.allocations = []                           # (offset, data) this frame, to rewrite on growth
+        self.vaos = {}                                  # (program.glo, fmt, attrs): VertexArray
+        self.orphans = 0                                # Since creation
+
+    @property
+    def size(self) -> int:
+        return self.buffer.size
+
+    @property
+    def frame_bytes(self) -> int:
+        """Bytes allocated so far this frame."""
+        return self.cursor - self.frame_start
+
+    def begin_frame(self) -> None:
+        self.last_frame_bytes = self.frame_bytes
+        if self.size - self.cursor < self.last_frame_bytes:
+            self.buffer.orphan(self.size)
+            self.orphans += 1
+            self.cursor = 0
+        self.frame_start = self.cursor
+        self.allocations.clear()
+
+    def alloc(self, data, stride:int) -> int:
+        """Append 'data' (bytes, array, memoryview). Return its index in units of 'stride' bytes.
+
+        Use the index as 'first' when drawing, e.g. the first vertex.
+        """
+        nbytes = memoryview(data).nbytes
+        offset = -(-self.cursor//stride)*stride         # Round up to a multiple of stride
+        if offset + nbytes > self.size: self._grow(offset + nbytes)
+        self.buffer.write(data, offset=offset)
+        self.allocations.append((offset, data))
+        self.cursor = offset + nbytes
+        return offset//stride
+
+    def _grow(self, needed:int) -> None:
+        size = self.size
+        while size < needed: size *= 2
+        logger.debug(f"Stream buffer: {self.size} -> {size} bytes")
+        self.buffer.orphan(size)
+        self.orphans += 1
+        for offset,data in self.allocations: self.buffer.write(data, offset=offset)
+
+    def vao(self, program:moderngl.Program, fmt:str, attrs:tuple) -> moderngl.VertexArray:
+        """VAO reading this buffer with this format. Created on first use."""
+        key = (program.glo, fmt, attrs)
+        vao = self.vaos.get(key)
+        if vao is None:
+            vao = self.ctx.vertex_array(program, [(self.buffer, fmt, *attrs)])
+            self.vaos[key] = vao
+        return vao
+
+    def forget_program(self, program:moderngl.Program) -> None:
+        for key in [k for k in self.vaos if k[0] == program.glo]:
+            self.vaos.pop(key).release()
+
+    def release(self) -> None:
+        for vao in self.vaos.values(): vao.release()
+        self.vaos.clear()
+        self.buffer.release()
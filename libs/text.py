@@ -5,19 +5,73 @@
 
 import pygame
 from pygame import Surface, Color, Rect
+import moderngl
+from array import array
+import logging
+from libs.meshes import MeshRegistry
+
+logger = logging.getLogger(__name__)
+
+_fonts = {}                                             # (name, size, bold, italic): Font
+
+def get_font(name:str, size:int, bold:bool=False, italic:bool=False) -> pygame.font.Font:
+    """Get a font from the process-wide font cache.
+
+    SysFont does a system font lookup every call. Do it once per (name, size, style).
+    """
+    key = (name, size, bold, italic)
+    font = _fonts.get(key)
+    if font is None:
+        ### SysFont(name, size, bold=False, italic=False) -> Font
+        font = pygame.font.SysFont(name, size, bold, italic)
+        _fonts[key] = font
+    return font
 
 class Text:
-    def __init__(self, size:int) -> None:
-        self.font = pygame.font.SysFont("RobotoMono", size)
-        self.msg = ""
+    def __init__(self, size:int, name:str="RobotoMono", bold:bool=False, italic:bool=False) -> None:
+        self.font = get_font(name, size, bold, italic)
+        self.lines = []                                 # Text of each line
+        self.line_surfs = []                            # Rendered surface of each line, None if stale
+        self.color = None                               # Color of the rendered surfaces
         self.pos = (0,0)
 
+    @property
+    def msg(self) -> str:
+        return "\n".join(self.lines)
+
+    @msg.setter
+    def msg(self, msg:str) -> None:
+        lines = msg.split("\n")
+        for row,line in enumerate(lines): self.set_line(row, line)
+        del self.lines[len(lines):]
+        del self.line_surfs[len(lines):]
+
+    def set_line(self, row:int, line:str) -> None:
+        """Set the text of one line. The line is re-rendered only if its text changed."""
+        while len(self.lines) <= row:
+            self.lines.append("")
+            self.line_surfs.append(None)
+        if self.lines[row] != line:
+            self.lines[row] = line
+            self.line_surfs[row] = None
+
+    def truncate(self, n:int) -> None:
+        """Keep only the first n lines."""
+        del self.lines[n:]
+        del self.line_surfs[n:]
+
     def render(self, surf:Surface, color:Color) -> tuple:
+        if color != self.color:
+            self.color = Color(color)
+            self.line_surfs = [None]*len(self.lines)
         w = 0
-        h = self.line_height*len(self.msg_lines)
-        for i,line in enumerate(self.msg_lines):
-            ### render(text, antialias, color, background=None) -> Surface
-            text_surf = self.font.render(line, True, color)
+        h = self.line_height*len(self.lines)
+        for i,line in enumerate(self.lines):
+            text_surf = self.line_surfs[i]
+            if text_surf is None:
+                ### render(text, antialias, color, background=None) -> Surface
+                text_surf = self.font.render(line, True, color)
+                self.line_surfs[i] = text_surf
             w = max(w, text_surf.get_width())
             ### blit(source, dest, area=None, special_flags=0) -> Rect
             surf.blit(text_surf, (self.pos[0], self.pos[1] + i*self.line_height))
@@ -25,11 +79,140 @@ class Text:
 
     @property
     def msg_lines(self) -> list:
-        return self.msg.split("\n")
+        return self.lines
 
     @property
     def line_height(self) -> int:
         ### get_linesize() -> int
         return self.font.get_linesize()
 
+class GlyphAtlas:
+    """Rasterize glyphs once into a GPU texture.
+
+    Glyphs are packed in rows (shelves) on a pygame Surface. Printable ASCII is
+    rasterized up front. Any other character is rasterized the first time it is
+    drawn and only its region of the texture is uploaded.
+    """
+    def __init__(self, ctx:moderngl.Context, font:pygame.font.Font, size:tuple=(512,512)) -> None:
+        self.ctx = ctx
+        self.font = font
+        self.surf = Surface(size, pygame.SRCALPHA)
+        self.glyphs = {}                                # char: (u0,v0,u1,v1,w,h)
+        self.cursor = [0,0]                             # Next free x,y in the atlas
+        self.line_height = font.get_linesize()
+        self.texture = ctx.texture(size, 4)             # 4 color channels
+        self.texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        for c in range(32,127): self.add(chr(c), upload=False)
+        ### tobytes(Surface, format) -> bytes
+        self.texture.write(pygame.image.tobytes(self.surf, 'RGBA'))
+
+    def add(self, char:str, upload:bool=True) -> tuple:
+        """Rasterize one glyph into the next free slot of the atlas."""
+        ### render(text, antialias, color, background=None) -> Surface
+        glyph = self.font.render(char, True, Color(255,255,255))
+        w,h = glyph.get_size()
+        W,H = self.surf.get_size()
+        x,y = self.cursor
+        if x + w > W:                                   # Start a new shelf
+            x,y = 0, y + self.line_height
+        if y + h > H:
+            logger.warning(f"Glyph atlas is full. Cannot add {char!r}.")
+            return self.glyphs.get('?')
+        self.surf.blit(glyph, (x,y))
+        self.cursor = [x + w, y]
+        self.glyphs[char] = (x/W, y/H, (x+w)/W, (y+h)/H, w, h)
+        if upload:
+            ### write(data, viewport=(x, y, w, h)): only upload this glyph
+            data = pygame.image.tobytes(self.surf.subsurface(Rect(x,y,w,h)), 'RGBA')
+            self.texture.write(data, viewport=(x,y,w,h))
+        return self.glyphs[char]
+
+    def glyph(self, char:str) -> tuple:
+        g = self.glyphs.get(char)
+        return g if g is not None else self.add(char)
+
+    def release(self) -> None:
+        self.texture.release()
+
+class AtlasText:
+    """Draw multi-line text as one batched quad buffer, using a GlyphAtlas.
+
+    Each line owns a fixed range of character slots (six vertices per slot)
+    in a dynamic mesh. When the text changes, only the span of each line that
+    changed is re-uploaded. Vertex positions are in pixels: the shader maps
+    them to window coordinates, so a window resize needs no re-upload.
+    """
+    FLOATS_PER_SLOT = 6*4                               # Six vertices: '2f 2f'
+
+    def __init__(self, meshes:MeshRegistry, name:str, atlas:GlyphAtlas,
+                 max_lines:int=16, line_capacity:int=128) -> None:
+        self.meshes = meshes
+        self.name = name
+        self.atlas = atlas
+        self.max_lines = max_lines
+        self.line_capacity = line_capacity
+        self.lines = []                                 # Text of each line last uploaded
+        self.pos = (0,0)                                # Top left of the text in pixels
+        self.size = (0,0)                               # w,h of the text in pixels
+        self.uploads = 0                                # Characters uploaded since creation
+        n = max_lines*line_capacity*self.FLOATS_PER_SLOT
+        meshes.upload(name, array('f', bytes(4*n)), '2f 2f', ('vert_pos', 'tex_coord'),
+                      mode=moderngl.TRIANGLES, dynamic=True)
+
+    def quads(self, line:str, row:int) -> array:
+        """Vertex data for the quads of one line of text."""
+        data = array('f')
+        x = self.pos[0]
+        y = self.pos[1] + row*self.atlas.line_height
+        for char in line:
+            u0,v0,u1,v1,w,h = self.atlas.glyph(char)
+            data.extend((
+                # vert      tex
+                x,   y,     u0, v0,
+                x+w, y,     u1, v0,
+                x,   y+h,   u0, v1,
+                x,   y+h,   u0, v1,
+                x+w, y,     u1, v0,
+                x+w, y+h,   u1, v1,
+                ))
+            x += w
+        return data
+
+    def update(self, lines:list, pos:tuple=(0,0)) -> None:
+        """Re-upload only the characters that changed since the last update.
+
+        Moving the text re-uploads all of it.
+        """
+        moved = tuple(pos) != self.pos
+        self.pos = tuple(pos)
+        lines = [line[:self.line_capacity] for line in lines[:self.max_lines]]
+        old_lines = self.lines + ['']*(len(lines) - len(self.lines))
+        for row,line in enumerate(lines + ['']*(len(old_lines) - len(lines))):
+            old = old_lines[row]
+            if line == old and not moved: continue
+            # Find the span of characters that differ
+            first = 0
+            while not moved and first < min(len(line), len(old)) and line[first] == old[first]: first += 1
+            quads = self.quads(line, row)
+            # Clear slots no longer used by a shorter line
+            stop = max(len(line), len(old))
+            data = quads[first*self.FLOATS_PER_SLOT:] + array('f', bytes(4*(stop - len(line))*self.FLOATS_PER_SLOT))
+            offset = (row*self.line_capacity + first)*self.FLOATS_PER_SLOT
+            self.meshes.write(self.name, data, offset=4*offset)
+            self.uploads += stop - first
+        self.lines = lines
+        w = max((sum(self.atlas.glyph(c)[4] for c in line) for line in lines), default=0)
+        self.size = (w, self.atlas.line_height*len(lines))
+
+    def render(self, program:moderngl.Program) -> None:
+        self.atlas.texture.use(0)
+        program['tex'] = 0
+        self.meshes.render(self.name, program, vertices=6*self.line_capacity*len(self.lines))
 
+    def submit(self, queue, program:moderngl.Program, uniforms:dict=None, **kwargs) -> None:
+        """Queue the draw on a RenderQueue instead (see libs/render_queue.py)."""
+        queue.submit(program, self.meshes.vao(self.name, program),
+                     mode=self.meshes[self.name].mode,
+                     uniforms={'tex': 0, **(uniforms or {})},
+                     textures=((0, self.atlas.texture),),
+                     vertices=6*self.line_capacity*len(self.lines), **kwargs)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+"""World tiles: the static world in square tiles, streamed around the view, with levels of detail
+
+    tiles = TileWorld(ctx, assets)
+    tiles.submit(queue, program, camera)        # Every frame: draw what is baked, request the rest
+    ...
+    tiles.end_frame()                           # After the queue is flushed: evict
+
+The world is a procedural heightmap (bake_tile()). A tile at level L is a
+square of side tile_size*2**L, baked into its own static vertex buffer as a
+grid of 'cells' x 'cells' quads. Every tile has the same grid, so they all
+share one index buffer, and a tile costs the same whatever its level.
+
+The level is picked from the camera scale so that about 'tiles_per_view'
+tiles span the view height: zoomed far out, a few big, coarse tiles cover
+the view; zoomed in, a few small, fine ones. The number of triangles drawn
+stays about the same at any zoom between 2**min_level and 2**max_level.
+
+Tiles are baked in the asset loader's worker processes (libs/assets.py,
+the noise is pure Python: it would hold the GIL on a thread) and uploaded
+within its per-frame budget. At most 'max_pending' tiles are in flight, the
+visible ones nearest the view center first, then a ring of one tile around
+the view. Until a tile is uploaded, its nearest baked ancestor is drawn
+instead (coarser, not blank).
+
+Baked tiles stay in a ResourceCache (libs/residency.py) of 'budget' bytes:
+the least recently drawn are released when it is full. Zooming back out
+finds the coarser tiles still there.
+"""
+
+from array import array
+import math
+import moderngl
+import logging
+from libs.residency import ResourceCache
+from libs.render_queue import BLEND_OFF
+
+logger = logging.getLogger(__name__)
+
+VERTEX_FMT = '2f 3f'                                    # vert_pos (world), vert_color
+
+# Height (-1..1): color
+PALETTE = (
+    (-0.10, (0.05, 0.15, 0.40)),                        # Deep water
+    ( 0.00, (0.10, 0.30, 0.60)),                        # Shallow water
+    ( 0.04, (0.76, 0.70, 0.50)),                        # Sand
+    ( 0.25, (0.20, 0.50, 0.20)),                        # Grass
+    ( 0.45, (0.45, 0.40, 0.35)),                        # Rock
+    ( 2.00, (0.90, 0.90, 0.95)),                        # Snow
+    )
+
+def lattice(i:int, j:int, seed:int) -> float:
+    """Pseudo-random value in [-1,1) at lattice point i,j."""
+    h = (i*374761393 + j*668265263 + seed*2246822519) & 0xffffffff
+    h = ((h ^ (h >> 13))*1274126177) & 0xffffffff
+    return (h ^ (h >> 16))/2**31 - 1.0
+
+def bake_tile(key:tuple, tile_size:float, cells:int, seed:int, max_wavelength:float) -> bytes:
+    """Vertices of tile key = (level, i, j): (cells + 1)**2 vertices, VERTEX_FMT, row by row.
+
+    The height is value noise summed over octaves from 'max_wavelength'
+    down to two cells of this tile: coarser levels leave out the finest
+    octaves, which they could not show anyway. The color comes from the
+    height, shaded by the three finest octaves, so every level shows detail.
+    Runs in a worker process: module level, bytes out.
+    """
+    level, ti, tj = key
+    size = tile_size*2.0**level
+    cell = size/cells
+    n = cells + 1
+    # Grid coordinates from integers: the edge shared by two tiles is the same floats in both
+    xs = [(ti*cells + k)*cell for k in range(n)]
+    ys = [(tj*cells + k)*cell for k in range(n)]
+    heights = [0.0]*(n*n)
+    octaves = []
+    wavelength, amplitude = max_wavelength, 1.0
+    while wavelength >= 2*cell:
+        octaves.append((wavelength, amplitude))
+        wavelength, amplitude = wavelength/2, amplitude/2
+    detail = [0.0]*(n*n)
+    fine = octaves[-3:]
+    for octave,(wavelength, amplitude) in enumerate(octaves):
+        # Lattice cell and smoothstep weight of each column and row
+        cols = [(math.floor(x/wavelength), x/wavelength - math.floor(x/wavelength)) for x in xs]
+        rows = [(math.floor(y/wavelength), y/wavelength - math.floor(y/wavelength)) for y in ys]
+        cols = [(i, t*t*(3 - 2*t)) for i,t in cols]
+        rows = [(j, t*t*(3 - 2*t)) for j,t in rows]
+        values = {}
+        for i in {i for i,_ in cols} | {i + 1 for i,_ in cols}:
+            for j in {j for j,_ in rows} | {j + 1 for j,_ in rows}:
+                values[i,j] = lattice(i, j, 64*seed + octave)
+        add_detail = (wavelength, amplitude) in fine
+        v = 0
+        for j,ty in rows:
+            for i,tx in cols:
+                a = values[i,j] + tx*(values[i + 1,j] - values[i,j])
+                b = values[i,j + 1] + tx*(values[i + 1,j + 1] - values[i,j + 1])
+                h = amplitude*(a + ty*(b - a))
+                heights[v] += h
+                if add_detail: detail[v] += h
+                v += 1
+    detail_scale = 1/sum(amplitude for _,amplitude in fine) if fine else 0.0
+    vertices = []
+    v = 0
+    for y in ys:
+        for x in xs:
+            h = heights[v]/2                            # Amplitudes sum to less than 2
+            for top,(r,g,b) in PALETTE:
+                if h < top: break
+            shade = 0.8 + 0.2*detail[v]*detail_scale
+            vertices.extend((x, y, shade*r, shade*g, shade*b))
+            v += 1
+    return array('f', vertices).tobytes()
+
+def grid_indices(cells:int) -> array:
+    """Two triangles per cell of a (cells + 1)**2 vertex grid, row by row."""
+    n = cells + 1
+    indices = array('H' if n*n <= 2**16 else 'I')
+    for j in range(cells):
+        for i in range(cells):
+            v = j*n + i
+            indices.extend((v, v + 1, v + n, v + n, v + 1, v + n + 1))
+    return indices
+
+class Tile:
+    __slots__ = ('vbo', 'vao')
+
+    def __init__(self, vbo:moderngl.Buffer) -> None:
+        self.vbo = vbo
+        self.vao = None                                 # Made on first draw
+
+    @property
+    def buffers(self) -> list:
+        """For ResourceCache: the bytes of this tile. The index buffer is shared."""
+        return [self.vbo]
+
+    def release(self) -> None:
+        if self.vao is not None: self.vao.release()
+        self.vbo.release()
+
+class TileWorld:
+    def __init__(self, ctx:moderngl.Context, assets, tile_size:float=1.0, cells:int=32,
+                 tiles_per_view:float=3.0, min_level:int=-12, max_level:int=12,
+                 budget:int=32*2**20, max_pending:int=8, seed:int=18, feature_size:float=64.0) -> None:
+        self.ctx = ctx
+        self.assets = assets                            # AssetLoader: bakes and uploads tiles
+        self.tile_size = tile_size                      # World units, level 0
+        self.cells = cells                              # Grid cells per tile side
+        self.tiles_per_view = tiles_per_view            # Tiles across the view height, at most
+        self.min_level = min_level
+        self.max_level = max_level
+        self.max_pending = max_pending                  # Tiles baking or uploading at once
+        self.seed = seed
+        self.max_wavelength = feature_size               # World units: the biggest islands
+        self.ibo = ctx.buffer(grid_indices(cells))
+        self.index_element_size = self.ibo.size//(6*cells*cells)
+        self.cache = ResourceCache(budget)              # (level, i, j): Tile
+        self.pending = set()                            # Keys baking or uploading
+        self.level = 0                                  # Level of the last submit()
+        self.drawn = 0                                  # Tiles drawn by the last submit()
+        self.missing = 0                                # Visible tiles not baked yet at the last submit()
+        self.baked = 0                                  # Tiles baked since creation
+
+    @property
+    def triangles(self) -> int:
+        """Triangles drawn by the last submit()."""
+        return 2*self.cells*self.cells*self.drawn
+
+    @property
+    def buffer_count(self) -> int:
+        """Baked tile VBOs and the shared index buffer."""
+        return sum(len(tile.buffers) for tile in self.cache.resources()) + len((self.ibo,))
+
+    @property
+    def buffer_bytes(self) -> int:
+        return self.cache.used + self.ibo.size
+
+    def tile_side(self, level:int) -> float:
+        return self.tile_size*2.0**level
+
+    def level_for(self, scale:float) -> int:
+        """Coarsest level at which 'tiles_per_view' tiles cover the view height (2/scale world units)."""
+        level = math.ceil(math.log2(2/scale/(self.tiles_per_view*self.tile_size)))
+        return max(self.min_level, min(self.max_level, level))
+
+    def keys(self, level:int, rect:tuple, margin:int=0) -> list:
+        """Tiles at 'level' overlapping rect (l, b, r, t), plus 'margin' more on each side.
+
+        Nearest to the center of the rect first.
+        """
+        l,b,r,t = rect
+        side = self.tile_side(level)
+        i0, i1 = math.floor(l/side) - margin, math.floor(r/side) + margin
+        j0, j1 = math.floor(b/side) - margin, math.floor(t/side) + margin
+        ci, cj = (l + r)/2/side - 0.5, (b + t)/2/side - 0.5
+        keys = [(level, i, j) for j in range(j0, j1 + 1) for i in range(i0, i1 + 1)]
+        keys.sort(key=lambda k: (k[1] - ci)**2 + (k[2] - cj)**2)
+        return keys
+
+    def resident(self, key:tuple) -> bool:
+        return key in self.cache and self.cache.resident(key)
+
+    def fallback(self, key:tuple):
+        """The nearest resident ancestor of a missing tile, or None."""
+        level, i, j = key
+        for up in range(1, self.max_level - level + 1):
+            parent = (level + up, i >> up, j >> up)     # >>: floor, negative indices too
+            if self.resident(parent): return parent
+        return None
+
+    def request(self, key:tuple) -> None:
+        """Bake a tile in a worker process, upload it in AssetLoader.update()."""
+        self.pending.add(key)
+        future = self.assets.request(lambda data: self._upload(key, data), self.assets.in_process,
+                                     bake_tile, key, self.tile_size, self.cells, self.seed, self.max_wavelength)
+        future.add_done_callback(lambda f: self.pending.discard(key))
+
+    def load(self, key:tuple) -> Tile:
+        """Bake and upload on this thread. ResourceCache.get() after an eviction: not used by submit()."""
+        return Tile(self.ctx.buffer(bake_tile(key, self.tile_size, self.cells, self.seed, self.max_wavelength)))
+
+    def _upload(self, key:tuple, data:bytes):
+        """Generator for AssetLoader.update(): one step, a tile is small."""
+        tile = Tile(self.ctx.buffer(data))
+        self.cache.add(key, tile, lambda: self.load(key), Tile.release)
+        self.baked += 1
+        yield len(data)
+        return tile
+
+    def vao(self, tile:Tile, program:moderngl.Program) -> moderngl.VertexArray:
+        if tile.vao is None or tile.vao.program.glo != program.glo:
+            if tile.vao is not None: tile.vao.release()
+            tile.vao = self.ctx.vertex_array(program, [(tile.vbo, VERTEX_FMT, 'vert_pos', 'vert_color')],
+                    index_buffer=self.ibo, index_element_size=self.index_element_size)
+        return tile.vao
+
+    def submit(self, queue, program:moderngl.Program, camera, layer:int=0) -> int:
+        """Queue the tiles that cover the view. Request the missing ones. Return tiles drawn.
+
+        Coarser tiles (fallbacks) are submitted first: finer tiles over them
+        are drawn on top.
+        """
+        rect = camera.visible_rect
+        self.level = self.level_for(camera.scale)
+        visible = self.keys(self.level, rect)
+        draw = set()
+        self.missing = 0
+        for key in visible:
+            if self.resident(key):
+                draw.add(key)
+                continue
+            self.missing += 1
+            parent = self.fallback(key)
+            if parent is not None: draw.add(parent)
+        # Missing tiles: the visible ones first, then the ring around the view
+        seen = set(visible)
+        ring = [key for key in self.keys(self.level, rect, margin=1) if key not in seen]
+        for key in visible + ring:
+            if len(self.pending) >= self.max_pending: break
+            if key not in self.pending and not self.resident(key): self.request(key)
+        for key in sorted(draw, key=lambda k: -k[0]):
+            tile = self.cache.get(key)
+            queue.submit(program, self.vao(tile, program), layer=layer, blend=BLEND_OFF)
+        self.drawn = len(draw)
+        return self.drawn
+
+    @property
+    def complete(self) -> bool:
+        """The last submit() drew every visible tile at its own level."""
+        return self.missing == 0
+
+    def forget_program(self, program:moderngl.Program) -> None:
+        for tile in self.cache.resources():
+            if tile.vao is not None and tile.vao.program.glo == program.glo:
+                tile.vao.release()
+                tile.vao = None
+
+    def end_frame(self) -> None:
+        """The queue is flushed: release the least recently drawn tiles over the budget."""
+        self.cache.end_frame()
+
+    def release(self) -> None:
+        self.cache.release_all()
+        self.ibo.release()
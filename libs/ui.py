@@ -6,20 +6,69 @@
 import pygame
 import logging
 import sys
+from libs.replay import InputRecorder
 
 logger = logging.getLogger(__name__)
 
 class UI:
     def __init__(self, game) -> None:
         self.game = game
+        self.mouse = (0,0)                              # Mouse position at the last handle_events()
+        self.recorder = None                            # InputRecorder: log the input (libs/replay.py)
+        self.replay = None                              # InputReplay: input comes from a log instead
 
-    def handle_events(self) -> None:
-        for event in pygame.event.get():
+    def handle_events(self, timeout:int=0) -> int:
+        """Handle pending events. Return the number of events.
+
+        timeout: if there are no events, block up to this many milliseconds
+        waiting for one (0: do not block).
+
+        Replaying, the events of the step the game is at come from the log
+        instead, each with the mouse position it was recorded under. Only
+        QUIT still comes from the window, so a replay can be closed.
+        """
+        events = pygame.event.get()
+        if self.replay:
+            events = (self.replay.events(self.game.steps)
+                      + [(self.replay.mouse, e) for e in events if e.type == pygame.QUIT])
+        else:
+            if not events and timeout:
+                ### wait(timeout) -> Event: returns NOEVENT if the timeout expires
+                event = pygame.event.wait(timeout)
+                if event.type != pygame.NOEVENT: events = [event] + pygame.event.get()
+            mouse = pygame.mouse.get_pos()
+            if self.recorder: self.recorder.record(self.game.steps, events, mouse)
+            events = [(mouse, e) for e in events]
+        for mouse,event in events:
+            self.mouse = mouse                          # Zooming is about the mouse
             match event.type:
                 case pygame.QUIT: sys.exit()
                 case pygame.KEYDOWN: self.KEYDOWN(event)
-                case pygame.WINDOWRESIZED: self.game.os_window.WINDOWRESIZED(event)
+                case pygame.KEYUP: self.KEYUP(event)
+                case pygame.WINDOWRESIZED: self.WINDOWRESIZED(event)
+                case pygame.WINDOWFOCUSLOST: self.WINDOWFOCUSLOST(event)
                 case pygame.MOUSEWHEEL: self.MOUSEWHEEL(event)
+        self.mouse = self.replay.mouse if self.replay else mouse
+        return len(events)
+
+    def start_recording(self, path) -> None:
+        """Log the input from now on. Replays start from a new Game: record from the start."""
+        self.stop_recording()
+        self.recorder = InputRecorder(path, self.game.os_window.size, self.game.dt)
+
+    def stop_recording(self) -> None:
+        if self.recorder is None: return
+        self.recorder.close(self.game.steps)
+        self.recorder = None
+
+    def WINDOWRESIZED(self, event) -> None:
+        self.game.os_window.WINDOWRESIZED(event)
+        self.game.camera.resize(self.game.os_window.size)
+        if self.game.gpu: self.game.gpu.resize(self.game.os_window.size)
+
+    def WINDOWFOCUSLOST(self, event) -> None:
+        """Key-ups go to another window now: stop moving."""
+        if hasattr(self.game, 'player'): self.game.player.stop()
 
     def MOUSEWHEEL(self, event) -> None:
         match event.y:
@@ -32,8 +81,21 @@ class UI:
             case pygame.K_q: sys.exit()
             case pygame.K_F11: pygame.display.toggle_fullscreen()
             case pygame.K_F2: self.game.debug = not self.game.debug
-            case pygame.K_w: self.game.player.move_up()
-            case pygame.K_a: self.game.player.move_left()
-            case pygame.K_s: self.game.player.move_down()
-            case pygame.K_d: self.game.player.move_right()
+            case pygame.K_F3: self.game.profiler.toggle()
+            case pygame.K_F4: self.game.profiler.export_chrome_trace("trace.json")
+            case pygame.K_F5 if self.game.gpu: self.game.gpu.resolution.toggle()
+            case pygame.K_F6 if self.game.gpu: self.game.gpu.toggle_capture()
+            case pygame.K_w: self.game.player.steer( 0, 1)
+            case pygame.K_a: self.game.player.steer(-1, 0)
+            case pygame.K_s: self.game.player.steer( 0,-1)
+            case pygame.K_d: self.game.player.steer( 1, 0)
             case _: logger.debug(f"{event.key}")
+
+    def KEYUP(self, event) -> None:
+        """Undo the steer() of the matching KEYDOWN, if there was one."""
+        match event.key:
+            case pygame.K_w: self.game.player.release( 0, 1)
+            case pygame.K_a: self.game.player.release(-1, 0)
+            case pygame.K_s: self.game.player.release( 0,-1)
+            case pygame.K_d: self.game.player.release( 1, 0)
+            case _: pass
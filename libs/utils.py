@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 # vim: set fileencoding=utf-8 :
-"""Utilities: setup logging
+"""Utilities: setup logging, check array item sizes
 """
 
 import logging
@@ -36,3 +36,14 @@ def check_array_itemsize() -> None:
     # Float
     data = array('f', [1]); check(expected=4,actual=data.itemsize)
     data = array('d', [1]); check(expected=8,actual=data.itemsize)
+
+def index_typecode(max_index:int) -> str:
+    """Smallest unsigned array typecode that can hold 'max_index', for an IBO.
+
+    Like check_array_itemsize(), do not assume sizes: ask the array. OpenGL
+    indices are 1, 2 or 4 bytes, so skip a typecode with any other size.
+    """
+    for typecode in ('B', 'H', 'I', 'L'):
+        itemsize = array(typecode).itemsize
+        if itemsize in (1,2,4) and max_index < 256**itemsize: return typecode
+    raise ValueError(f"Index {max_index} does not fit in 32 bits")
@@ -0,0 +1,15 @@
+# version 330
+in vec3 vert_pos;   // World space
+in vec4 vert_color;
+layout(std140) uniform Camera {
+    mat4 proj_mat;  // aspect ratio
+    mat4 view_mat;  // zoom and pan
+};
+uniform float point_size;   // Pixels, when drawing points
+out vec4 color_in;
+void main(){
+    vec4 pos = vec4(vert_pos.xy, 0.0, 1.0);    // Flatten z, like the other scene shaders
+    gl_Position = proj_mat * view_mat * pos;
+    gl_PointSize = point_size;
+    color_in = vert_color;
+}
@@ -0,0 +1,11 @@
+#version 330
+
+in vec2 uv;
+in vec4 text_color;
+uniform sampler2D tex;
+out vec4 color;
+
+void main(){
+    // Glyph coverage is in the alpha channel. Blend with the coverage as alpha.
+    color = vec4(text_color.rgb, text_color.a * texture(tex, uv).a);
+}
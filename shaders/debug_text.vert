@@ -0,0 +1,15 @@
+#version 330
+
+in vec2 vert_pos;   // Pixels, origin at top left of window
+in vec2 tex_coord;
+in vec4 vert_color;
+uniform vec2 win_size;
+out vec2 uv;
+out vec4 text_color;
+
+void main(){
+    uv = tex_coord;
+    text_color = vert_color;
+    // Map pixels to window coordinates (-1:1). Down is negative.
+    gl_Position = vec4(2*vert_pos.x/win_size.x - 1, 1 - 2*vert_pos.y/win_size.y, 0.0, 1.0);
+}
@@ -0,0 +1,11 @@
+# version 330
+in vec3 vert_pos;
+uniform vec3 model_pos; // Where to draw this copy of the mesh, world space
+layout(std140) uniform Camera {
+    mat4 proj_mat;  // aspect ratio
+    mat4 view_mat;  // zoom and pan
+};
+void main(){
+    vec4 pos = vec4(vert_pos.xy + model_pos.xy, 0.0, 1.0);
+    gl_Position = proj_mat * view_mat * pos;
+}
@@ -0,0 +1,6 @@
+# version 330
+in vec4 color_in;
+out vec4 color;
+void main(){
+    color = color_in;
+}
@@ -0,0 +1,15 @@
+# version 330
+in vec2 vert_pos;   // Unit quad, shared by every instance
+in vec2 inst_pos;   // Per instance: bottom left in world space
+in vec2 inst_size;  // Per instance: w,h in world space
+in vec4 inst_color; // Per instance
+layout(std140) uniform Camera {
+    mat4 proj_mat;  // aspect ratio
+    mat4 view_mat;  // zoom and pan
+};
+out vec4 color_in;
+void main(){
+    vec4 pos = vec4(inst_pos + inst_size*vert_pos, 0.0, 1.0);
+    gl_Position = proj_mat * view_mat * pos;
+    color_in = inst_color;
+}
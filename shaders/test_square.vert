@@ -1,8 +1,10 @@
 # version 330
 in vec2 vert_pos;
-uniform mat4 proj_mat;
-uniform mat4 view_mat;
+layout(std140) uniform Camera {
+    mat4 proj_mat;  // aspect ratio
+    mat4 view_mat;  // zoom and pan
+};
 void main(){
     vec4 pos = vec4(vert_pos, 0.0, 1.0);
-    gl_Position = view_mat * proj_mat * pos;
+    gl_Position = proj_mat * pos;   // Fixed on screen: no zoom or pan
 }
@@ -0,0 +1,11 @@
+#version 330
+
+in vec2 uv;
+uniform sampler2D tex;
+uniform vec4 text_color;
+out vec4 color;
+
+void main(){
+    // Glyph coverage is in the alpha channel. Output premultiplied alpha.
+    color = text_color * texture(tex, uv).a;
+}
@@ -0,0 +1,6 @@
+# version 330
+in vec3 color_in;
+out vec4 color;
+void main(){
+    color = vec4(color_in, 1.0);
+}
@@ -0,0 +1,12 @@
+# version 330
+in vec2 vert_pos;   // World space
+in vec3 vert_color;
+layout(std140) uniform Camera {
+    mat4 proj_mat;  // aspect ratio
+    mat4 view_mat;  // zoom and pan
+};
+out vec3 color_in;
+void main(){
+    gl_Position = proj_mat * view_mat * vec4(vert_pos, 0.0, 1.0);
+    color_in = vert_color;
+}
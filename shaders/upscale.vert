@@ -0,0 +1,11 @@
+#version 330
+
+// One triangle that covers the window. No vertex buffer: corners from gl_VertexID.
+uniform vec2 uv_scale;  // Part of the texture the scene was drawn in
+out vec2 uv;
+
+void main(){
+    vec2 corner = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);  // (0,0) (2,0) (0,2)
+    uv = corner * uv_scale;
+    gl_Position = vec4(2*corner - 1, 0.0, 1.0);
+}